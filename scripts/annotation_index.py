@@ -0,0 +1,281 @@
+import os
+import json
+import glob
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# =================================================================
+# 공용 어노테이션 인덱스
+#  : train_annotations 아래의 알약별 JSON을 한 번만 스캔해 컬럼형(.npy) 저장소로 만듭니다.
+#    convert_json_to_yolo.py, generate_name.py, merge_anns_for_seg.py가 JSON을 각자 다시 읽는 대신
+#    이 인덱스를 조회합니다.
+#
+#  인덱스 폴더 (기본: '<annotation_dir>_index')
+#    - source_fields.json: JSON별 (mtime, 크기, sha1, 파싱한 필드) 캐시. 변경된 JSON만 다시 파싱합니다.
+#                        (원본 JSON 내용은 저장하지 않으며, 원본이 필요하면 records()가 디스크에서 다시 읽습니다.)
+#    - *.npy          : 이미지/어노테이션/카테고리 컬럼 (np.load(mmap_mode='r')로 메모리 매핑)
+#    - *.json         : 문자열 테이블 (파일명, dl_name, 카테고리 이름, 원본 JSON 경로)
+#    - meta.json      : 인덱스 버전과 개수 (마지막에 기록)
+# =================================================================
+
+INDEX_VERSION = 3
+
+# 컬럼 이름 -> 파일 이름
+IMAGE_COLUMNS = ('image_width', 'image_height', 'image_ann_offsets')
+ANNOTATION_COLUMNS = ('ann_image', 'ann_bbox', 'ann_category_id', 'ann_dl_idx', 'ann_dl_name', 'ann_source')
+CATEGORY_COLUMNS = ('category_ids',)
+SOURCE_COLUMNS = ('source_image',)
+STRING_TABLES = ('image_file_names', 'image_digests', 'dl_names', 'category_names', 'sources')
+
+
+def default_index_dir(annotation_dir):
+    return os.path.normpath(annotation_dir) + '_index'
+
+
+def _dl_idx_value(dl_idx):
+    return int(dl_idx) if isinstance(dl_idx, str) and dl_idx.isdigit() else -1
+
+
+def _parse_fields(data):
+    """
+    인덱스에 필요한 필드만 뽑습니다.
+    {'categories': [[id, 이름], ...], 'image': [file_name, width, height, dl_idx, dl_name] 또는 None,
+     'anns': [[x, y, w, h, category_id], ...]}
+    """
+    if not isinstance(data, dict):
+        return None
+    fields = {
+        'categories': [[c['id'], c['name']] for c in data.get('categories') or []
+                       if c.get('id') is not None and c.get('name')],
+        'image': None,
+        'anns': [],
+    }
+    if data.get('images') and data.get('annotations'):
+        # JSON 구조상 images 배열에 1개의 요소만 있다고 가정합니다.
+        img_info = data['images'][0]
+        fields['image'] = [img_info['file_name'], img_info['width'], img_info['height'],
+                           _dl_idx_value(img_info.get('dl_idx')), img_info.get('dl_name', '')]
+        fields['anns'] = [[*annot['bbox'], annot.get('category_id', -1)] for annot in data['annotations']
+                          if annot.get('bbox') and len(annot['bbox']) == 4]
+    return fields
+
+
+def _parse_task(args):
+    """JSON 1개를 읽어 (rel_path, sha1, 파싱한 필드)를 반환합니다. 읽을 수 없으면 필드는 None."""
+    rel_path, json_path = args
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    sha1 = hashlib.sha1(raw).hexdigest()
+    try:
+        fields = _parse_fields(json.loads(raw))
+    except Exception:
+        fields = None
+    return rel_path, sha1, fields
+
+
+def _atomic_json_dump(obj, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _atomic_npy_save(array, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class AnnotationIndex:
+    """
+    컬럼형 어노테이션 인덱스 (읽기 전용)
+
+    - 이미지 i의 어노테이션 행: image_ann_offsets[i]:image_ann_offsets[i + 1]
+      (이미지는 정렬된 JSON 경로에서 처음 등장한 순서, 이미지 내 어노테이션은 JSON 경로 순서)
+    - ann_dl_idx는 이미지 정보의 dl_idx (숫자가 아니면 -1), ann_dl_name/ann_source는 문자열 테이블 인덱스
+    - image_digests[i]는 이미지에 기여하는 JSON들의 sha1로 만든 해시로, 라벨 재생성 여부 판단에 사용합니다.
+    - source_image[j]는 sources[j] JSON의 이미지 인덱스 (images/annotations가 없거나 읽을 수 없는 JSON은 -1)
+    """
+
+    def __init__(self, index_dir, mmap=True):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        for name in IMAGE_COLUMNS + ANNOTATION_COLUMNS + CATEGORY_COLUMNS + SOURCE_COLUMNS:
+            setattr(self, name, np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mmap_mode))
+        for name in STRING_TABLES:
+            with open(os.path.join(index_dir, f"{name}.json"), 'r', encoding='utf-8') as f:
+                setattr(self, name, json.load(f))
+
+    def __len__(self):
+        return len(self.image_file_names)
+
+    def image_rows(self, i):
+        return slice(int(self.image_ann_offsets[i]), int(self.image_ann_offsets[i + 1]))
+
+    def iter_images(self):
+        """(file_name, width, height, 어노테이션 행 slice)를 이미지 순서대로 반환합니다."""
+        for i, file_name in enumerate(self.image_file_names):
+            yield file_name, int(self.image_width[i]), int(self.image_height[i]), self.image_rows(i)
+
+    def category_name_map(self):
+        """{원본 category id: 이름} (JSON의 categories 섹션 기준)"""
+        return dict(zip(self.category_ids.tolist(), self.category_names))
+
+    def records(self):
+        """
+        정렬된 JSON 경로 순서로 (rel_path, 원본 JSON 내용)을 반환합니다. (읽을 수 없는 JSON은 제외)
+        원본 필드가 모두 필요한 경우(통합 COCO JSON 생성 등)에 사용하며, 호출할 때마다 디스크에서 다시 읽습니다.
+        """
+        annotation_dir = self.meta['annotation_dir']
+        for rel_path in self.sources:
+            try:
+                with open(os.path.join(annotation_dir, rel_path), 'rb') as f:
+                    data = json.loads(f.read())
+            except Exception:
+                continue
+            yield rel_path, data
+
+
+def _build_columns(sources):
+    """JSON별로 파싱해 둔 필드로 컬럼/문자열 테이블을 만듭니다. (파일 I/O 없음)"""
+    rel_paths = sorted(sources)
+    image_order, image_info, image_anns, image_shas = [], {}, {}, {}
+    image_codes, dl_name_codes, categories = {}, {}, {}
+    source_image = np.full(len(rel_paths), -1, dtype=np.int32)
+
+    for source_code, rel_path in enumerate(rel_paths):
+        fields = sources[rel_path]['fields']
+        if fields is None:
+            continue
+        for category_id, name in fields['categories']:
+            categories[category_id] = name
+        if fields['image'] is None:
+            continue
+
+        file_name, width, height, dl_idx, dl_name = fields['image']
+        if file_name not in image_info:
+            image_codes[file_name] = len(image_order)
+            image_order.append(file_name)
+            image_info[file_name] = (width, height)
+            image_anns[file_name] = []
+            image_shas[file_name] = []
+        image_shas[file_name].append(sources[rel_path]['sha1'])
+        source_image[source_code] = image_codes[file_name]
+
+        dl_name_code = dl_name_codes.setdefault(dl_name, len(dl_name_codes))
+        for *bbox, category_id in fields['anns']:
+            image_anns[file_name].append((bbox, category_id, dl_idx, dl_name_code, source_code))
+
+    rows = [row for file_name in image_order for row in image_anns[file_name]]
+    offsets = np.zeros(len(image_order) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(image_anns[name]) for name in image_order])
+    ann_image = np.repeat(np.arange(len(image_order), dtype=np.int32), np.diff(offsets))
+
+    category_ids = sorted(categories)
+    columns = {
+        'image_width': np.array([image_info[n][0] for n in image_order], dtype=np.int32),
+        'image_height': np.array([image_info[n][1] for n in image_order], dtype=np.int32),
+        'image_ann_offsets': offsets,
+        'ann_image': ann_image,
+        'ann_bbox': np.array([r[0] for r in rows], dtype=np.float64).reshape(-1, 4),
+        'ann_category_id': np.array([r[1] for r in rows], dtype=np.int64),
+        'ann_dl_idx': np.array([r[2] for r in rows], dtype=np.int64),
+        'ann_dl_name': np.array([r[3] for r in rows], dtype=np.int32),
+        'ann_source': np.array([r[4] for r in rows], dtype=np.int32),
+        'category_ids': np.array(category_ids, dtype=np.int64),
+        'source_image': source_image,
+    }
+    tables = {
+        'image_file_names': image_order,
+        'image_digests': [hashlib.sha1(''.join(image_shas[n]).encode()).hexdigest() for n in image_order],
+        'dl_names': list(dl_name_codes),
+        'category_names': [categories[c] for c in category_ids],
+        'sources': rel_paths,
+    }
+    return columns, tables
+
+
+def _load_sources(index_dir):
+    fields_path = os.path.join(index_dir, 'source_fields.json')
+    if not os.path.exists(fields_path):
+        return {}
+    try:
+        with open(fields_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return records['sources'] if records.get('version') == INDEX_VERSION else {}
+
+
+def build_index(annotation_dir, index_dir=None, num_workers=None, verbose=True):
+    """
+    annotation_dir의 JSON으로 인덱스를 만들거나 갱신하고 AnnotationIndex를 반환합니다.
+    mtime/크기가 바뀐 JSON만 프로세스 풀에서 다시 파싱하며, 변경이 없으면 기존 인덱스를 그대로 엽니다.
+    """
+    index_dir = index_dir or default_index_dir(annotation_dir)
+    num_workers = num_workers or os.cpu_count() or 1
+    os.makedirs(index_dir, exist_ok=True)
+
+    json_files = sorted(glob.glob(os.path.join(annotation_dir, '**', '*.json'), recursive=True))
+    old_sources = _load_sources(index_dir)
+    # 이전 버전(INDEX_VERSION 1)은 원본 JSON 내용 전체를 records.json에 저장했습니다.
+    legacy_path = os.path.join(index_dir, 'records.json')
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+    sources, to_parse = {}, []
+    for json_path in json_files:
+        rel_path = os.path.relpath(json_path, annotation_dir)
+        stat = os.stat(json_path)
+        old = old_sources.get(rel_path)
+        if old and old['mtime_ns'] == stat.st_mtime_ns and old['size'] == stat.st_size:
+            sources[rel_path] = old
+        else:
+            sources[rel_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            to_parse.append((rel_path, json_path))
+
+    changed = 0
+    if to_parse:
+        if verbose:
+            print(f"인덱스: 총 {len(json_files)}개 중 {len(to_parse)}개의 JSON 파일을 파싱합니다... (워커 {num_workers}개)")
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            chunksize = max(1, len(to_parse) // (num_workers * 4))
+            for rel_path, sha1, fields in executor.map(_parse_task, to_parse, chunksize=chunksize):
+                sources[rel_path].update(sha1=sha1, fields=fields)
+                old = old_sources.get(rel_path)
+                if old is None or old.get('sha1') != sha1:
+                    changed += 1
+    removed = len(set(old_sources) - set(sources))
+
+    meta_path = os.path.join(index_dir, 'meta.json')
+    if to_parse or removed or not os.path.exists(meta_path):
+        _atomic_json_dump({'version': INDEX_VERSION, 'sources': sources}, os.path.join(index_dir, 'source_fields.json'))
+        if changed or removed or not os.path.exists(meta_path):
+            columns, tables = _build_columns(sources)
+            for name, array in columns.items():
+                _atomic_npy_save(array, os.path.join(index_dir, f"{name}.npy"))
+            for name, table in tables.items():
+                _atomic_json_dump(table, os.path.join(index_dir, f"{name}.json"))
+            _atomic_json_dump({
+                'version': INDEX_VERSION,
+                'annotation_dir': os.path.abspath(annotation_dir),
+                'num_sources': len(sources),
+                'num_images': len(tables['image_file_names']),
+                'num_annotations': int(len(columns['ann_category_id'])),
+                'num_categories': len(tables['category_names']),
+            }, meta_path)
+    if verbose:
+        print(f"인덱스 갱신: 변경된 JSON {changed}개, 삭제된 JSON {removed}개 ({index_dir})")
+    return AnnotationIndex(index_dir)
+
+
+if __name__ == '__main__':
+    ANNOTATION_DIR = 'data/ai05-level1-project/train_annotations'
+
+    index = build_index(ANNOTATION_DIR)
+    print(f"이미지 {len(index)}개, 어노테이션 {len(index.ann_category_id)}개, 카테고리 {len(index.category_ids)}개")
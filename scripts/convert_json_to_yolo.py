@@ -1,7 +1,7 @@
 import os
 import json
-import glob
-import shutil
+
+from annotation_index import build_index, default_index_dir
 
 # 원본 Category ID 리스트
 ORIGINAL_CATEGORY_IDS = [
@@ -24,101 +24,137 @@ BASE_DIR = 'data/ai05-level1-project'
 INPUT_JSON_DIR = os.path.join(BASE_DIR, 'train_annotations') # 입력: JSON 파일 위치
 OUTPUT_LABEL_DIR = os.path.join(BASE_DIR, 'train_labels') # 출력: YOLO TXT 저장 위치
 
+# 공용 어노테이션 인덱스 위치 (scripts/annotation_index.py). 변경된 JSON만 다시 파싱합니다.
+INDEX_DIR = default_index_dir(INPUT_JSON_DIR)
+
+# 증분 변환용 manifest: 이미지별로 기여하는 JSON들의 해시(digest)를 기록합니다.
+# 다시 실행하면 digest가 바뀐 이미지의 라벨만 다시 쓰고, 원본이 사라진 라벨만 삭제합니다.
+MANIFEST_PATH = os.path.join(BASE_DIR, 'train_labels_manifest.json')
+MANIFEST_VERSION = 2
+
+# JSON 파싱 워커 프로세스 수
+NUM_WORKERS = os.cpu_count() or 1
+
+
+def load_manifest():
+    """현재 카테고리 매핑으로 만든 manifest만 사용합니다. (매핑이 바뀌면 전체 재변환)"""
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('category_ids') != ORIGINAL_CATEGORY_IDS:
+        return None
+    return manifest
+
+
+def save_manifest(image_digests):
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'category_ids': ORIGINAL_CATEGORY_IDS, 'images': image_digests}, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def to_yolo_lines(img_w, img_h, annotations):
+    """통합된 주석 [[category_id, x_min, y_min, w, h], ...]을 YOLO TXT 줄 목록으로 변환합니다."""
+    yolo_lines = []
+
+    for original_cat_id, x_min, y_min, w, h in annotations:
+        # 💡 재매핑: 원본 ID -> YOLO ID (0~72)
+        yolo_cat_id = ID_TO_YOLO_ID.get(original_cat_id)
+
+        if yolo_cat_id is None:
+            continue
+
+        # COCO to YOLO (정규화된 중앙 좌표 및 크기)
+        x_center_norm = (x_min + w / 2) / img_w
+        y_center_norm = (y_min + h / 2) / img_h
+        w_norm = w / img_w
+        h_norm = h / img_h
+
+        # YOLO TXT 포맷
+        yolo_line = f"{yolo_cat_id} {x_center_norm:.6f} {y_center_norm:.6f} {w_norm:.6f} {h_norm:.6f}"
+        yolo_lines.append(yolo_line)
+    return yolo_lines
+
+
+def label_filename_for(img_filename):
+    return os.path.splitext(img_filename)[0] + '.txt'
+
+
 def convert_coco_to_yolo():
-    """COCO 스타일 JSON 파일을 이미지 파일 이름별로 통합하여 YOLO TXT 포맷으로 변환합니다."""
-    
-    # 1. 출력 디렉토리 초기화
-    if os.path.exists(OUTPUT_LABEL_DIR):
-        shutil.rmtree(OUTPUT_LABEL_DIR)
+    """
+    COCO 스타일 JSON 파일을 이미지 파일 이름별로 통합하여 YOLO TXT 포맷으로 변환합니다.
+
+    JSON은 공용 어노테이션 인덱스에서 읽으며(변경된 JSON만 프로세스 풀에서 다시 파싱),
+    기여하는 JSON이 추가/변경/삭제된 이미지의 라벨만 다시 쓰거나 삭제합니다.
+    """
     os.makedirs(OUTPUT_LABEL_DIR, exist_ok=True)
-    
-    print(f"출력 디렉토리 생성: {OUTPUT_LABEL_DIR}")
-    
-    json_files = glob.glob(os.path.join(INPUT_JSON_DIR, '**', '*.json'), recursive=True)
-    
-    if not json_files:
-        print(f"오류: 입력 JSON 파일을 {INPUT_JSON_DIR}에서 찾을 수 없습니다.")
-        return
 
-    print(f"총 {len(json_files)}개의 JSON 파일을 스캔하여 주석을 통합합니다...")
-    
-    # { 이미지_파일명: { 'width': w, 'height': h, 'annotations': [anno1, anno2, ...] } }
-    image_data_map = {}
+    # =================================================
+    # 1단계: 인덱스 갱신 (모든 JSON의 주석이 이미지 파일별로 통합되어 있음)
+    # =================================================
+    index = build_index(INPUT_JSON_DIR, INDEX_DIR, num_workers=NUM_WORKERS)
 
+    if not index.sources:
+        print(f"오류: 입력 JSON 파일을 {INPUT_JSON_DIR}에서 찾을 수 없습니다.")
+        return
 
-    # 모든 JSON을 스캔하여 주석을 이미지 파일별로 통합(Aggregation)
-    for json_path in json_files:
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception:
-            # print(f"파일 로드 실패: {json_path}")
-            continue
+    print(f"✅ 스캔 및 통합 완료. 총 {len(index)}개의 고유 이미지에 대한 주석이 준비되었습니다.")
 
-        if not data.get('images') or not data.get('annotations'):
-            continue
-            
-        # JSON 구조상 images 배열에 1개의 요소만 있고, 
-        # annotations 배열에도 1개의 객체 주석만 있다고 가정합니다.
-        img_info = data['images'][0]
-        img_filename = img_info['file_name']
-        
-        if img_filename not in image_data_map:
-            # 첫 주석인 경우, 이미지 메타데이터를 저장
-            image_data_map[img_filename] = {
-                'width': img_info['width'],
-                'height': img_info['height'],
-                'annotations': []
-            }
-        
-        # 현재 JSON의 모든 주석을 통합된 리스트에 추가합니다.
-        # (하나의 JSON에 여러 주석이 있다면 모두 추가, 하나만 있다면 그것만 추가)
-        image_data_map[img_filename]['annotations'].extend(data['annotations'])
-
-    print(f"✅ 스캔 및 통합 완료. 총 {len(image_data_map)}개의 고유 이미지에 대한 주석이 준비되었습니다.")
+    manifest = load_manifest()
+    full_rebuild = manifest is None
+    old_digests = {} if full_rebuild else manifest['images']
+    image_digests = dict(zip(index.image_file_names, index.image_digests))
 
     # =================================================
-    # 2단계: 통합된 주석을 YOLO TXT 포맷으로 변환 및 저장
+    # 2단계: 영향을 받은 이미지의 라벨만 다시 쓰고, 원본이 사라진 라벨만 삭제
     # =================================================
-    
-    for img_filename, img_data in image_data_map.items():
-        img_w = img_data['width']
-        img_h = img_data['height']
-        
-        label_filename = os.path.splitext(img_filename)[0] + '.txt'
+    existing_labels = {name for name in os.listdir(OUTPUT_LABEL_DIR) if name.endswith('.txt')}
+    expected_labels = {label_filename_for(name) for name in image_digests}
+    if full_rebuild:
+        # manifest가 없으면 모든 라벨을 다시 쓰고, 어떤 JSON에도 해당하지 않는 라벨은 삭제합니다.
+        stale_labels = existing_labels - expected_labels
+    else:
+        stale_labels = {label_filename_for(name) for name in old_digests} - expected_labels
+
+    written = deleted = 0
+    for img_filename, img_w, img_h, rows in index.iter_images():
+        label_filename = label_filename_for(img_filename)
+        # digest가 같고 라벨 파일도 남아 있으면 건너뜁니다. (수동으로 지워진 라벨은 다시 만듭니다.)
+        if (not full_rebuild and old_digests.get(img_filename) == image_digests[img_filename]
+                and label_filename in existing_labels):
+            continue
+
         label_path = os.path.join(OUTPUT_LABEL_DIR, label_filename)
-        
-        yolo_lines = []
-
-        for annot in img_data['annotations']:
-            # COCO BBOX: [x_min, y_min, w, h] (픽셀)
-            x_min, y_min, w, h = annot['bbox']
-            original_cat_id = annot['category_id']
-            
-            # 💡 재매핑: 원본 ID -> YOLO ID (0~72)
-            yolo_cat_id = ID_TO_YOLO_ID.get(original_cat_id)
-            
-            if yolo_cat_id is None:
-                continue 
-
-            # COCO to YOLO (정규화된 중앙 좌표 및 크기)
-            x_center_norm = (x_min + w / 2) / img_w
-            y_center_norm = (y_min + h / 2) / img_h
-            w_norm = w / img_w
-            h_norm = h / img_h
-            
-            # YOLO TXT 포맷
-            yolo_line = f"{yolo_cat_id} {x_center_norm:.6f} {y_center_norm:.6f} {w_norm:.6f} {h_norm:.6f}"
-            yolo_lines.append(yolo_line)
+        annotations = [
+            [category_id, *bbox]
+            for category_id, bbox in zip(index.ann_category_id[rows].tolist(), index.ann_bbox[rows].tolist())
+        ]
+        yolo_lines = to_yolo_lines(img_w, img_h, annotations)
 
         # TXT 파일 저장 (주석이 하나라도 있는 경우)
         if yolo_lines:
             with open(label_path, 'w', encoding='utf-8') as f:
                 f.write('\n'.join(yolo_lines))
+            written += 1
         # 주석이 하나도 없는 경우 (필요 시 빈 파일을 만들 수도 있지만, YOLO는 보통 라벨이 없는 이미지를 무시합니다.)
+        elif label_filename in existing_labels:
+            os.remove(label_path)
+            deleted += 1
+
+    for label_filename in stale_labels:
+        label_path = os.path.join(OUTPUT_LABEL_DIR, label_filename)
+        if os.path.exists(label_path):
+            os.remove(label_path)
+            deleted += 1
 
+    save_manifest(image_digests)
+    print(f"라벨 {written}개 작성, {deleted}개 삭제.")
     print("모든 주석이 이미지 파일별로 통합되어 YOLO TXT 포맷으로 변환 완료.")
 
 
 if __name__ == '__main__':
-    convert_coco_to_yolo()
\ No newline at end of file
+    convert_coco_to_yolo()
@@ -1,5 +1,8 @@
 # convert_polygon_to_yolo.py
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 # YOUR CLASS CODES (정렬된 리스트)
 ORIGINAL_CATEGORY_IDS = [
@@ -9,25 +12,106 @@ ORIGINAL_CATEGORY_IDS = [
     27776, 27925, 27992, 28762, 29344, 29450, 29666, 29870, 30307, 31704, 31862, 31884, 32309, 33008, 33207, 33877, 33879, 34596, 35205, 36636, 38161, 41767, 44198
 ]
 
-def convert_label(txt_path, out_path):
-    with open(txt_path, 'r', encoding='utf-8') as fin, open(out_path, 'w', encoding='utf-8') as fout:
-        for i, line in enumerate(fin):
-            parts = line.strip().split()
-            class_id = int(parts[0])
-            try:
-                class_idx = ORIGINAL_CATEGORY_IDS.index(class_id)
-            except ValueError:
-                print(f"[변환실패] {os.path.basename(txt_path)} {i+1}번째 줄 - 미등록 class_id: {class_id}")
-                continue
-            new_parts = [str(class_idx)] + parts[1:]
-
-            # 디버깅 로그: 원본→맵핑 결과(5개만 샘플)
-            if i < 5:
-                print(f"[확인] {os.path.basename(txt_path)} line {i+1} 변환: {class_id} → {class_idx}")
-
-            fout.write(' '.join(new_parts) + '\n')
-
-def check_converted_labels(label_dir):
+# 변환 방향: 원본 ID -> YOLO ID (0~72), YOLO ID -> 원본 ID
+TO_YOLO = 'to_yolo'
+TO_ORIGINAL = 'to_original'
+
+# 미리 계산한 조회 테이블 (list.index의 선형 탐색 대신 인덱싱 한 번으로 변환)
+#  - ORIGINAL_TO_YOLO_LUT[원본 ID] = YOLO ID 문자열 (미등록 ID는 None)
+#  - YOLO_TO_ORIGINAL_LUT[YOLO ID] = 원본 ID 문자열
+ORIGINAL_TO_YOLO_LUT = [None] * (max(ORIGINAL_CATEGORY_IDS) + 1)
+for _yolo_id, _original_id in enumerate(ORIGINAL_CATEGORY_IDS):
+    ORIGINAL_TO_YOLO_LUT[_original_id] = str(_yolo_id)
+YOLO_TO_ORIGINAL_LUT = [str(original_id) for original_id in ORIGINAL_CATEGORY_IDS]
+
+LOOKUP_TABLES = {TO_YOLO: ORIGINAL_TO_YOLO_LUT, TO_ORIGINAL: YOLO_TO_ORIGINAL_LUT}
+
+# 파일 변환 워커 프로세스 수
+NUM_WORKERS = os.cpu_count() or 1
+
+
+def remap_lines(lines, lut):
+    """
+    각 줄의 첫 토큰(class id)만 lut로 바꾸고 나머지 좌표(bbox 또는 polygon)는 그대로 둡니다.
+    (변환된 줄 목록, 미등록 class id Counter)를 반환합니다.
+    """
+    converted = []
+    unknown = Counter()
+    for line in lines:
+        parts = line.split(None, 1)
+        if not parts:
+            continue
+        token = parts[0]
+        new_id = None
+        if token.isdigit():
+            class_id = int(token)
+            if class_id < len(lut):
+                new_id = lut[class_id]
+        if new_id is None:
+            unknown[token] += 1
+            continue
+        converted.append(new_id + ' ' + parts[1].strip() if len(parts) > 1 else new_id)
+    return converted, unknown
+
+
+def convert_label(txt_path, out_path, direction=TO_YOLO):
+    """라벨 파일 1개를 변환합니다. (변환된 줄 수, 미등록 class id Counter)를 반환합니다."""
+    with open(txt_path, 'r', encoding='utf-8') as fin:
+        lines = fin.read().splitlines()
+    converted, unknown = remap_lines(lines, LOOKUP_TABLES[direction])
+    # 임시 파일에 쓴 뒤 교체하므로 in_dir == out_dir(제자리 변환)이거나 out_path가 원본의 링크여도
+    # (split_dataset_seg.py의 hardlink/symlink 모드) 원본 라벨은 바뀌지 않습니다.
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fout:
+        fout.writelines(line + '\n' for line in converted)
+    os.replace(tmp_path, out_path)
+    return len(converted), unknown
+
+
+def _convert_task(fname, in_dir, out_dir, direction):
+    num_lines, unknown = convert_label(os.path.join(in_dir, fname), os.path.join(out_dir, fname), direction)
+    return fname, num_lines, unknown
+
+
+def convert_dir(in_dir, out_dir, direction=TO_YOLO, num_workers=NUM_WORKERS):
+    """
+    in_dir의 모든 .txt 라벨(detection/polygon 모두)을 direction 방향으로 변환해 out_dir에 저장합니다.
+    파일은 프로세스 풀에서 병렬로 변환하고, 미등록 class id는 마지막에 한 번에 요약합니다.
+    """
+    if direction not in LOOKUP_TABLES:
+        raise ValueError(f"지원하지 않는 변환 방향: {direction} (지원: {tuple(LOOKUP_TABLES)})")
+    os.makedirs(out_dir, exist_ok=True)
+    with os.scandir(in_dir) as entries:
+        fnames = sorted(e.name for e in entries if e.is_file() and e.name.endswith('.txt'))
+    if not fnames:
+        print(f"⚠️ 변환할 라벨 파일이 없습니다: {in_dir}")
+        return Counter()
+
+    total_lines = 0
+    unknown_counts = Counter()
+    unknown_files = {}
+    task = partial(_convert_task, in_dir=in_dir, out_dir=out_dir, direction=direction)
+    num_workers = max(1, num_workers)
+    chunksize = max(1, len(fnames) // (num_workers * 4))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for fname, num_lines, unknown in executor.map(task, fnames, chunksize=chunksize):
+            total_lines += num_lines
+            unknown_counts.update(unknown)
+            for class_id in unknown:
+                unknown_files.setdefault(class_id, []).append(fname)
+
+    print(f"✅ {direction} 변환 완료: 파일 {len(fnames)}개, 라벨 {total_lines}줄 ({in_dir} -> {out_dir})")
+    if unknown_counts:
+        print(f"🚨 미등록 class id {len(unknown_counts)}종, 총 {sum(unknown_counts.values())}줄을 건너뛰었습니다.")
+        for class_id, count in unknown_counts.most_common():
+            files = unknown_files[class_id]
+            print(f"  - {class_id}: {count}줄, 파일 {len(files)}개 (예: {', '.join(files[:3])})")
+    return unknown_counts
+
+
+def check_converted_labels(label_dir, num_classes=len(ORIGINAL_CATEGORY_IDS)):
+    """변환된 YOLO 라벨의 class 인덱스가 0 ~ num_classes-1 범위인지 확인하고 요약합니다."""
+    invalid = Counter()
     for fname in os.listdir(label_dir):
         if fname.endswith('.txt'):
             with open(os.path.join(label_dir, fname), 'r', encoding='utf-8') as f:
@@ -36,21 +120,24 @@ def check_converted_labels(label_dir):
                     if not parts:
                         continue
                     label_idx = int(parts[0])
-                    if not (0 <= label_idx < 73):
-                        print(f"[오류] {fname} {idx+1}번째 라벨 인덱스: {label_idx}")
+                    if not (0 <= label_idx < num_classes):
+                        invalid[label_idx] += 1
+                        if invalid[label_idx] == 1:
+                            print(f"[오류] {fname} {idx+1}번째 라벨 인덱스: {label_idx}")
+    if invalid:
+        print(f"🚨 범위를 벗어난 라벨 인덱스: {dict(invalid)}")
+    else:
+        print(f"✅ 라벨 인덱스 검증 완료: {label_dir}")
+    return invalid
 
-# 변환 후 label 디렉토리 검증
-check_converted_labels('data/yolo/labels/train')
-
-def convert_dir(in_dir, out_dir):
-    os.makedirs(out_dir, exist_ok=True)
-    for fname in os.listdir(in_dir):
-        if fname.endswith('.txt'):
-            convert_label(os.path.join(in_dir, fname), os.path.join(out_dir, fname))
 
 # 예시 실행 (경로 수정!!)
 if __name__ == '__main__':
     convert_dir(
         'data/raw/seg_labels/train_labels',   # 원본 polygon txt 위치
-        'data/yolo/labels/train'              # YOLO용 폴리곤 라벨로 변환 결과 경로
+        'data/yolo/labels/train',             # YOLO용 폴리곤 라벨로 변환 결과 경로
+        direction=TO_YOLO,                    # 되돌릴 때는 TO_ORIGINAL
     )
+
+    # 변환 후 label 디렉토리 검증
+    check_converted_labels('data/yolo/labels/train')
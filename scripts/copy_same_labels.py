@@ -1,6 +1,7 @@
 import os
+import json
 import shutil
-import glob
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 # =================================================================
@@ -13,56 +14,100 @@ REFERENCE_CURATED_LABELS_TRAIN = os.path.join(REFERENCE_DATA_ROOT, 'labels_curat
 REFERENCE_CURATED_LABELS_VAL = os.path.join(REFERENCE_DATA_ROOT, 'labels_curated/val_images')
 
 # 1-2. 원본(Raw) 라벨이 저장된 위치 (복사할 원본 .txt 파일의 소스 폴더)
-RAW_LABEL_SOURCE = 'data\yolo\labels_raw\images' # 예: 오토 라벨링으로 생성된 수정 전의 모든 .txt 파일
+RAW_LABEL_SOURCE = os.path.join('data', 'yolo', 'labels_raw', 'images') # 예: 오토 라벨링으로 생성된 수정 전의 모든 .txt 파일
 
 # 1-3. 분할된 원본 라벨이 저장될 최종 출력 위치 (스크립트가 생성할 폴더)
-OUTPUT_ROOT = 'data\yolo\labels_raw_split\images' 
+OUTPUT_ROOT = os.path.join('data', 'yolo', 'labels_raw_split', 'images')
 
 
 # 파일 확장자 설정
 LABEL_EXT = '.txt'
 
+# True면 복사하지 않고 복사 계획만 OUTPUT_ROOT/copy_plan_<split>.json에 저장합니다.
+DRY_RUN = False
+
+# 복사 스레드 수 (파일 I/O 위주라 스레드로 충분합니다)
+NUM_THREADS = 16
+
 # =================================================================
 # 2. 파일 복사 및 분할 함수
 # =================================================================
 
+def list_labels(folder):
+    """폴더를 한 번만 스캔해 {파일명: (크기, mtime 초)}를 반환합니다. 폴더가 없으면 빈 dict."""
+    if not os.path.isdir(folder):
+        return {}
+    labels = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(LABEL_EXT) and entry.is_file():
+                stat = entry.stat()
+                labels[entry.name] = (stat.st_size, int(stat.st_mtime))
+    return labels
+
+
+def build_copy_plan(ref_label_folder, raw_label_src, output_label_dir):
+    """
+    참조/원본/출력 폴더를 각각 한 번씩 스캔하고 집합 연산으로 복사 계획을 만듭니다.
+      - copy   : 참조에 있고 원본에 있으며, 출력에 없거나 크기/mtime이 다른 파일
+      - skip   : 출력에 이미 같은 크기/mtime으로 있는 파일
+      - missing: 참조에는 있지만 원본에 없는 파일
+      - extra  : 출력에만 있는 파일 (삭제하지 않고 알려만 줍니다)
+    """
+    ref_names = set(list_labels(ref_label_folder))
+    raw_labels = list_labels(raw_label_src)
+    out_labels = list_labels(output_label_dir)
+
+    available = ref_names & raw_labels.keys()
+    copy = sorted(name for name in available if out_labels.get(name) != raw_labels[name])
+    return {
+        'copy': copy,
+        'skip': sorted(available.difference(copy)),
+        'missing': sorted(ref_names - raw_labels.keys()),
+        'extra': sorted(out_labels.keys() - ref_names),
+    }
+
+
 def copy_raw_labels_by_list(ref_label_folder, raw_label_src, split_name):
     """
     큐레이션된 라벨 폴더의 파일 목록을 기반으로 원본 라벨 파일을 대상 폴더로 복사합니다.
+    이미 같은 크기/mtime으로 복사된 파일은 건너뛰고, 나머지는 스레드 풀에서 병렬로 복사합니다.
     """
     # 2-1. 대상 폴더 설정 및 생성 (출력 폴더명에 '_labels' 명시)
     output_label_dir = os.path.join(OUTPUT_ROOT, f'{split_name}_labels')
     
     os.makedirs(output_label_dir, exist_ok=True)
     
-    # 2-2. 참조 라벨 파일명 목록 가져오기 (.txt 파일만 참조)
-    ref_label_paths = glob.glob(os.path.join(ref_label_folder, f'*{LABEL_EXT}'))
+    # 2-2. 복사 계획 (폴더별 1회 스캔 + 집합 연산)
+    plan = build_copy_plan(ref_label_folder, raw_label_src, output_label_dir)
+    num_ref = len(plan['copy']) + len(plan['skip']) + len(plan['missing'])
     
-    if not ref_label_paths:
+    if not num_ref:
         print(f"⚠️ 경고: 참조 라벨 폴더 '{ref_label_folder}'에서 라벨 파일을 찾을 수 없습니다. 건너뜁니다.")
         return 0
 
-    copied_count = 0
-    
-    # 2-3. 파일 복사 실행
-    print(f"\n[{split_name.upper()}]: 총 {len(ref_label_paths)}개 원본 라벨 파일 복사 시작...")
-    
-    for ref_path in tqdm(ref_label_paths, desc=f"복사 중 ({split_name})"):
-        ref_filename_with_ext = os.path.basename(ref_path)
-        ref_filename_base, _ = os.path.splitext(ref_filename_with_ext)
-        
-        # 원본 라벨 파일 찾기 (원본 폴더에서 라벨 파일 검색)
-        raw_label_path = os.path.join(raw_label_src, ref_filename_base + LABEL_EXT)
-        
-        if os.path.exists(raw_label_path):
-            # 라벨 복사
-            shutil.copy2(raw_label_path, os.path.join(output_label_dir, os.path.basename(raw_label_path)))
-            copied_count += 1
-        else:
-            print(f"🚨 오류: 원본 라벨 파일 '{ref_filename_base}{LABEL_EXT}'을(를) 찾을 수 없습니다. (경로: {raw_label_src})")
-
-
-    return copied_count
+    print(f"\n[{split_name.upper()}]: 참조 {num_ref}개 - 복사 {len(plan['copy'])}개, "
+          f"최신 상태 {len(plan['skip'])}개, 원본 없음 {len(plan['missing'])}개, 출력에만 있음 {len(plan['extra'])}개")
+    if plan['missing']:
+        print(f"🚨 오류: 원본 라벨 파일 {len(plan['missing'])}개를 찾을 수 없습니다. (경로: {raw_label_src}, "
+              f"예: {', '.join(plan['missing'][:5])})")
+
+    if DRY_RUN:
+        plan_path = os.path.join(OUTPUT_ROOT, f'copy_plan_{split_name}.json')
+        with open(plan_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(plan, source=raw_label_src, output=output_label_dir), f, indent=2, ensure_ascii=False)
+        print(f"📄 DRY RUN: 복사 계획 저장 ({plan_path})")
+        return 0
+
+    # 2-3. 파일 복사 실행 (병렬)
+    def copy_one(name):
+        shutil.copy2(os.path.join(raw_label_src, name), os.path.join(output_label_dir, name))
+
+    with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
+        for _ in tqdm(executor.map(copy_one, plan['copy']), total=len(plan['copy']), desc=f"복사 중 ({split_name})"):
+            pass
+
+    return len(plan['copy'])
 
 # =================================================================
 # 3. 메인 실행 블록
@@ -93,5 +138,5 @@ if __name__ == '__main__':
     total_copied += val_count
 
     print(f"\n--- 재분할 완료 ---")
-    print(f"총 {total_copied}개의 원본 라벨 파일(.txt)을 성공적으로 복사했습니다.")
+    print(f"총 {total_copied}개의 원본 라벨 파일(.txt)을 성공적으로 복사했습니다." + (" (DRY RUN)" if DRY_RUN else ""))
     print(f"결과 위치: {os.path.abspath(OUTPUT_ROOT)}")
@@ -1,6 +1,4 @@
-import os
-import json
-import glob
+from annotation_index import build_index
 
 # 73개의 원본 Category ID
 ORIGINAL_CATEGORY_IDS = [
@@ -14,41 +12,24 @@ ORIGINAL_CATEGORY_IDS = [
 
 def generate_yolo_names_list(annotation_root_dir, original_ids):
     """
-    모든 JSON 파일을 스캔하여 원본 ID와 알약 이름(name)을 매핑하고,
+    모든 JSON 파일의 categories 정보(공용 어노테이션 인덱스)로 원본 ID와 알약 이름(name)을 매핑하고,
     이를 0부터 시작하는 YOLO ID 순서에 맞게 리스트로 반환합니다.
     """
-    # 원본 ID와 이름 쌍을 저장할 딕셔너리
-    # {원본_ID: 알약_이름}
-    id_to_name_map = {}
-    
-    # 주석 파일 검색 (하위 폴더 포함)
-    json_files = glob.glob(os.path.join(annotation_root_dir, '**', '*.json'), recursive=True)
-    
-    if not json_files:
+    # 공용 어노테이션 인덱스에서 JSON의 'categories' 정보를 조회합니다.
+    # (인덱스가 최신이면 JSON을 다시 읽지 않고, 변경된 JSON만 다시 파싱합니다.)
+    index = build_index(annotation_root_dir)
+
+    if not index.sources:
         print("경고: 주석 JSON 파일을 찾을 수 없습니다. 경로를 확인하십시오.")
         return []
 
-    print(f"총 {len(json_files)}개의 JSON 파일을 스캔합니다...")
+    print(f"총 {len(index.sources)}개의 JSON 파일의 카테고리 정보를 조회합니다...")
 
-    # 모든 JSON 파일을 순회하며 'categories' 정보를 추출
-    for file_path in json_files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # COCO 포맷은 'categories' 섹션에 ID와 Name 매핑 정보가 있습니다.
-            for category in data.get('categories', []):
-                cat_id = category.get('id')
-                cat_name = category.get('name')
-                
-                # ID가 이전에 확인된 73개 리스트에 포함되어 있는지 확인하고 저장
-                if cat_id in original_ids and cat_name:
-                    id_to_name_map[cat_id] = cat_name
-                    
-        except Exception as e:
-            # 파일 읽기 오류는 건너뜁니다.
-            print(f"파일 처리 오류 ({file_path}): {e}")
-            continue
+    # {원본_ID: 알약_이름}
+    # ID가 이전에 확인된 73개 리스트에 포함되어 있는지 확인하고 저장
+    id_to_name_map = {
+        cat_id: cat_name for cat_id, cat_name in index.category_name_map().items() if cat_id in original_ids
+    }
 
     # 3. 최종 YOLO names 리스트 생성 (0부터 72 순서)
     # 이전에 정렬된 원본 ID 순서에 따라 이름을 추출합니다.
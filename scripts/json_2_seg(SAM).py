@@ -1,150 +1,418 @@
 import json
 import os
+import time
+import hashlib
+import multiprocessing as mp
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import cv2
 import numpy as np
+import torch
+from tqdm import tqdm
 from ultralytics import SAM
+from ultralytics.models.sam import Predictor as SAMPredictor
 from pathlib import Path
 
+from merge_anns_for_seg import iter_merged_images, load_merged_categories
+from mask_store import MaskWriter, render_overlays, rle_path_for
+from polygon_simplify import format_polygon, largest_contour, normalize_polygon, simplify_contour
+
 # 동적 경로 설정 (스크립트 위치 기준)
 script_dir = Path(__file__).resolve().parent  # data/processed/
 base_dir = script_dir.parent  # data/
-JSON_FILE = base_dir / "processed" / "train_annotations_integrated.json"
+# merge_anns_for_seg.py의 스트리밍 병합 결과 (기존 train_annotations_integrated.json도 읽을 수 있음)
+JSON_FILE = base_dir / "processed" / "train_annotations_integrated.jsonl"
 TRAIN_IMAGES_DIR = base_dir / "raw" / "train_images"
 SEG_PROC_DIR = base_dir / "raw" / "seg_proc"
+# 마스크는 이미지별 COCO RLE 파일(<stem>.rle.json)로 저장합니다. (오버레이 PNG 대신)
+MASKS_DIR = SEG_PROC_DIR / "masks"
+# 확인용 오버레이는 필요한 이미지만 렌더링합니다.
+# OVERLAY_FILES에 파일명 목록을 주거나, OVERLAY_SAMPLE장(앞에서부터)만 라벨링 후 그립니다. (0이면 그리지 않음)
+OVERLAY_DIR = SEG_PROC_DIR / "overlays"
+OVERLAY_FILES = None
+OVERLAY_SAMPLE = 0
+
+# SAM 모델 로드 (sam_l 복귀: 정확도 ↑)
+SAM_WEIGHTS = 'sam_l.pt'
+# True: 이미지 1장의 모든 bbox/point 프롬프트를 한 번의 디코더 호출로 처리 (기본값)
+# False: 프롬프트별로 디코더를 호출 (이미지 인코딩은 어느 쪽이든 이미지당 1번만 수행)
+BATCH_PROMPTS = True
+# 배치 디코딩의 logit은 프롬프트별 디코딩과 부동소수점 오차(측정상 1e-6 미만)만큼 다를 수 있습니다.
+# mask logit이 mask_threshold와, 또는 score가 conf와 PARITY_EPS 이내인 프롬프트만 프롬프트별로 다시 디코딩하므로
+# 나머지 프롬프트는 이진화 결과가 같고, 폴리곤은 BATCH_PROMPTS와 관계없이 프롬프트별 디코딩과 동일합니다.
+PARITY_EPS = 1e-4
+# 오차가 PARITY_EPS보다 큰 환경(예: GPU TF32)에 대비해 워커마다 처음 PARITY_CHECK_IMAGES장은 프롬프트별 디코딩 결과와도
+# 비교하고, 하나라도 다르면 그 워커는 이후 프롬프트별 디코딩으로 전환합니다. (0이면 비교하지 않음)
+PARITY_CHECK_IMAGES = 20
 
-# 출력 폴더 생성
-os.makedirs(SEG_PROC_DIR, exist_ok=True)
+PAD_RATIO = 0.05  # 패딩 줄임 (5% – bbox 과도 적용 방지)
+AREA_THRESHOLD = 30  # 작은 pill 허용
 
-# 경로 확인 & 로그
-print(f"스크립트 위치: {script_dir}")
-print(f"JSON 파일: {JSON_FILE} (존재: {JSON_FILE.exists()})")
-print(f"이미지 폴더: {TRAIN_IMAGES_DIR} (존재: {TRAIN_IMAGES_DIR.exists()})")
-print(f"Seg 출력 폴더: {SEG_PROC_DIR} (존재: {SEG_PROC_DIR.exists()})")
+# 폴리곤 단순화 (polygon_simplify.py 리포트로 설정별 꼭짓점 수/크기/IoU를 비교할 수 있습니다)
+# 기존 출력(외곽선 그대로 + str 좌표)이 필요하면 SIMPLIFY_EPSILON=0, MAX_VERTICES=None, COORD_PRECISION=None
+SIMPLIFY_EPSILON = 1.0  # Douglas–Peucker 허용 오차 (px)
+MAX_VERTICES = 64  # 폴리곤당 최대 꼭짓점 수 (None이면 제한 없음)
+COORD_PRECISION = 6  # 정규화 좌표 소수점 자리수
 
-if not JSON_FILE.exists():
-    raise FileNotFoundError(f"JSON 파일을 찾을 수 없어요: {JSON_FILE}. data/processed/에 확인하세요.")
+# 병렬 처리 / 재시작 설정
+# - 이미지를 NUM_WORKERS개의 프로세스에 나눠 처리합니다. (워커마다 SAM을 한 번만 로드)
+# - 끝난 이미지는 MANIFEST_PATH에 한 줄씩 기록되므로, 중단 후 다시 실행하면 남은 이미지만 처리합니다.
+# - 어노테이션/설정이 바뀌었거나 .txt가 없어진 이미지는 다시 처리합니다.
+NUM_WORKERS = 2
+MANIFEST_PATH = SEG_PROC_DIR / "seg_manifest.jsonl"
+VERBOSE = False  # True면 어노테이션별 로그 출력
 
-# 1. JSON 로드 & 데이터 그룹화
-with open(JSON_FILE, 'r', encoding='utf-8') as f:
-    data = json.load(f)
 
-# 카테고리 매핑 (e.g., 1899 → 'K-001900')
-categories = {cat['id']: cat['name'].replace(' ', '_') for cat in data['categories']}
+class PromptSAMPredictor(SAMPredictor):
+    """마지막 호출의 postprocess 입력(이진화 전 logit, score)을 보관해 임계값 근처의 프롬프트를 찾을 수 있는 predictor"""
 
-# 이미지 & 어노테이션 딕셔너리
-images = {img['id']: img for img in data['images']}
-anns_by_image = {}  # image_id → list of anns (멀티 알약 지원)
-for ann in data['annotations']:
-    img_id = ann['image_id']
-    if img_id not in anns_by_image:
-        anns_by_image[img_id] = []
-    anns_by_image[img_id].append(ann)
+    def postprocess(self, preds, img, orig_imgs):
+        self._last_inputs = (preds, img, orig_imgs)
+        return super().postprocess(preds, img, orig_imgs)
 
-# 클래스 ID 목록 (전체 클래스 처리)
-all_class_ids = list(set(ann['category_id'] for ann in data['annotations']))
-print(f"처리할 클래스 수: {len(all_class_ids)} (e.g., {all_class_ids[:3]})")
+    def _masks_at(self, threshold):
+        """마지막 호출의 모든 프롬프트 마스크를 conf와 관계없이 threshold로 이진화합니다. (N, H, W) bool"""
+        preds, img, orig_imgs = self._last_inputs
+        conf, mask_threshold = self.args.conf, self.model.mask_threshold
+        self.args.conf, self.model.mask_threshold = -float('inf'), threshold
+        try:
+            return super().postprocess(preds, img, orig_imgs)[0].masks.data
+        finally:
+            self.args.conf, self.model.mask_threshold = conf, mask_threshold
+
+    def ambiguous_prompts(self, eps):
+        """
+        마지막 호출에서 score가 conf와 eps 이내이거나, 원본 크기로 스케일한 logit 중
+        mask_threshold와 eps 이내인 픽셀이 있는 프롬프트의 인덱스 목록
+        """
+        scores = self._last_inputs[0][1]
+        near_conf = (scores - self.args.conf).abs() <= eps
+        near_threshold = (self._masks_at(self.model.mask_threshold - eps)
+                          != self._masks_at(self.model.mask_threshold + eps)).flatten(1).any(1)
+        return torch.nonzero(near_conf | near_threshold).flatten().tolist()
+
+
+def load_sam_predictor(weights):
+    """SAM(weights)(img, ...)와 같은 설정의 predictor. set_image()로 이미지 임베딩을 한 번 계산해 재사용합니다."""
+    sam = SAM(weights)
+    overrides = {'conf': 0.25, 'task': 'segment', 'mode': 'predict', 'imgsz': 1024,
+                 'model': weights, 'save': False, 'verbose': False, 'retina_masks': True, 'batch': 1}
+    predictor = PromptSAMPredictor(overrides=overrides)
+    predictor.setup_model(model=sam.model, verbose=False)
+    predictor.parity_checks_left = PARITY_CHECK_IMAGES  # 배치 디코딩 결과를 프롬프트별 디코딩과 비교할 남은 이미지 수
+    predictor.batch_prompts_ok = True  # 비교에서 다른 마스크가 나오면 False (이후 프롬프트별 디코딩)
+    return predictor
+
+
+def segment_prompts(predictor, img, box_prompts, point_prompts, batch_prompts=BATCH_PROMPTS):
+    """
+    이미지 1장을 한 번만 인코딩하고 (N, 4) bbox + (N, 2) point 프롬프트를 디코딩합니다.
+    프롬프트 i의 마스크(uint8, 0/255)를 담은 길이 N 리스트를 반환합니다. (마스크 생성 실패는 None)
+    bbox i와 point i가 한 쌍의 프롬프트이며, 프롬프트별 (1, 4) + (1, 2) 호출과 같은 의미입니다.
+    """
+    def decode_one(i):
+        result = predictor(bboxes=box_prompts[i:i + 1], points=point_prompts[i:i + 1])[0]
+        if result.masks is not None and len(result.masks.data):
+            return result.masks.data[0].cpu().numpy().astype(np.uint8) * 255
+        return None
+
+    masks = [None] * len(box_prompts)
+    predictor.set_image(img)  # 이미지 인코더 1회
+    try:
+        if batch_prompts and predictor.batch_prompts_ok:
+            result = predictor(bboxes=box_prompts, points=point_prompts)[0]
+            if result.masks is not None and len(result.masks.data):
+                # conf 이하의 마스크는 빠지므로 boxes.cls(프롬프트 인덱스)로 프롬프트와 다시 연결합니다.
+                data = result.masks.data.cpu().numpy().astype(np.uint8) * 255  # CPU 이동은 한 번만
+                for prompt_idx, mask in zip(result.boxes.cls.int().tolist(), data):
+                    masks[prompt_idx] = mask
+            # 임계값 근처 값이 있는 프롬프트만 프롬프트별로 다시 디코딩합니다. (PARITY_EPS 참고)
+            for i in predictor.ambiguous_prompts(PARITY_EPS):
+                masks[i] = decode_one(i)
+            if predictor.parity_checks_left > 0:
+                predictor.parity_checks_left -= 1
+                expected = [decode_one(i) for i in range(len(box_prompts))]
+                if any((a is None) != (b is None) or (a is not None and not np.array_equal(a, b))
+                       for a, b in zip(masks, expected)):
+                    print(f"⚠️ 배치 디코딩 마스크가 프롬프트별 디코딩과 달라 이 워커(pid {os.getpid()})는 "
+                          f"프롬프트별 디코딩으로 전환합니다. (PARITY_EPS를 키우면 배치 디코딩을 유지할 수 있습니다)")
+                    predictor.batch_prompts_ok = False
+                    masks = expected
+        else:
+            for i in range(len(box_prompts)):
+                masks[i] = decode_one(i)
+    finally:
+        predictor.reset_image()
+    return masks
+
+
+def mask_to_polygon(mask, orig_w, orig_h, area_threshold, epsilon=SIMPLIFY_EPSILON, max_vertices=MAX_VERTICES):
+    """
+    가장 큰 외곽선을 단순화해 원본 w/h로 정규화한 polygon.
+    외곽선이 없으면 None, 너무 작으면(단순화 전 면적 기준) 빈 리스트를 반환합니다.
+    """
+    contour = largest_contour(mask)
+    if contour is None:
+        return None
+    if cv2.contourArea(contour) < area_threshold:
+        return []
+    return normalize_polygon(simplify_contour(contour, epsilon, max_vertices), orig_w, orig_h)
 
-# SAM 모델 로드 (sam_l 복귀: 정확도 ↑)
-try:
-    sam = SAM('sam_l.pt')  # 원본 크기 최적화
-except Exception as e:
-    print(f"SAM 로드 오류: {e}. 'sam_b.pt' 시도하세요.")
-    exit(1)
-
-# 2. 이미지별 처리 (멀티 알약 지원)
-processed_count = 0
-skipped_count = 0
-PAD_RATIO = 0.05  # 패딩 줄임 (5% – bbox 과도 적용 방지)
-AREA_THRESHOLD = 30  # 작은 pill 허용
 
-for img_id, img_info in images.items():
-    if img_id not in anns_by_image: 
-        skipped_count += 1
-        continue
-    
+def _log(message):
+    if VERBOSE:
+        print(message)
+
+
+def txt_path_for(file_name):
+    return SEG_PROC_DIR / f"{file_name.replace('.png', '.txt')}"
+
+
+def image_signature(img_info, image_anns):
+    """이미지 결과에 영향을 주는 입력(어노테이션, 이미지 크기, SAM/후처리 설정)의 해시"""
+    payload = {
+        'file_name': img_info['file_name'],
+        'size': [img_info['width'], img_info['height']],
+        'anns': [[ann.get('category_id'), ann.get('bbox')] for ann in image_anns],
+        'config': [SAM_WEIGHTS, PAD_RATIO, AREA_THRESHOLD,
+                   SIMPLIFY_EPSILON, MAX_VERTICES, COORD_PRECISION],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# =================================================================
+# 진행 상태 manifest (JSON Lines, 이미지 1장 = 1줄, 같은 id는 마지막 줄이 유효)
+# =================================================================
+def load_manifest(manifest_path=MANIFEST_PATH):
+    entries = {}
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 중단 시 마지막 줄이 잘렸을 수 있습니다.
+            entries[entry['image_id']] = entry
+    return entries
+
+
+def is_up_to_date(entry, signature):
+    """manifest 기록의 signature가 같고, 기록된 .txt와 마스크 파일이 그대로 남아 있으면 다시 처리하지 않습니다."""
+    if entry is None or entry.get('signature') != signature:
+        return False
+    if entry.get('num_masks') and not os.path.exists(rle_path_for(MASKS_DIR, entry['file_name'])):
+        return False
+    if entry.get('txt_size') is None:  # 폴리곤이 없어 .txt를 만들지 않은 이미지
+        return True
+    txt_path = txt_path_for(entry['file_name'])
+    return txt_path.exists() and txt_path.stat().st_size == entry['txt_size']
+
+
+# =================================================================
+# 이미지 1장 처리
+# =================================================================
+def process_image(predictor, img_info, image_anns, categories, mask_writer):
+    """
+    이미지 1장의 모든 어노테이션을 SAM으로 segmentation해 .txt(YOLO polygon)를 저장하고,
+    마스크는 mask_writer(백그라운드 RLE 저장)에 넘깁니다.
+    (상태, 처리한 어노테이션 수, .txt 크기, 마스크 수)를 반환합니다.
+    """
     file_name = img_info['file_name']
     img_path = TRAIN_IMAGES_DIR / file_name
     if not img_path.exists():
         print(f"이미지 없음 (스킵): {img_path}")
-        skipped_count += 1
-        continue
-    
+        return 'missing', 0, None, 0
+
     # 이미지 로드 (원본 크기 유지: 976x1280)
     img = cv2.imread(str(img_path))
     if img is None:
         print(f"이미지 로드 실패 (스킵): {img_path}")
-        skipped_count += 1
-        continue
-    
+        return 'unreadable', 0, None, 0
+
     h, w = img.shape[:2]  # 원본 976x1280 (h x w)
     txt_lines = []  # 멀티 객체용 .txt 라인들
-    
-    # 이미지 내 어노테이션(알약)별 SAM 처리
-    for ann in anns_by_image[img_id]:
+    mask_records = []  # RLE로 저장할 마스크
+    processed = 0
+
+    # 이미지 내 어노테이션(알약)별 프롬프트 준비
+    valid_anns = []
+    for ann in image_anns:
         class_id = ann['category_id']
         class_name = categories.get(class_id, f"Class_{class_id}")
-        print(f"처리 중: {file_name} - {class_name} (ID: {class_id})")
-        
+        _log(f"처리 중: {file_name} - {class_name} (ID: {class_id})")
+
         bbox = ann.get('bbox', [])
         if not isinstance(bbox, list) or len(bbox) != 4:
             print(f"  → Skipped invalid bbox for ann {ann.get('id', 'unknown')}: {bbox}")
             continue
-        
-        # BBox 패딩: 최소 확장으로 prompt 강화
-        pad_w, pad_h = bbox[2] * PAD_RATIO, bbox[3] * PAD_RATIO
-        x1 = max(0, bbox[0] - pad_w / 2)
-        y1 = max(0, bbox[1] - pad_h / 2)
-        x2 = min(w, bbox[0] + bbox[2] + pad_w / 2)
-        y2 = min(h, bbox[1] + bbox[3] + pad_h / 2)
-        box_prompt = np.array([x1, y1, x2, y2])
-        
-        # Point Prompt: bbox 중심 포인트 (원형 알약 경계 강화)
-        center_x = (x1 + x2) / 2
-        center_y = (y1 + y2) / 2
-        point_prompt = np.array([[center_x, center_y]])
-        
-        # SAM 예측 (box + point prompt)
-        results = sam(img, bboxes=box_prompt.reshape(1, -1), points=point_prompt, save=False)
-        if len(results[0].masks.data) == 0:
-            print(f"  → 마스크 생성 실패 (스킵): {class_name}")
-            continue
-        
-        mask = results[0].masks.data[0].cpu().numpy().astype(np.uint8) * 255
-        print(f"  → 마스크 생성 성공: {class_name} (area: {np.sum(mask > 0)} 픽셀)")
-        
-        # 마스크 저장: 클래스별 별도 PNG (오버레이: 원본 + 녹색 마스크)
-        overlay = img.copy()
-        overlay[mask > 0] = [0, 255, 0]  # 녹색 표시
-        mask_path = SEG_PROC_DIR / f"{file_name.replace('.png', f'_{class_id}_mask.png')}"
-        cv2.imwrite(str(mask_path), overlay)
-        print(f"  → Mask PNG 저장: {mask_path}")
-        
-        # 마스크 → Polygon (YOLO 형식) – 원본 정규화
+        valid_anns.append(ann)
+
+    if valid_anns:
+        # BBox 패딩: 최소 확장으로 prompt 강화 (N, 4) xyxy
+        bboxes = np.array([ann['bbox'] for ann in valid_anns], dtype=np.float64)
+        pad_w, pad_h = bboxes[:, 2] * PAD_RATIO, bboxes[:, 3] * PAD_RATIO
+        x1 = np.maximum(0, bboxes[:, 0] - pad_w / 2)
+        y1 = np.maximum(0, bboxes[:, 1] - pad_h / 2)
+        x2 = np.minimum(w, bboxes[:, 0] + bboxes[:, 2] + pad_w / 2)
+        y2 = np.minimum(h, bboxes[:, 1] + bboxes[:, 3] + pad_h / 2)
+        box_prompts = np.stack([x1, y1, x2, y2], axis=1)
+
+        # Point Prompt: bbox 중심 포인트 (원형 알약 경계 강화) (N, 2)
+        point_prompts = np.stack([(x1 + x2) / 2, (y1 + y2) / 2], axis=1)
+
+        # SAM 예측 (box + point prompt): 이미지 인코딩 1회 + 프롬프트 디코딩
+        masks = segment_prompts(predictor, img, box_prompts, point_prompts)
+
+        # 마스크 → Polygon (YOLO 형식) – 원본 정규화 (모든 프롬프트를 모아서 처리)
         orig_h, orig_w = img_info['height'], img_info['width']
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours:
-            largest_contour = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(largest_contour) < AREA_THRESHOLD:
-                print(f"  → 작은 마스크 스킵: {class_name}")
+        for ann, mask in zip(valid_anns, masks):
+            class_id = ann['category_id']
+            class_name = categories.get(class_id, f"Class_{class_id}")
+            if mask is None:
+                print(f"  → 마스크 생성 실패 (스킵): {file_name} - {class_name}")
                 continue
-            polygon = largest_contour.flatten().tolist()
-            
-            # 정규화 (원본 w/h)
-            norm_polygon = [coord / orig_w if i % 2 == 0 else coord / orig_h for i, coord in enumerate(polygon)]
-            txt_line = f"{class_id} {' '.join(map(str, norm_polygon))}\n"
-            txt_lines.append(txt_line)
-            print(f"  → Polygon 추가: {len(norm_polygon)//2} 포인트")
-        
-        processed_count += 1
-        if processed_count % 5 == 0:
-            print(f"진행: {processed_count}개 어노테이션 처리됨")
-    
-    # .txt 파일 저장 (이미지당 하나, 멀티 라인)
-    if txt_lines:
-        txt_path = SEG_PROC_DIR / f"{file_name.replace('.png', '.txt')}"
-        with open(txt_path, 'w') as f:
-            f.writelines(txt_lines)
-        print(f"저장됨: {txt_path} ({len(txt_lines)} 객체)")
-
-print(f"완료! 총 처리: {processed_count}개 어노테이션. 스킵: {skipped_count}개. data/raw/seg_proc 폴더 확인하세요.")
-print("팁: PAD_RATIO=0.05로 bbox 과도 적용 ↓. area 로그로 마스크 품질 확인 – 4개 알약 PNG 재테스트!")
\ No newline at end of file
+            _log(f"  → 마스크 생성 성공: {class_name} (area: {np.sum(mask > 0)} 픽셀)")
+
+            # 마스크 저장: 이미지별 RLE 파일에 모아서 백그라운드로 기록 (오버레이는 render_overlays로 필요할 때만)
+            mask_records.append({'ann_id': ann.get('id'), 'category_id': class_id, 'mask': mask})
+
+            norm_polygon = mask_to_polygon(mask, orig_w, orig_h, AREA_THRESHOLD)
+            if norm_polygon == []:
+                _log(f"  → 작은 마스크 스킵: {class_name}")
+                continue
+            if norm_polygon is not None:
+                txt_line = f"{class_id} {format_polygon(norm_polygon, COORD_PRECISION)}\n"
+                txt_lines.append(txt_line)
+                _log(f"  → Polygon 추가: {len(norm_polygon)//2} 포인트")
+            processed += 1
+
+    if mask_records:
+        mask_writer.submit(file_name, h, w, mask_records)
+
+    # .txt 파일 저장 (이미지당 하나, 멀티 라인). 임시 파일에 쓴 뒤 교체해 중단 시 잘린 파일이 남지 않게 합니다.
+    txt_path = txt_path_for(file_name)
+    if not txt_lines:
+        if txt_path.exists():
+            txt_path.unlink()  # 이전 실행의 결과가 더 이상 맞지 않는 경우
+        return 'empty', processed, None, len(mask_records)
+    tmp_path = txt_path.with_suffix('.txt.tmp')
+    with open(tmp_path, 'w') as f:
+        f.writelines(txt_lines)
+    os.replace(tmp_path, txt_path)
+    _log(f"저장됨: {txt_path} ({len(txt_lines)} 객체)")
+    return 'done', processed, txt_path.stat().st_size, len(mask_records)
+
+
+# =================================================================
+# 워커 프로세스 (프로세스마다 SAM 1회 로드)
+# =================================================================
+_worker_predictor = None
+_worker_categories = None
+_worker_mask_writer = None
+
+
+def _init_worker(categories, num_threads):
+    global _worker_predictor, _worker_categories, _worker_mask_writer
+    torch.set_num_threads(num_threads)
+    _worker_predictor = load_sam_predictor(SAM_WEIGHTS)
+    _worker_categories = categories
+    _worker_mask_writer = MaskWriter(str(MASKS_DIR))
+    # 워커 프로세스가 종료될 때 남은 마스크를 모두 씁니다.
+    Finalize(_worker_mask_writer, _worker_mask_writer.close, exitpriority=10)
+
+
+def _process_task(task):
+    image_id, signature, img_info, image_anns = task
+    status, processed, txt_size, num_masks = process_image(
+        _worker_predictor, img_info, image_anns, _worker_categories, _worker_mask_writer
+    )
+    return {'image_id': image_id, 'file_name': img_info['file_name'], 'signature': signature,
+            'status': status, 'processed': processed, 'txt_size': txt_size, 'num_masks': num_masks}
+
+
+def _iter_results(tasks, categories, num_workers):
+    """작업 결과를 끝나는 순서대로 반환합니다. 워커가 1개면 현재 프로세스에서 처리합니다."""
+    num_threads = max(1, (os.cpu_count() or 1) // max(1, num_workers))
+    if num_workers <= 1:
+        _init_worker(categories, num_threads)
+        try:
+            for task in tasks:
+                yield _process_task(task)
+        finally:
+            _worker_mask_writer.close()
+        return
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp.get_context('spawn'),
+                             initializer=_init_worker, initargs=(categories, num_threads)) as executor:
+        futures = [executor.submit(_process_task, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def run_labeling(num_workers=NUM_WORKERS):
+    os.makedirs(SEG_PROC_DIR, exist_ok=True)
+
+    # 경로 확인 & 로그
+    print(f"스크립트 위치: {script_dir}")
+    print(f"JSON 파일: {JSON_FILE} (존재: {JSON_FILE.exists()})")
+    print(f"이미지 폴더: {TRAIN_IMAGES_DIR} (존재: {TRAIN_IMAGES_DIR.exists()})")
+    print(f"Seg 출력 폴더: {SEG_PROC_DIR} (존재: {SEG_PROC_DIR.exists()})")
+
+    if not JSON_FILE.exists():
+        raise FileNotFoundError(f"JSON 파일을 찾을 수 없어요: {JSON_FILE}. data/processed/에 확인하세요.")
+
+    # 1. 카테고리 로드 (이미지/어노테이션은 이미지 단위로 스트리밍)
+    # 카테고리 매핑 (e.g., 1899 → 'K-001900')
+    categories = {cat['id']: cat['name'].replace(' ', '_') for cat in load_merged_categories(str(JSON_FILE))}
+    all_class_ids = list(categories)
+    print(f"처리할 클래스 수: {len(all_class_ids)} (e.g., {all_class_ids[:3]})")
+
+    # 2. 처리할 이미지 선택 (manifest 기준으로 이미 끝난 이미지는 건너뜀)
+    manifest = load_manifest()
+    tasks = []
+    skipped_count = up_to_date = 0
+    for img_info, image_anns in iter_merged_images(str(JSON_FILE)):
+        if not image_anns:
+            skipped_count += 1
+            continue
+        image_id = img_info['id']
+        signature = image_signature(img_info, image_anns)
+        if is_up_to_date(manifest.get(image_id), signature):
+            up_to_date += 1
+            continue
+        tasks.append((image_id, signature, img_info, image_anns))
+    print(f"처리 대상: {len(tasks)}장 (이미 완료: {up_to_date}장, 어노테이션 없음: {skipped_count}장, 워커 {num_workers}개)")
+    if not tasks:
+        print("완료! 새로 처리할 이미지가 없습니다.")
+        return
+
+    # 3. 이미지별 처리 (멀티 알약 지원) + manifest 기록
+    processed_count = 0
+    start = time.perf_counter()
+    with open(MANIFEST_PATH, 'a', encoding='utf-8') as manifest_file, \
+            tqdm(total=len(tasks), desc="SAM 라벨링", unit="img") as pbar:
+        for entry in _iter_results(tasks, categories, num_workers):
+            if entry['status'] in ('done', 'empty'):
+                # 이미지가 없거나 읽지 못한 경우는 기록하지 않아 다음 실행에서 다시 시도합니다.
+                manifest_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                manifest_file.flush()
+            else:
+                skipped_count += 1
+            processed_count += entry['processed']
+            pbar.update(1)
+            # tqdm이 이미지 처리량(img/s)과 남은 시간(ETA)을 표시하고, 어노테이션 처리량을 함께 표시합니다.
+            pbar.set_postfix(anns_per_s=f"{processed_count / (time.perf_counter() - start):.2f}")
+
+    elapsed = time.perf_counter() - start
+    print(f"완료! 총 처리: {processed_count}개 어노테이션 ({len(tasks) / elapsed:.2f} img/s, {elapsed:.1f}s). "
+          f"스킵: {skipped_count}개. data/raw/seg_proc 폴더 확인하세요.")
+    print("팁: PAD_RATIO=0.05로 bbox 과도 적용 ↓. area 로그로 마스크 품질 확인 – 4개 알약 PNG 재테스트!")
+
+    # 4. 확인용 오버레이 (요청한 이미지만)
+    if OVERLAY_FILES or OVERLAY_SAMPLE:
+        render_overlays(str(MASKS_DIR), str(TRAIN_IMAGES_DIR), str(OVERLAY_DIR),
+                        file_names=OVERLAY_FILES, limit=OVERLAY_SAMPLE or None)
+
+
+if __name__ == '__main__':
+    run_labeling()
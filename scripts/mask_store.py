@@ -0,0 +1,177 @@
+import os
+import json
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+# =================================================================
+# SAM 마스크 저장소
+#  : 마스크를 COCO RLE(압축 문자열, pycocotools와 같은 형식)로 이미지별 JSON(<stem>.rle.json)에 저장합니다.
+#    - 인코딩/파일 쓰기는 백그라운드 스레드(MaskWriter)에서 처리해 라벨링 루프를 막지 않습니다.
+#    - 확인용 오버레이는 render_overlays()로 필요한 이미지만 나중에 그립니다.
+# =================================================================
+
+
+def encode_rle(mask):
+    """2차원 마스크 -> COCO RLE {'size': [h, w], 'counts': str} (column-major, 0부터 시작)"""
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    flat = mask.ravel(order='F')
+    if flat.size == 0:
+        return {'size': [h, w], 'counts': ''}
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], change, [flat.size]))).tolist()
+    if flat[0]:
+        counts.insert(0, 0)
+
+    # pycocotools rleToString과 같은 압축: 2칸 앞 값과의 차이를 5비트씩 나눠 문자로 저장
+    chars = []
+    for i, count in enumerate(counts):
+        x = count - counts[i - 2] if i > 2 else count
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return {'size': [h, w], 'counts': ''.join(chars)}
+
+
+def decode_rle(rle):
+    """COCO RLE -> uint8 마스크 (h, w), 값은 0/1"""
+    h, w = rle['size']
+    s = rle['counts']
+    counts = []
+    p = 0
+    while p < len(s):
+        x = k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1f) << (5 * k)
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+
+    values = np.zeros(len(counts), dtype=np.uint8)
+    values[1::2] = 1
+    flat = np.repeat(values, counts)
+    return flat.reshape((w, h)).T.copy() if flat.size else np.zeros((h, w), dtype=np.uint8)
+
+
+def rle_path_for(masks_dir, file_name):
+    return os.path.join(masks_dir, os.path.splitext(file_name)[0] + '.rle.json')
+
+
+def write_mask_file(masks_dir, file_name, height, width, masks):
+    """masks: [{'ann_id', 'category_id', 'mask'}, ...] -> <stem>.rle.json (임시 파일에 쓴 뒤 교체)"""
+    records = []
+    for item in masks:
+        mask = item['mask']
+        records.append({
+            'ann_id': item.get('ann_id'),
+            'category_id': item['category_id'],
+            'area': int(np.count_nonzero(mask)),
+            'rle': encode_rle(mask),
+        })
+    path = rle_path_for(masks_dir, file_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'file_name': file_name, 'height': height, 'width': width, 'masks': records}, f,
+                  separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_mask_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class MaskWriter:
+    """
+    RLE 인코딩과 파일 쓰기를 백그라운드 스레드에서 처리합니다.
+    큐 크기(max_pending)만큼만 마스크를 쌓아 메모리를 제한하고, close()에서 남은 작업을 모두 씁니다.
+    쓰기 중 발생한 오류는 다음 submit()/close()에서 다시 발생시킵니다.
+    """
+
+    def __init__(self, masks_dir, max_pending=8):
+        self.masks_dir = masks_dir
+        os.makedirs(masks_dir, exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='MaskWriter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    write_mask_file(self.masks_dir, *item)
+            except Exception as e:  # 오류는 메인 스레드에서 다시 발생시킵니다.
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, file_name, height, width, masks):
+        self._raise_error()
+        self._queue.put((file_name, height, width, masks))
+
+    def flush(self):
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+def render_overlays(masks_dir, images_dir, output_dir, file_names=None, limit=None, color=(0, 255, 0)):
+    """
+    저장된 RLE 마스크를 원본 이미지 위에 칠한 확인용 오버레이 PNG(<stem>_overlay.png)를 만듭니다.
+    file_names를 주면 그 이미지들만, 없으면 masks_dir의 앞쪽 limit장만 렌더링합니다.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if file_names is None:
+        paths = sorted(os.path.join(masks_dir, name) for name in os.listdir(masks_dir) if name.endswith('.rle.json'))
+    else:
+        paths = [rle_path_for(masks_dir, name) for name in file_names]
+    if limit is not None:
+        paths = paths[:limit]
+
+    saved = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"⚠️ 마스크 파일 없음 (스킵): {path}")
+            continue
+        record = read_mask_file(path)
+        img = cv2.imread(os.path.join(images_dir, record['file_name']))
+        if img is None:
+            print(f"⚠️ 이미지 로드 실패 (스킵): {record['file_name']}")
+            continue
+        for item in record['masks']:
+            img[decode_rle(item['rle']) > 0] = color
+        save_path = os.path.join(output_dir, f"{os.path.splitext(record['file_name'])[0]}_overlay.png")
+        cv2.imwrite(save_path, img)
+        saved.append(save_path)
+    print(f"✅ 오버레이 {len(saved)}장 저장: {output_dir}")
+    return saved
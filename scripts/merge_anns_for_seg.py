@@ -1,8 +1,13 @@
 import json
 import os
+import glob
 import hashlib
 from collections import defaultdict
 
+from tqdm import tqdm
+
+from annotation_index import build_index
+
 def get_image_id(file_name):
     return int(hashlib.md5(file_name.encode()).hexdigest(), 16) % (2**31)
 
@@ -10,77 +15,73 @@ def get_base_file_name(file_name):
     """file_name에서 subfolder 영향 제거 (공통 이미지 이름)"""
     return file_name.split('_json')[0] if '_json' in file_name else file_name
 
+def _json_number(value):
+    """인덱스의 float64 좌표를 원본 JSON처럼 정수는 정수로 되돌립니다."""
+    return int(value) if value.is_integer() else value
+
 def merge_annotations(annotations_dir, output_json_path):
+    """
+    annotations_dir의 JSON을 하나의 COCO 형식 JSON으로 통합합니다.
+    JSON을 다시 읽지 않고 공용 어노테이션 인덱스의 컬럼으로 만들므로, images/annotations에는
+    이후 단계(json_2_seg(SAM).py)가 사용하는 필드만 남습니다.
+      - images     : id, file_name, width, height, dl_idx, dl_name
+      - annotations: id, image_id, category_id, bbox
+    """
+    # 공용 어노테이션 인덱스 (변경된 JSON만 다시 파싱)
+    index = build_index(annotations_dir)
+    ann_source = index.ann_source.tolist()
+    ann_bbox = index.ann_bbox.tolist()
+    ann_dl_idx = index.ann_dl_idx.tolist()
+    ann_dl_name = index.ann_dl_name.tolist()
+
+    # 유효한 bbox가 없는(또는 읽을 수 없는) JSON은 건너뜁니다.
+    loaded_sources = set(ann_source)
+    skipped_files = [os.path.basename(rel_path) for j, rel_path in enumerate(index.sources) if j not in loaded_sources]
+
+    # annotation id는 기존처럼 JSON 경로 순서로 1부터 부여합니다.
+    ann_ids = [0] * len(ann_source)
+    for ann_id, row in enumerate(sorted(range(len(ann_source)), key=ann_source.__getitem__), start=1):
+        ann_ids[row] = ann_id
+
     all_images = []
-    all_annotations = []
     all_categories = set()  # (id, name) 튜플
     image_to_ann = defaultdict(list)  # base_file_name → list of anns (멀티 클래스 합침)
     image_to_info = {}  # base_file_name → img_info (중복 피함)
-    ann_id_counter = 1
-    skipped_files = []
-    loaded_files = 0
-
-    for root, dirs, files in os.walk(annotations_dir):
-        for file in files:
-            if file.endswith('.json'):
-                json_path = os.path.join(root, file)
-                print(f"Loading: {json_path}")
-                try:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # bbox 누락 검사
-                    if not data.get('annotations') or not any('bbox' in ann and ann['bbox'] for ann in data['annotations']):
-                        print(f"  - Skipping: No valid bbox in {file}")
-                        skipped_files.append(file)
-                        continue
-                    
-                    loaded_files += 1
-                    img_info = data['images'][0]
-                    base_file_name = get_base_file_name(img_info['file_name'])
-                    
-                    # img_info 저장 (중복 피함, 첫 번째 사용)
-                    if base_file_name not in image_to_info:
-                        img_info['id'] = get_image_id(img_info['file_name'])
-                        image_to_info[base_file_name] = img_info
-                        all_images.append(img_info)
-                    
-                    # Categories 쌓기: dl_idx/dl_name unique
-                    dl_idx = img_info.get('dl_idx', None)
-                    dl_name = img_info.get('dl_name', 'Unknown_Drug')
-                    print(f"  - dl_idx: '{dl_idx}', dl_name: '{dl_name}'")
-                    if dl_idx and dl_idx.isdigit():
-                        class_id = int(dl_idx)
-                        class_name = dl_name.replace(' ', '_')
-                        tuple_key = (class_id, class_name)
-                        if tuple_key not in all_categories:
-                            all_categories.add(tuple_key)
-                            print(f"  - Added unique category: ID={class_id}, name={class_name}")
-                    
-                    # Annotations 추가 (멀티 클래스 합침)
-                    for ann in data['annotations']:
-                        ann['id'] = ann_id_counter
-                        ann['image_id'] = image_to_info[base_file_name]['id']
-                        # category_id = dl_idx (원본 ID)
-                        dl_idx = img_info.get('dl_idx', 1)
-                        ann['category_id'] = int(dl_idx) if dl_idx.isdigit() else 1
-                        ann_id_counter += 1
-                        image_to_ann[base_file_name].append(ann)
-                    
-                    print(f"  - Loaded: {len(data['annotations'])} anns for base {base_file_name}, category_id={ann['category_id']}")
-                
-                except json.JSONDecodeError as e:
-                    print(f"  - JSON Error in {file}: {e}")
-                    skipped_files.append(file)
+    for file_name, width, height, rows in tqdm(index.iter_images(), total=len(index), desc="어노테이션 병합 중"):
+        if rows.start == rows.stop:
+            continue
+        base_file_name = get_base_file_name(file_name)
+
+        # img_info 저장 (중복 피함, 첫 번째 사용)
+        if base_file_name not in image_to_info:
+            dl_idx = ann_dl_idx[rows.start]
+            img_info = {'file_name': file_name, 'width': width, 'height': height,
+                        'dl_idx': str(dl_idx) if dl_idx >= 0 else None,
+                        'dl_name': index.dl_names[ann_dl_name[rows.start]],
+                        'id': get_image_id(file_name)}
+            image_to_info[base_file_name] = img_info
+            all_images.append(img_info)
+
+        # Categories 쌓기 (dl_idx/dl_name unique) 및 Annotations 추가 (category_id = dl_idx 원본 ID)
+        for row in range(rows.start, rows.stop):
+            dl_idx = ann_dl_idx[row]
+            if dl_idx >= 0:
+                all_categories.add((dl_idx, (index.dl_names[ann_dl_name[row]] or 'Unknown_Drug').replace(' ', '_')))
+            image_to_ann[base_file_name].append({
+                'id': ann_ids[row],
+                'image_id': image_to_info[base_file_name]['id'],
+                'category_id': dl_idx if dl_idx >= 0 else 1,
+                'bbox': [_json_number(v) for v in ann_bbox[row]],
+            })
 
     # Categories: ID 오름차순 정렬
     categories = [{'supercategory': 'pill', 'id': cid, 'name': name} for cid, name in sorted(all_categories, key=lambda x: x[0])]
     
-    # Annotations: 멀티 ann 합침
+    # Annotations: 멀티 ann 합침 (이미지별로 JSON 경로 순서)
     merged_annotations = []
-    for base_file_name, anns in image_to_ann.items():
-        merged_annotations.extend(anns)
-        print(f"  - Merged for {base_file_name}: {len(anns)} anns from multi classes")  # 멀티 bbox 확인
+    for anns in image_to_ann.values():
+        merged_annotations.extend(sorted(anns, key=lambda ann: ann['id']))
+    multi_class_images = sum(1 for anns in image_to_ann.values() if len({ann['category_id'] for ann in anns}) > 1)
     
     integrated_data = {
         'images': all_images,
@@ -93,11 +94,217 @@ def merge_annotations(annotations_dir, output_json_path):
         json.dump(integrated_data, f, indent=2, ensure_ascii=False)
     
     print(f"통합 완료: {len(all_images)} 이미지, {len(merged_annotations)} 어노테이션, {len(categories)} 클래스")
-    print(f"Loaded files: {loaded_files}, Skipped: {len(skipped_files)} ({skipped_files[:5] if skipped_files else []})")
+    print(f"Loaded files: {len(loaded_sources)}, Skipped: {len(skipped_files)} ({skipped_files[:5] if skipped_files else []})")
+    print(f"Multi-class images: {multi_class_images}")
     print(f"Categories sample: {categories[:10]}...")
     return integrated_data
 
+# =================================================================
+# 스트리밍 병합 (메모리 사용량 제한)
+#  : 같은 이미지(merge_annotations와 같은 get_base_file_name(images[0].file_name) 기준)의 JSON끼리 묶어
+#    이미지 1장씩 처리하고 바로 파일에 씁니다. 묶음은 공용 어노테이션 인덱스(annotation_index.py)로 만들고,
+#    원본 JSON은 해당 이미지를 처리할 때만 디스크에서 읽습니다.
+#    전체 이미지/어노테이션을 메모리에 모으지 않으며, 들여쓰기 없는 compact JSON으로 저장합니다.
+#    - 'jsonl'   : 한 줄에 이미지 1장 {"image": {...}, "annotations": [...]} (output_path 그대로)
+#    - 'sharded' : shard_size장씩 COCO 형식 조각 파일 (<이름>_00000.json, <이름>_00001.json, ...)
+#    카테고리와 개수는 작은 sidecar 파일 <이름>.meta.json에 저장합니다.
+# =================================================================
+
+MERGE_FORMATS = ('jsonl', 'sharded')
+COMPACT_SEPARATORS = (',', ':')
+
+
+def meta_path_for(output_path):
+    return os.path.splitext(output_path)[0] + '.meta.json'
+
+
+def _shard_path(output_path, shard_index):
+    return f"{os.path.splitext(output_path)[0]}_{shard_index:05d}.json"
+
+
+def _merge_image_group(json_paths, categories, ann_id_start):
+    """
+    같은 이미지의 JSON들을 이미지 1장의 (img_info, annotations)로 합칩니다. (merge_annotations와 같은 규칙)
+    유효한 bbox가 있는 JSON이 없으면 img_info는 None입니다.
+    """
+    img_info = None
+    annotations = []
+    skipped = []
+    ann_id = ann_id_start
+    for json_path in json_paths:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            skipped.append(os.path.basename(json_path))
+            continue
+        # bbox 누락 검사
+        if not data.get('annotations') or not any('bbox' in ann and ann['bbox'] for ann in data['annotations']):
+            skipped.append(os.path.basename(json_path))
+            continue
+
+        file_info = data['images'][0]
+        # img_info 저장 (첫 번째 사용)
+        if img_info is None:
+            img_info = file_info
+            img_info['id'] = get_image_id(img_info['file_name'])
+
+        # Categories 쌓기: dl_idx/dl_name unique
+        dl_idx = file_info.get('dl_idx', None)
+        if dl_idx and dl_idx.isdigit():
+            categories.setdefault(int(dl_idx), file_info.get('dl_name', 'Unknown_Drug').replace(' ', '_'))
+
+        # Annotations 추가 (category_id = dl_idx 원본 ID)
+        category_id = int(dl_idx) if dl_idx and dl_idx.isdigit() else 1
+        for ann in data['annotations']:
+            ann['id'] = ann_id
+            ann['image_id'] = img_info['id']
+            ann['category_id'] = category_id
+            ann_id += 1
+            annotations.append(ann)
+    return img_info, annotations, skipped
+
+
+def merge_annotations_streaming(annotations_dir, output_path, fmt='jsonl', shard_size=1000):
+    """
+    annotations_dir의 JSON을 이미지 단위로 스트리밍 병합해 output_path(jsonl) 또는 조각 파일(sharded)로 저장합니다.
+    메모리에는 인덱스와 현재 이미지(sharded는 현재 조각), 카테고리 목록만 유지합니다.
+    """
+    if fmt not in MERGE_FORMATS:
+        raise ValueError(f"지원하지 않는 병합 형식: {fmt} (지원: {MERGE_FORMATS})")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    # 인덱스의 JSON별 이미지로 같은 이미지의 JSON을 묶습니다. (정렬된 JSON 경로에서 처음 등장한 이미지 순서)
+    index = build_index(annotations_dir)
+    groups = defaultdict(list)  # base_file_name -> JSON 경로 목록
+    skipped_files = []
+    for rel_path, image_code in zip(index.sources, index.source_image.tolist()):
+        if image_code < 0:
+            # images/annotations가 없거나 읽을 수 없는 JSON
+            skipped_files.append(os.path.basename(rel_path))
+            continue
+        base_file_name = get_base_file_name(index.image_file_names[image_code])
+        groups[base_file_name].append(os.path.join(index.meta['annotation_dir'], rel_path))
+
+    categories = {}
+    files = []
+    num_images = num_annotations = 0
+    shard = {'images': [], 'annotations': []}
+    jsonl_file = None
+    if fmt == 'jsonl':
+        tmp_path = f"{output_path}.tmp"
+        jsonl_file = open(tmp_path, 'w', encoding='utf-8')
+
+    def flush_shard():
+        path = _shard_path(output_path, len(files))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(shard, type='instances'), f, ensure_ascii=False, separators=COMPACT_SEPARATORS)
+        files.append(os.path.basename(path))
+        shard['images'], shard['annotations'] = [], []
+
+    try:
+        with tqdm(total=len(index.sources) - len(skipped_files), desc="어노테이션 병합 중") as pbar:
+            for group in groups.values():
+                img_info, annotations, skipped = _merge_image_group(group, categories, num_annotations + 1)
+                pbar.update(len(group))
+                skipped_files.extend(skipped)
+                if img_info is None:
+                    continue
+                num_images += 1
+                num_annotations += len(annotations)
+                if jsonl_file is not None:
+                    jsonl_file.write(json.dumps({'image': img_info, 'annotations': annotations},
+                                                ensure_ascii=False, separators=COMPACT_SEPARATORS) + '\n')
+                else:
+                    shard['images'].append(img_info)
+                    shard['annotations'].extend(annotations)
+                    if len(shard['images']) >= shard_size:
+                        flush_shard()
+        if jsonl_file is not None:
+            jsonl_file.close()
+            os.replace(tmp_path, output_path)
+            files.append(os.path.basename(output_path))
+        elif shard['images']:
+            flush_shard()
+    finally:
+        if jsonl_file is not None and not jsonl_file.closed:
+            jsonl_file.close()
+
+    # 이전 실행이 남긴 조각/출력 파일 중 이번 결과에 속하지 않는 것은 지웁니다.
+    for path in glob.glob(f"{glob.escape(os.path.splitext(output_path)[0])}_[0-9][0-9][0-9][0-9][0-9].json") + [output_path]:
+        if os.path.basename(path) not in files and os.path.exists(path):
+            os.remove(path)
+
+    meta = {
+        'format': fmt,
+        'type': 'instances',
+        'files': files,
+        'num_images': num_images,
+        'num_annotations': num_annotations,
+        'categories': [{'supercategory': 'pill', 'id': cid, 'name': name} for cid, name in sorted(categories.items())],
+        'skipped_files': skipped_files,
+    }
+    meta_path = meta_path_for(output_path)
+    with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+    print(f"통합 완료: {num_images} 이미지, {num_annotations} 어노테이션, {len(categories)} 클래스 ({fmt}, 파일 {len(files)}개)")
+    print(f"Skipped: {len(skipped_files)} ({skipped_files[:5]})")
+    return meta
+
+
+def load_merged_categories(merged_path):
+    """병합 결과의 categories 목록 (sidecar meta, 없으면 기존 통합 JSON에서 읽습니다)"""
+    meta_path = meta_path_for(merged_path)
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['categories']
+    with open(merged_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['categories']
+
+
+def iter_merged_images(merged_path):
+    """
+    병합 결과에서 (img_info, annotations)를 이미지 단위로 반환합니다.
+    jsonl은 한 줄씩, sharded는 조각 파일 1개씩만 읽습니다. sidecar meta가 없으면 기존 통합 JSON 전체를 읽습니다.
+    """
+    meta_path = meta_path_for(merged_path)
+    if not os.path.exists(meta_path):
+        with open(merged_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        anns_by_image = defaultdict(list)
+        for ann in data['annotations']:
+            anns_by_image[ann['image_id']].append(ann)
+        for img_info in data['images']:
+            yield img_info, anns_by_image.get(img_info['id'], [])
+        return
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    base_dir = os.path.dirname(merged_path)
+    for file_name in meta['files']:
+        path = os.path.join(base_dir, file_name)
+        if meta['format'] == 'jsonl':
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        yield record['image'], record['annotations']
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            anns_by_image = defaultdict(list)
+            for ann in data['annotations']:
+                anns_by_image[ann['image_id']].append(ann)
+            for img_info in data['images']:
+                yield img_info, anns_by_image.get(img_info['id'], [])
+
+
 # 실행
-annotations_dir = "data/raw/train_labels/"
-output_path = "data/processed/train_annotations_integrated.json"
-data = merge_annotations(annotations_dir, output_path)
\ No newline at end of file
+if __name__ == '__main__':
+    annotations_dir = "data/raw/train_labels/"
+    # 'jsonl'(기본) 또는 'sharded'. 기존처럼 하나의 큰 JSON이 필요하면 merge_annotations를 사용하세요.
+    MERGE_FORMAT = 'jsonl'
+    output_path = "data/processed/train_annotations_integrated.jsonl"
+    merge_annotations_streaming(annotations_dir, output_path, fmt=MERGE_FORMAT)
@@ -0,0 +1,139 @@
+import os
+import json
+
+import cv2
+import numpy as np
+
+from mask_store import decode_rle, read_mask_file
+
+# =================================================================
+# 폴리곤 단순화
+#  : SAM 마스크의 외곽선(CHAIN_APPROX_SIMPLE)을 Douglas–Peucker(cv2.approxPolyDP)로 줄이고,
+#    꼭짓점 수가 max_vertices를 넘으면 허용 오차를 키워 예산 안으로 맞춥니다.
+#    좌표는 고정 소수점(precision자리)으로 기록해 라벨 파일 크기와 학습 시 파싱 비용을 줄입니다.
+#
+#  단독 실행 시 저장된 RLE 마스크(seg_proc/masks)로 설정별 리포트를 출력합니다.
+#    (꼭짓점 수, 라벨 크기 감소율, 원본 외곽선 대비 마스크 IoU)
+# =================================================================
+
+MIN_VERTICES = 3
+EPSILON_GROWTH = 1.5  # 예산을 넘을 때 허용 오차를 늘리는 배율
+MAX_EPSILON_STEPS = 30
+
+
+def largest_contour(mask):
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    return max(contours, key=cv2.contourArea)
+
+
+def simplify_contour(contour, epsilon=1.0, max_vertices=None):
+    """
+    contour (N, 1, 2)를 epsilon(px) 허용 오차로 단순화합니다.
+    epsilon이 0 이하이면 그대로 두고, 결과가 MIN_VERTICES보다 적어지면 마지막으로 유효했던 결과를 사용합니다.
+    """
+    simplified = contour if epsilon <= 0 else cv2.approxPolyDP(contour, epsilon, True)
+    if len(simplified) < MIN_VERTICES:
+        return contour
+    if max_vertices is None:
+        return simplified
+
+    eps = max(epsilon, 0.5)
+    for _ in range(MAX_EPSILON_STEPS):
+        if len(simplified) <= max_vertices:
+            break
+        eps *= EPSILON_GROWTH
+        candidate = cv2.approxPolyDP(contour, eps, True)
+        if len(candidate) < MIN_VERTICES:
+            break
+        simplified = candidate
+    return simplified
+
+
+def normalize_polygon(contour, orig_w, orig_h):
+    """(N, 1, 2) 픽셀 좌표 -> [x1/w, y1/h, x2/w, y2/h, ...]"""
+    polygon = contour.reshape(-1, 2).astype(np.float64) / [orig_w, orig_h]
+    return polygon.ravel().tolist()
+
+
+def format_polygon(norm_polygon, precision=6):
+    """고정 소수점 문자열. precision이 None이면 기존처럼 repr(str) 그대로 기록합니다."""
+    if precision is None:
+        return ' '.join(map(str, norm_polygon))
+    return ' '.join(f"{coord:.{precision}f}" for coord in norm_polygon)
+
+
+def polygon_mask_iou(reference, contour, shape):
+    """두 외곽선을 shape 크기로 채워 그린 마스크의 IoU"""
+    ref_mask = np.zeros(shape, dtype=np.uint8)
+    new_mask = np.zeros(shape, dtype=np.uint8)
+    cv2.fillPoly(ref_mask, [reference.reshape(-1, 2)], 1)
+    cv2.fillPoly(new_mask, [contour.reshape(-1, 2)], 1)
+    union = np.count_nonzero(ref_mask | new_mask)
+    return float(np.count_nonzero(ref_mask & new_mask)) / union if union else 1.0
+
+
+# =================================================================
+# 리포트
+# =================================================================
+def simplification_report(masks_dir, settings, sample=200, area_threshold=30, precision=6):
+    """
+    masks_dir의 RLE 마스크(앞에서부터 sample장)로 settings [(epsilon, max_vertices), ...]를 비교합니다.
+    기준은 기존 방식(CHAIN_APPROX_SIMPLE 외곽선 + str 좌표)입니다.
+    """
+    paths = sorted(os.path.join(masks_dir, name) for name in os.listdir(masks_dir) if name.endswith('.rle.json'))
+    if sample:
+        paths = paths[:sample]
+
+    contours = []  # (외곽선, 마스크 크기, 원본 w, h)
+    for path in paths:
+        record = read_mask_file(path)
+        for item in record['masks']:
+            contour = largest_contour(decode_rle(item['rle']))
+            if contour is not None and cv2.contourArea(contour) >= area_threshold:
+                contours.append((contour, tuple(item['rle']['size']), record['width'], record['height']))
+    if not contours:
+        print(f"⚠️ 리포트에 사용할 마스크가 없습니다: {masks_dir}")
+        return []
+
+    raw_vertices = np.array([len(c) for c, _, _, _ in contours])
+    raw_bytes = sum(len(format_polygon(normalize_polygon(c, w, h), None)) for c, _, w, h in contours)
+    rows = [{
+        'setting': 'raw', 'epsilon': None, 'max_vertices': None, 'precision': None,
+        'mean_vertices': round(float(raw_vertices.mean()), 1), 'max_vertices_seen': int(raw_vertices.max()),
+        'bytes': raw_bytes, 'size_ratio': 1.0, 'mean_iou': 1.0, 'min_iou': 1.0,
+    }]
+    for epsilon, max_vertices in settings:
+        vertices, ious, num_bytes = [], [], 0
+        for contour, shape, w, h in contours:
+            simplified = simplify_contour(contour, epsilon, max_vertices)
+            vertices.append(len(simplified))
+            ious.append(polygon_mask_iou(contour, simplified, shape))
+            num_bytes += len(format_polygon(normalize_polygon(simplified, w, h), precision))
+        rows.append({
+            'setting': f"eps={epsilon}, max={max_vertices}", 'epsilon': epsilon, 'max_vertices': max_vertices,
+            'precision': precision, 'mean_vertices': round(float(np.mean(vertices)), 1),
+            'max_vertices_seen': int(np.max(vertices)), 'bytes': num_bytes,
+            'size_ratio': round(num_bytes / raw_bytes, 3),
+            'mean_iou': round(float(np.mean(ious)), 4), 'min_iou': round(float(np.min(ious)), 4),
+        })
+
+    print(f"\n--- 폴리곤 단순화 리포트 (마스크 {len(contours)}개, 이미지 {len(paths)}장) ---")
+    print(f"{'setting':<22} {'mean_v':>7} {'max_v':>6} {'bytes':>10} {'size':>6} {'mean_iou':>9} {'min_iou':>8}")
+    for row in rows:
+        print(f"{row['setting']:<22} {row['mean_vertices']:>7} {row['max_vertices_seen']:>6} {row['bytes']:>10} "
+              f"{row['size_ratio']:>6.3f} {row['mean_iou']:>9.4f} {row['min_iou']:>8.4f}")
+    return rows
+
+
+if __name__ == '__main__':
+    MASKS_DIR = 'data/raw/seg_proc/masks'
+    REPORT_PATH = 'data/raw/seg_proc/simplify_report.json'
+    # 비교할 (Douglas–Peucker 허용 오차(px), 최대 꼭짓점 수) 조합
+    SETTINGS = [(0.5, None), (1.0, None), (1.0, 64), (2.0, 32)]
+
+    report = simplification_report(MASKS_DIR, SETTINGS)
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📊 리포트 저장: {REPORT_PATH}")
@@ -1,9 +1,7 @@
 import os
-import glob
 import json
-import random
-from collections import defaultdict
-from sklearn.model_selection import train_test_split
+
+import numpy as np
 
 # =================================================================
 # 1. 설정 변수
@@ -21,59 +19,134 @@ RANDOM_SEED = 42
 
 # =================================================================
 # 2. 층화 분할 로직
+#  : 라벨 파일을 한 번만 읽어 이미지 x 클래스 희소 행렬(CSR: indptr, indices)을 만들고,
+#    그 행렬에서 바로 반복적 다중 라벨 층화(iterative stratification, Sechidis et al. 2011)를 수행합니다.
+#    클래스 조합 문자열로 층화하지 않으므로 조합이 1개뿐인 층이 생겨도 문제가 없습니다.
 # =================================================================
 
-def load_and_group_data():
+SPLIT_NAMES = ('train', 'val', 'test')
+
+
+def load_label_matrix():
     """
-    모든 이미지 경로를 수집하고, 라벨 파일을 읽어 클래스 ID를 추출하여
-    이미지 경로들을 클래스별로 그룹화합니다 (층화 표집을 위함).
+    라벨 파일을 한 번씩만 읽어 (이미지 경로 목록, indptr, indices, 클래스 수)를 반환합니다.
+    이미지 i가 포함한 클래스 ID는 indices[indptr[i]:indptr[i + 1]] (중복 없이 정렬됨)입니다.
     """
-    label_files = glob.glob(os.path.join(DATA_DIR, 'labels', '*.txt'))
-    
-    # 딕셔너리: {클래스_ID: [해당 클래스를 포함하는 이미지 경로 목록]}
-    data_by_class = defaultdict(list)
-    
-    all_image_paths = []
+    label_dir = os.path.join(DATA_DIR, 'labels')
+    with os.scandir(label_dir) as entries:
+        label_names = sorted(e.name for e in entries if e.is_file() and e.name.endswith('.txt'))
 
-    print(f"총 {len(label_files)}개의 라벨 파일을 로드합니다.")
+    print(f"총 {len(label_names)}개의 라벨 파일을 로드합니다.")
 
-    for label_path in label_files:
+    image_paths = []
+    indptr = [0]
+    indices = []
+    for label_name in label_names:
         # 이미지 경로를 구성합니다. (예: .../images/0001.png)
-        img_filename = os.path.basename(label_path).replace('.txt', '.png')
-        img_path = os.path.join(DATA_DIR, 'images', img_filename)
-                
-        all_image_paths.append(img_path)
-        
-        # 라벨 파일에서 포함된 클래스 ID를 추출합니다.
+        label_path = os.path.join(label_dir, label_name)
         try:
             with open(label_path, 'r') as f:
-                for line in f:
-                    if line.strip():
-                        # YOLO 라벨 형식: class_id x_c y_c w h (class_id는 0부터 시작)
-                        class_id = int(line.split()[0])
-                        # 각 클래스를 포함하는 이미지 경로를 추가
-                        data_by_class[class_id].append(img_path)
+                # YOLO 라벨 형식: class_id x_c y_c w h (class_id는 0부터 시작)
+                classes = {int(line.split(None, 1)[0]) for line in f if line.strip()}
         except Exception as e:
             print(f"라벨 파일 로드 오류 ({label_path}): {e}")
             continue
+        image_paths.append(os.path.join(DATA_DIR, 'images', label_name[:-len('.txt')] + '.png'))
+        indices.extend(sorted(classes))
+        indptr.append(len(indices))
+
+    indptr = np.asarray(indptr, dtype=np.int64)
+    indices = np.asarray(indices, dtype=np.int64)
+    num_classes = int(indices.max()) + 1 if len(indices) else 0
+    return image_paths, indptr, indices, num_classes
+
+
+def iterative_stratification(indptr, indices, num_classes, ratios, seed=RANDOM_SEED):
+    """
+    반복적 다중 라벨 층화. 각 이미지의 분할 번호(0..len(ratios)-1) 배열을 반환합니다.
+
+    남은 이미지가 가장 적은 클래스부터, 그 클래스를 포함한 이미지를 해당 클래스가 가장 많이 필요한 분할에
+    배정합니다. (동률이면 전체적으로 더 많이 필요한 분할, 그래도 같으면 무작위)
+    """
+    rng = np.random.default_rng(seed)
+    num_images = len(indptr) - 1
+    ratios = np.asarray(ratios, dtype=np.float64)
+    rows = np.repeat(np.arange(num_images), np.diff(indptr))
+
+    # 클래스 -> 이미지 역색인 (CSC)
+    order = np.argsort(indices, kind='stable')
+    class_ptr = np.zeros(num_classes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=num_classes), out=class_ptr[1:])
+    class_images = rows[order]
+
+    class_counts = np.diff(class_ptr)
+    desired_class = ratios[:, None] * class_counts[None, :]  # (분할, 클래스)
+    desired_size = ratios * num_images
+    remaining = class_counts.astype(np.float64)
+    remaining[remaining == 0] = np.inf
+
+    assignment = np.full(num_images, -1, dtype=np.int64)
+    while np.isfinite(remaining).any():
+        # 남은 이미지가 가장 적은 클래스 (동률이면 무작위)
+        candidates = np.flatnonzero(remaining == remaining.min())
+        label = int(rng.choice(candidates))
+        images = class_images[class_ptr[label]:class_ptr[label + 1]]
+        images = images[assignment[images] < 0]
+        rng.shuffle(images)
+        for image in images:
+            need = desired_class[:, label]
+            best = np.flatnonzero(need == need.max())
+            if len(best) > 1:
+                sizes = desired_size[best]
+                best = best[sizes == sizes.max()]
+            fold = int(best[0] if len(best) == 1 else rng.choice(best))
+
+            assignment[image] = fold
+            image_labels = indices[indptr[image]:indptr[image + 1]]
+            desired_class[fold, image_labels] -= 1
+            desired_size[fold] -= 1
+            remaining[image_labels] -= 1
+        remaining[label] = np.inf  # 이 클래스의 이미지는 모두 배정됨
+        remaining[remaining <= 0] = np.inf
+
+    # 라벨이 없는 이미지는 전체 크기가 가장 부족한 분할에 배정합니다.
+    for image in np.flatnonzero(assignment < 0):
+        fold = int(np.argmax(desired_size))
+        assignment[image] = fold
+        desired_size[fold] -= 1
+    return assignment
+
+
+def class_balance_report(indptr, indices, num_classes, assignment, ratios):
+    """분할별 클래스 이미지 수와 목표 비율 대비 편차를 계산하고 요약을 출력합니다."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    counts = np.zeros((len(ratios), num_classes), dtype=np.int64)
+    np.add.at(counts, (assignment[rows], indices), 1)
+    totals = counts.sum(axis=0)
+    present = totals > 0
+    fractions = np.divide(counts, totals, out=np.zeros(counts.shape), where=present)
+    deviation = np.abs(fractions - np.asarray(ratios)[:, None])
+    deviation[:, ~present] = 0
+
+    print("\n--- 클래스별 분할 균형 (이미지 수 기준) ---")
+    print(f"클래스 {int(present.sum())}개, 목표 비율 {dict(zip(SPLIT_NAMES, ratios))}")
+    for j, name in enumerate(SPLIT_NAMES):
+        print(f"{name:<5} 평균 편차 {deviation[j, present].mean():.3f}, 최대 편차 {deviation[j].max():.3f}, "
+              f"이미지가 없는 클래스 {int(((counts[j] == 0) & present).sum())}개")
+    worst = np.argsort(-deviation.max(axis=0))[:5]
+    print("편차가 큰 클래스: " + ", ".join(
+        f"{int(k)}({'/'.join(str(int(c)) for c in counts[:, k])})" for k in worst if present[k]
+    ))
+
+    return {
+        'ratios': dict(zip(SPLIT_NAMES, ratios)),
+        'classes': {
+            int(k): {name: int(counts[j, k]) for j, name in enumerate(SPLIT_NAMES)}
+            for k in np.flatnonzero(present)
+        },
+        'max_deviation': {name: round(float(deviation[j].max()), 4) for j, name in enumerate(SPLIT_NAMES)},
+    }
 
-    # 중복된 이미지 경로 제거 (하나의 이미지가 여러 클래스에 포함될 수 있음)
-    unique_image_paths = sorted(list(set(all_image_paths)))
-    
-    # 각 이미지에 포함된 모든 클래스 ID 리스트를 생성합니다. (Stratify 기준)
-    image_class_labels = []
-    for img_path in unique_image_paths:
-        label_path = img_path.replace('images', 'labels').replace('.png', '.txt')
-        classes = []
-        if os.path.exists(label_path):
-            with open(label_path, 'r') as f:
-                for line in f:
-                    if line.strip():
-                        classes.append(line.split()[0])
-        # 이미지를 대표하는 클래스 라벨(들)을 문자열로 결합 (stratify 인자용)
-        image_class_labels.append(','.join(sorted(classes))) 
-        
-    return unique_image_paths, image_class_labels
 
 def save_list_files(paths, filename):
     """경로 리스트를 텍스트 파일로 저장합니다."""
@@ -91,33 +164,18 @@ def save_list_files(paths, filename):
 def split_data_and_save():
     """메인 분할 실행 함수"""
     
-    all_paths, class_labels = load_and_group_data()
+    all_paths, indptr, indices, num_classes = load_label_matrix()
     
     if not all_paths:
         print("🚨 오류: 데이터셋 폴더에서 처리할 이미지를 찾을 수 없습니다.")
         return
 
-    # 1. Train과 임시 (Val + Test) 분할
-    # Stratify 인자로 클래스 라벨을 사용하여 층화 분할
-    X_temp, X_train, y_temp, y_train = train_test_split(
-        all_paths, class_labels, 
-        test_size=TRAIN_RATIO, 
-        random_state=RANDOM_SEED, 
-        stratify=class_labels
-    )
-
-    # 2. 임시 세트를 Val과 Test로 분할
-    # Test 세트 비율 계산: TEST_RATIO / (VAL_RATIO + TEST_RATIO)
-    test_size_ratio = TEST_RATIO / (VAL_RATIO + TEST_RATIO)
-
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_temp, y_temp, 
-        test_size=test_size_ratio, 
-        random_state=RANDOM_SEED, 
-        stratify=y_temp
-    )
-    
-    # 3. 결과 저장
+    # 1. 반복적 다중 라벨 층화로 Train / Val / Test 분할
+    ratios = (TRAIN_RATIO, VAL_RATIO, TEST_RATIO)
+    assignment = iterative_stratification(indptr, indices, num_classes, ratios, seed=RANDOM_SEED)
+    X_train, X_val, X_test = ([p for p, fold in zip(all_paths, assignment) if fold == j] for j in range(3))
+
+    # 2. 결과 저장
     save_list_files(X_train, 'train.txt')
     save_list_files(X_val, 'val.txt')
     save_list_files(X_test, 'test.txt') # Test 세트 경로 저장
@@ -129,13 +187,13 @@ def split_data_and_save():
     print(f"Test 세트: {len(X_test)}개 ({len(X_test)/len(all_paths):.1%})")
     print("-------------------------")
 
+    # 3. 클래스별 균형 리포트
+    report = class_balance_report(indptr, indices, num_classes, assignment, ratios)
+    report_path = os.path.join(DATA_DIR, 'split_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📊 분할 리포트 저장: {report_path}")
+
 
 if __name__ == '__main__':
-    # scikit-learn이 설치되어 있지 않다면 설치 메시지 출력
-    try:
-        import sklearn
-    except ImportError:
-        print("🚨 필수 라이브러리: `scikit-learn`이 설치되어 있지 않습니다. 설치하십시오: pip install scikit-learn")
-        exit()
-        
     split_data_and_save()
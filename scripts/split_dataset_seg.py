@@ -1,18 +1,166 @@
 # src/split_dataset.py
 
+import json
 import os
 import random
 import shutil
 from pathlib import Path
 
+# 분할 결과를 만드는 방식
+#  - 'copy'    : 기존처럼 shutil.copy2로 복사 (기본값)
+#  - 'hardlink': 원본 파일의 하드링크 (추가 용량 없음, 다른 드라이브라 실패하면 복사)
+#  - 'symlink' : 원본을 가리키는 심볼릭 링크 (Windows는 관리자 권한/개발자 모드 필요)
+#    ⚠️ 링크는 원본과 같은 파일이므로 분할 결과를 제자리에서 수정하면 원본도 바뀝니다.
+#       (분할 결과를 덮어쓰는 스크립트는 임시 파일에 쓴 뒤 os.replace로 교체해야 원본이 보존됩니다.)
+#  - 'list'    : 파일은 두지 않고 output_dir/seg_<split>.txt 목록 파일만 저장
+#                (원본이 .../images/..., .../labels/... 구조일 때만 YOLO가 라벨을 찾을 수 있음)
+MATERIALIZE_MODES = ('copy', 'hardlink', 'symlink', 'list')
+SPLITS = ('train', 'val', 'test')
+
+# 이 스크립트가 output_dir에 만든 파일 목록 (다시 분할할 때 이 목록에 있는 파일만 옮기거나 지웁니다)
+MANIFEST_NAME = '.split_seg_manifest.json'
+
+
+def _yolo_label_path(img_path):
+    """YOLO가 이미지 경로로부터 추정하는 라벨 경로 (마지막 /images/ -> /labels/, 확장자 -> .txt)"""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return Path(sb.join(str(img_path).rsplit(sa, 1)).rsplit('.', 1)[0] + '.txt')
+
+
+def _is_current(dst, src, mode):
+    """dst가 이미 mode 방식으로 만든 src와 같은 파일이면 True"""
+    try:
+        if mode == 'symlink':
+            return dst.is_symlink() and Path(os.readlink(dst)) == src.resolve()
+        if dst.is_symlink():
+            return False
+        if mode == 'hardlink':
+            return os.path.samefile(dst, src)
+        dst_stat, src_stat = dst.stat(), src.stat()
+        return dst_stat.st_size == src_stat.st_size and int(dst_stat.st_mtime) == int(src_stat.st_mtime)
+    except OSError:
+        return False
+
+
+def _materialize(src, dst, mode):
+    """src를 dst에 mode 방식으로 만듭니다. 하드링크가 불가능해 복사했으면 False를 반환합니다."""
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    if mode == 'symlink':
+        os.symlink(src.resolve(), dst)
+    elif mode == 'hardlink':
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)  # 다른 드라이브/파일시스템 등
+            return False
+    else:
+        shutil.copy2(src, dst)
+    return True
+
+
+def load_manifest(output_dir):
+    """이전 분할에서 이 스크립트가 만든 파일 목록 {'images': {split: [파일명, ...]}, 'labels': {...}}"""
+    manifest_path = output_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    manifest_path = output_dir / MANIFEST_NAME
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def sync_split_dir(root, assignments, mode, previous=None):
+    """
+    root/<split>/ 아래를 assignments {split: [원본 경로, ...]}와 같게 맞춥니다.
+    이미 올바른 split에 있는 파일은 그대로 두고, 새 파일만 만듭니다.
+    이동/삭제는 previous {split: [파일명, ...]}(이전 분할에서 이 스크립트가 만든 파일)에 있는 파일에만 적용합니다:
+    split이 바뀐 파일은 이동(os.replace)하고, 이번 분할에 속하지 않는 파일은 삭제합니다.
+    (previous에 없는 파일은 직접 넣은 파일일 수 있으므로 건드리지 않습니다.)
+    previous가 None이면(manifest가 없는 첫 실행, 예: 기존 스크립트로 만든 폴더) root/<split>/에 이미 있는
+    같은 확장자(.png/.txt 등 이번에 만드는 파일의 확장자) 파일을 이전 분할 결과로 보고 맞춥니다.
+    (개수 통계, 이번에 만든 파일 목록 {split: [파일명, ...]})을 반환합니다.
+    """
+    for split in SPLITS:
+        (root / split).mkdir(parents=True, exist_ok=True)
+    if previous is None:
+        suffixes = {src.suffix for sources in assignments.values() for src in sources}
+        previous = {}
+        for split in SPLITS:
+            with os.scandir(root / split) as entries:
+                previous[split] = [e.name for e in entries if os.path.splitext(e.name)[1] in suffixes]
+    previous = {split: set(previous.get(split, [])) for split in SPLITS}
+    stats = {'kept': 0, 'moved': 0, 'created': 0, 'removed': 0, 'copied_fallback': 0}
+    wanted = {split: set() for split in SPLITS}
+
+    for split, sources in assignments.items():
+        for src in sources:
+            name = src.name
+            wanted[split].add(name)
+            dst = root / split / name
+            if _is_current(dst, src, mode):
+                stats['kept'] += 1
+                continue
+            # split만 바뀐 파일: 다시 만들지 않고 옮깁니다.
+            other = next((s for s in SPLITS if s != split and name in previous[s] and (root / s / name).exists()), None)
+            if other is not None:
+                os.replace(root / other / name, dst)
+                previous[other].discard(name)
+                if _is_current(dst, src, mode):
+                    stats['moved'] += 1
+                    continue
+            if not _materialize(src, dst, mode):
+                stats['copied_fallback'] += 1
+            stats['created'] += 1
+
+    # 이전 분할에서 만들었지만 이번 분할에 속하지 않는 파일만 삭제
+    for split in SPLITS:
+        for name in previous[split] - wanted[split]:
+            path = root / split / name
+            if path.exists() or path.is_symlink():
+                path.unlink()
+                stats['removed'] += 1
+    return stats, {split: sorted(names) for split, names in wanted.items()}
+
+
+def write_list_files(output_dir, splits, all_labels):
+    """seg_<split>.txt 목록 파일 저장 (이미지 절대 경로)"""
+    mismatched = [img for imgs in splits.values() for img in imgs
+                  if _yolo_label_path(img.resolve()) != all_labels[img.stem].resolve()]
+    if mismatched:
+        raise ValueError(
+            f"'list' 모드는 라벨이 이미지 경로의 /images/ -> /labels/ 위치에 있어야 합니다. "
+            f"(예: {mismatched[0]} -> {_yolo_label_path(mismatched[0])}) 'copy' 모드를 사용하세요."
+        )
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for split, imgs in splits.items():
+        list_path = output_dir / f"seg_{split}.txt"
+        with open(list_path, 'w') as f:
+            f.write('\n'.join(str(img.resolve()) for img in imgs))
+        print(f"{split}: {len(imgs)}장 목록 저장 완료 ({list_path})")
+    print("data_seg.yaml의 train/val/test를 위 목록 파일 경로로 바꿔 사용하세요.")
+
+
 def split_dataset(
     img_dir='data/raw/raw_train_images',
     label_dir='data/raw/seg_labels/train_labels',
     output_dir='data/yolo',
     val_ratio=0.1,
     test_ratio=0.05,
-    seed=42
+    seed=42,
+    mode='copy'
 ):
+    if mode not in MATERIALIZE_MODES:
+        raise ValueError(f"지원하지 않는 mode: {mode} (지원: {MATERIALIZE_MODES})")
     random.seed(seed)
     img_dir = Path(img_dir)
     label_dir = Path(label_dir)
@@ -40,20 +188,26 @@ def split_dataset(
         'test': valid_images[n_total - n_test:],
     }
 
-    for split, imgs in splits.items():
-        img_out = output_dir / 'images' / split
-        lbl_out = output_dir / 'labels' / split
-        img_out.mkdir(parents=True, exist_ok=True)
-        lbl_out.mkdir(parents=True, exist_ok=True)
-
-        for img_path in imgs:
-            lbl_path = all_labels.get(img_path.stem)
-            if not lbl_path:
-                continue
-            shutil.copy2(img_path, img_out / img_path.name)
-            shutil.copy2(lbl_path, lbl_out / lbl_path.name)
-
-        print(f"{split}: {len(imgs)}장 저장 완료 ({img_out})")
+    if mode == 'list':
+        write_list_files(output_dir, splits, all_labels)
+    else:
+        # 기존 배치와 비교해 split이 바뀐 파일만 옮기고, 새 파일만 만듭니다.
+        previous = load_manifest(output_dir)
+        if not previous and any((output_dir / kind / split).is_dir() for kind in ('images', 'labels') for split in SPLITS):
+            print(f"⚠️ {output_dir / MANIFEST_NAME}이 없어 기존 split 폴더의 이미지/라벨을 이전 분할 결과로 보고 맞춥니다. "
+                  f"(이번 분할에 속하지 않는 .png/.txt는 삭제됩니다)")
+        image_stats, image_names = sync_split_dir(output_dir / 'images', splits, mode, previous.get('images'))
+        label_stats, label_names = sync_split_dir(
+            output_dir / 'labels', {split: [all_labels[img.stem] for img in imgs] for split, imgs in splits.items()}, mode,
+            previous.get('labels')
+        )
+        save_manifest(output_dir, {'mode': mode, 'images': image_names, 'labels': label_names})
+        for kind, stats in (('images', image_stats), ('labels', label_stats)):
+            print(f"{kind}: 유지 {stats['kept']}, 이동 {stats['moved']}, 생성 {stats['created']}, 삭제 {stats['removed']}")
+            if stats['copied_fallback']:
+                print(f"⚠️ {kind}: 하드링크를 만들 수 없어 {stats['copied_fallback']}개를 복사했습니다. (다른 드라이브?)")
+        for split in SPLITS:
+            print(f"{split}: {len(splits[split])}장 ({output_dir / 'images' / split}, {mode})")
 
     print("✅ 데이터셋 split 완료.")
     print(f"train: {len(splits['train'])}, val: {len(splits['val'])}, test: {len(splits['test'])}")
@@ -40,4 +40,77 @@ class CBAM(nn.Module):
     def forward(self, x):
         x = x * self.ca(x)
         x = x * self.sa(x)
-        return x
\ No newline at end of file
+        return x
+
+class FusedCBAM(CBAM):
+    """
+    추론용 CBAM. CBAM과 같은 파라미터(ca.fc1, ca.fc2, sa.conv1)를 사용하므로 state_dict를 그대로 공유하며,
+    결과는 CBAM과 수치적으로 동일합니다. (부동소수점 덧셈 순서 차이 수준)
+
+    - 채널 어텐션: avg/max pooling 결과를 (B, 2, C)로 묶어 fc1→relu를 한 번에 계산하고,
+      fc2는 bias 없는 선형층이므로 fc2(a) + fc2(b) = fc2(a + b)를 이용해 fc2도 한 번만 계산합니다.
+    - 공간 어텐션: [avg, max] concat 후 conv 대신 conv 가중치를 채널별로 나누어 각각 conv한 뒤 더합니다.
+    - squeeze/unsqueeze 대신 view를 사용하며, torch.jit.trace / torch.jit.script로 내보낼 수 있습니다.
+    """
+
+    def __init__(self, planes, ratio=16, kernel_size=7):
+        super(FusedCBAM, self).__init__(planes, ratio, kernel_size)
+        self.padding = kernel_size // 2
+
+    @classmethod
+    def from_cbam(cls, cbam):
+        """기존 CBAM의 모듈(가중치)을 복사 없이 공유하는 FusedCBAM을 만듭니다."""
+        fused = cls(cbam.ca.fc1.in_features, kernel_size=cbam.sa.conv1.kernel_size[0])
+        fused.ca = cbam.ca
+        fused.sa = cbam.sa
+        return fused
+
+    def forward(self, x):
+        b, c = x.shape[0], x.shape[1]
+
+        # 채널 어텐션 (MLP 1회)
+        pooled = torch.stack([x.mean(dim=(2, 3)), x.amax(dim=(2, 3))], dim=1)  # (B, 2, C)
+        hidden = self.ca.relu1(self.ca.fc1(pooled)).sum(dim=1)
+        x = x * torch.sigmoid(self.ca.fc2(hidden)).view(b, c, 1, 1)
+
+        # 공간 어텐션 (concat 없이 채널별 conv 합)
+        weight = self.sa.conv1.weight
+        avg_out = torch.mean(x, dim=1, keepdim=True)
+        max_out = torch.amax(x, dim=1, keepdim=True)
+        attention = F.conv2d(avg_out, weight[:, :1], padding=self.padding) \
+            + F.conv2d(max_out, weight[:, 1:], padding=self.padding)
+        return x * torch.sigmoid(attention)
+
+def cbam_forward_hook(module, inputs, output):
+    """
+    module.cbam을 module의 출력에 적용하는 forward hook (cbam_surgery.insert_cbam에서 등록).
+    모듈 수준 함수라서 hook이 등록된 모델을 그대로 torch.save/load(best.pt)할 수 있습니다.
+    """
+    return module.cbam(output)
+
+def _benchmark(channels=(64, 128, 256), batch=1, size=80, repeats=200, warmup=20):
+    """CBAM과 FusedCBAM의 호출당 시간(ms)과 최대 오차를 비교합니다."""
+    import time
+
+    torch.manual_seed(0)
+    print(f"{'channels':>8} {'CBAM(ms)':>9} {'Fused(ms)':>10} {'speedup':>8} {'max_abs_err':>12}")
+    for c in channels:
+        cbam = CBAM(c).eval()
+        fused = FusedCBAM.from_cbam(cbam).eval()
+        x = torch.randn(batch, c, size, size)
+
+        timings = []
+        with torch.inference_mode():
+            max_err = (cbam(x) - fused(x)).abs().max().item()
+            for module in (cbam, fused):
+                for _ in range(warmup):
+                    module(x)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    module(x)
+                timings.append(1000 * (time.perf_counter() - start) / repeats)
+        print(f"{c:>8} {timings[0]:>9.3f} {timings[1]:>10.3f} {timings[0] / timings[1]:>8.2f} {max_err:>12.2e}")
+
+if __name__ == '__main__':
+    # yolo_train_seg.py에서 사용하는 채널 폭(128) 전후로 측정합니다.
+    _benchmark()
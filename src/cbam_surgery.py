@@ -0,0 +1,167 @@
+# src/cbam_surgery.py
+
+import copy
+import time
+
+import torch
+from ultralytics.utils.torch_utils import get_flops
+
+from cbam import CBAM, cbam_forward_hook
+
+# =================================================================
+# CBAM 삽입 (model surgery)
+#  : 지정한 layer의 출력에 CBAM을 실제로 적용합니다.
+#    - CBAM은 layer의 하위 모듈('cbam')로 등록하고 forward hook으로 layer 출력에 적용하므로,
+#      기존 가중치 키(model.<i>.*)는 그대로이고 CBAM 가중치만 model.<i>.cbam.*으로 추가됩니다.
+#      (사전학습 가중치 로드 시 CBAM만 새로 초기화되고, CBAM이 들어간 best.pt는 그대로 다시 로드됩니다.)
+#    - 채널 수는 더미 입력으로 layer 출력 크기를 확인해 자동으로 정합니다.
+#    - 삽입할 layer는 model.yaml['cbam_layers']에 기록되어 checkpoint와 함께 저장되며,
+#      trainers.py가 모델을 다시 만들 때(학습 시작/resume) 같은 위치에 다시 삽입합니다.
+# =================================================================
+
+CBAM_LAYERS_KEY = 'cbam_layers'
+CBAM_RATIO_KEY = 'cbam_ratio'
+
+
+def _layer_outputs(model, layers, imgsz):
+    """(1, ch, imgsz, imgsz) 더미 입력을 흘려 layers 각각의 입력/출력 텐서를 얻습니다."""
+    captured = {}
+    handles = []
+    for i in layers:
+        def hook(module, inputs, output, i=i):
+            captured[i] = (inputs[0], output)
+        handles.append(model.model[i].register_forward_hook(hook))
+
+    was_training = model.training
+    model.eval()
+    try:
+        with torch.inference_mode():
+            param = next(model.parameters())
+            model(torch.zeros(1, model.yaml.get('channels', 3), imgsz, imgsz, dtype=param.dtype, device=param.device))
+    finally:
+        for handle in handles:
+            handle.remove()
+        model.train(was_training)
+    return captured
+
+
+def insert_cbam(model, layers, ratio=16, kernel_size=7):
+    """
+    model.model[i] (i in layers)의 출력에 CBAM을 적용합니다. 이미 CBAM이 있는 layer는 건너뜁니다.
+    텐서가 아닌 값을 출력하는 layer(Detect/Segment head 등)는 삽입하지 않고 경고만 출력합니다.
+    실제로 삽입한 layer 인덱스 목록을 반환합니다.
+    """
+    layers = [i % len(model.model) for i in layers]
+    todo = [i for i in layers if not hasattr(model.model[i], 'cbam')]
+    outputs = _layer_outputs(model, todo, imgsz=64) if todo else {}
+
+    inserted = []
+    for i in todo:
+        layer = model.model[i]
+        output = outputs.get(i, (None, None))[1]
+        if not isinstance(output, torch.Tensor) or output.dim() != 4:
+            print(f"⚠️ layer {i}({layer.type})의 출력이 4차원 텐서가 아니어서 CBAM을 넣지 않습니다.")
+            continue
+        channels = output.shape[1]
+        param = next(layer.parameters(), None)
+        cbam = CBAM(channels, ratio=min(ratio, channels), kernel_size=kernel_size)
+        if param is not None:
+            cbam = cbam.to(device=param.device, dtype=param.dtype)
+        layer.add_module('cbam', cbam)
+        layer.register_forward_hook(cbam_forward_hook)
+        if hasattr(layer, 'np'):
+            layer.np += sum(p.numel() for p in cbam.parameters())  # ultralytics 모델 요약용 파라미터 수
+        inserted.append(i)
+
+    # 모델을 다시 만들거나(resume) 저장 후 로드할 때 같은 위치에 넣을 수 있도록 기록합니다.
+    all_layers = sorted(i for i in range(len(model.model)) if hasattr(model.model[i], 'cbam'))
+    model.yaml[CBAM_LAYERS_KEY] = all_layers
+    model.yaml[CBAM_RATIO_KEY] = ratio
+    return inserted
+
+
+def request_cbam(model, layers, ratio=16):
+    """
+    ultralytics 모델(model.model.yaml)에 CBAM을 넣을 layer를 기록합니다. 실제 삽입은 Trainer가 모델을 만들 때 합니다.
+    layers는 정수 1개 또는 목록이며, None이면 아무것도 하지 않습니다. 기록한 layer 목록(또는 None)을 반환합니다.
+    (yolo_train_seg.py와 train_tuner.py가 같은 네트워크를 만들도록 함께 사용합니다.)
+    """
+    if layers is None:
+        return None
+    layers = [layers] if isinstance(layers, int) else list(layers)
+    model.model.yaml[CBAM_LAYERS_KEY] = layers
+    model.model.yaml[CBAM_RATIO_KEY] = ratio
+    return layers
+
+
+def _cpu_latency_ms(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return 1000 * (time.perf_counter() - start) / repeats
+
+
+def _module_gflops(module, x):
+    """thop으로 측정한 GFLOPs (ultralytics와 같이 MACs x 2, conv/linear 기준)"""
+    try:
+        import thop
+    except ImportError:
+        return 0.0
+    return thop.profile(copy.deepcopy(module), inputs=[x], verbose=False)[0] * 2 / 1e9
+
+
+def cbam_cost_report(base_model, cbam_model, imgsz=640, repeats=5):
+    """
+    CBAM 삽입 비용을 CPU에서 측정해 출력합니다.
+      - layer별: 채널, 출력 크기, 추가 파라미터, GFLOPs, CBAM 1회 지연 시간(ms)
+      - 전체: 파라미터/GFLOPs/forward 지연 시간 (삽입 전 base_model vs 삽입 후 cbam_model)
+    두 모델 모두 복사본으로 측정하므로 원본의 device/모드는 바뀌지 않습니다.
+    """
+    base = copy.deepcopy(base_model).float().cpu().eval()
+    model = copy.deepcopy(cbam_model).float().cpu().eval()
+    layers = model.yaml.get(CBAM_LAYERS_KEY, [])
+    outputs = _layer_outputs(model, layers, imgsz)
+
+    rows = []
+    with torch.inference_mode():
+        for i in layers:
+            cbam = model.model[i].cbam
+            _, output = outputs[i]
+            # hook이 적용되기 전의 layer 출력과 같은 크기의 입력으로 CBAM만 측정합니다.
+            x = torch.randn_like(output)
+            rows.append({
+                'layer': i,
+                'type': model.model[i].type,
+                'channels': output.shape[1],
+                'hw': tuple(output.shape[2:]),
+                'params': sum(p.numel() for p in cbam.parameters()),
+                'gflops': _module_gflops(cbam, x),
+                'latency_ms': _cpu_latency_ms(lambda: cbam(x), repeats * 4),
+            })
+
+        dummy = torch.zeros(1, model.yaml.get('channels', 3), imgsz, imgsz)
+        base_ms = _cpu_latency_ms(lambda: base(dummy), repeats)
+        cbam_ms = _cpu_latency_ms(lambda: model(dummy), repeats)
+
+    base_params = sum(p.numel() for p in base.parameters())
+    cbam_params = sum(p.numel() for p in model.parameters())
+    base_gflops, cbam_gflops = get_flops(base, imgsz), get_flops(model, imgsz)
+
+    print(f"\n--- CBAM 비용 리포트 (imgsz={imgsz}, CPU, torch threads={torch.get_num_threads()}) ---")
+    print(f"{'layer':>5} {'type':<28} {'C':>5} {'HxW':>11} {'params':>9} {'GFLOPs':>8} {'ms':>8}")
+    for row in rows:
+        hw = f"{row['hw'][0]}x{row['hw'][1]}"
+        print(f"{row['layer']:>5} {row['type']:<28} {row['channels']:>5} {hw:>11} {row['params']:>9,} "
+              f"{row['gflops']:>8.3f} {row['latency_ms']:>8.2f}")
+    print(f"전체 파라미터: {base_params:,} -> {cbam_params:,} (+{cbam_params - base_params:,}, "
+          f"{100 * (cbam_params - base_params) / base_params:.2f}%)")
+    print(f"전체 GFLOPs: {base_gflops:.2f} -> {cbam_gflops:.2f} (conv/linear만 집계, pooling/곱셈 제외)")
+    print(f"전체 forward: {base_ms:.1f}ms -> {cbam_ms:.1f}ms (+{100 * (cbam_ms - base_ms) / base_ms:.1f}%)")
+    return {
+        'layers': rows,
+        'params': (base_params, cbam_params),
+        'gflops': (base_gflops, cbam_gflops),
+        'latency_ms': (base_ms, cbam_ms),
+    }
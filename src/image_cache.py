@@ -0,0 +1,253 @@
+# src/image_cache.py
+
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.utils.patches import imread
+
+from prediction_cache import image_content_hash
+
+# =================================================================
+# 학습용 이미지 캐시 (imgsz로 리사이즈된 uint8 이미지, memmap)
+#  : PNG(976x1280)를 매 epoch 다시 디코딩하지 않도록 ultralytics load_image()의 결과
+#    (긴 변을 imgsz로 맞춘 이미지)를 한 번만 만들어 두고 memmap으로 읽습니다.
+#    letterbox/증강은 그 뒤 transforms에서 적용되므로 캐시에는 리사이즈 결과만 저장합니다.
+#
+#    cache_root/imgsz<imgsz>_c<channels>/
+#      images.u8    : 이미지 바이트를 이어 붙인 파일 (추가만 함)
+#      index.json   : 이미지 내용 해시 -> [offset, h, w, c, h0, w0, decode_ms]
+#      paths.json   : 파일 경로 -> [크기, mtime_ns, 해시] (다음 실행에서 해시 재계산 생략)
+#    키가 이미지 내용 해시이므로 detection/segmentation 학습과 여러 실행이 같은 캐시를 공유합니다.
+# =================================================================
+
+IMAGE_CACHE_DIR = 'data/cache/images'
+IMAGE_CACHE_MODE = 'memmap'  # 학습 인자 cache 값이 이것일 때 사용 (trainers.py)
+
+# 통계 배열 인덱스 (dataloader 워커 프로세스와 공유)
+_HITS, _MISSES, _SAVED_S, _MISS_S = range(4)
+
+
+def resize_long_side(im, imgsz):
+    """ultralytics BaseDataset.load_image(rect_mode=True)와 같은 리사이즈 (긴 변 -> imgsz, INTER_LINEAR)"""
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz))
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+    if im.ndim == 2:
+        im = im[..., None]
+    return im
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ResizedImageCache:
+    """
+    imgsz별 memmap 이미지 캐시입니다.
+
+    build()는 메인 프로세스에서 없는 이미지만 디코딩해 추가하고, get()은 memmap 조회 후 복사본을 반환합니다.
+    (증강이 이미지를 제자리에서 수정하므로 읽기 전용 memmap을 그대로 넘기지 않습니다.)
+    hit/miss 통계는 공유 배열에 기록되어 dataloader 워커에서 조회한 것까지 합산됩니다.
+    """
+
+    def __init__(self, cache_root, imgsz, channels=3):
+        self.imgsz = imgsz
+        self.channels = channels
+        self.cache_dir = Path(cache_root) / f"imgsz{imgsz}_c{channels}"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.cache_dir / 'images.u8'
+        self.index_path = self.cache_dir / 'index.json'
+        self.paths_path = self.cache_dir / 'paths.json'
+        self.lock_path = self.cache_dir / 'build.lock'
+
+        self.index = _read_json(self.index_path)
+        self.path_hashes = {}  # 경로 -> 해시 (이번 실행에서 확인된 것만)
+        self.stats = multiprocessing.Array('d', 4)
+        self._data = None
+
+    def __getstate__(self):
+        # memmap은 워커 프로세스에서 다시 엽니다.
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    @property
+    def cv2_flag(self):
+        # ultralytics BaseDataset.cv2_flag와 같은 규칙
+        return {1: cv2.IMREAD_GRAYSCALE, 3: cv2.IMREAD_COLOR}.get(self.channels, cv2.IMREAD_UNCHANGED)
+
+    # -----------------------------
+    # 해시
+    # -----------------------------
+    def _hash_files(self, im_files):
+        """paths.json의 (크기, mtime)이 같으면 이전 해시를 재사용하고, 바뀐 파일만 다시 해시합니다."""
+        known = _read_json(self.paths_path)
+        todo = []
+        for f in im_files:
+            stat = os.stat(f)
+            entry = known.get(os.path.abspath(f))
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                self.path_hashes[f] = entry[2]
+            else:
+                todo.append((f, stat))
+        if todo:
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+                for (f, stat), image_hash in zip(todo, pool.map(image_content_hash, [f for f, _ in todo])):
+                    self.path_hashes[f] = image_hash
+                    known[os.path.abspath(f)] = [stat.st_size, stat.st_mtime_ns, image_hash]
+            _write_json(self.paths_path, known)
+
+    # -----------------------------
+    # 빌드
+    # -----------------------------
+    def _decode(self, f):
+        start = time.perf_counter()
+        im = imread(f, flags=self.cv2_flag)
+        if im is None:
+            raise FileNotFoundError(f"Image Not Found {f}")
+        h0, w0 = im.shape[:2]
+        im = np.ascontiguousarray(resize_long_side(im, self.imgsz))
+        return im, h0, w0, (time.perf_counter() - start) * 1000
+
+    def build(self, im_files, num_threads=None):
+        """
+        im_files 중 캐시에 없는 이미지만 디코딩/리사이즈해 추가합니다.
+        다른 실행이 빌드 중이면(build.lock) 추가하지 않고 이미 있는 항목만 사용합니다.
+        """
+        im_files = [str(f) for f in im_files]
+        self._hash_files(im_files)
+        missing = sorted({self.path_hashes[f]: f for f in im_files if self.path_hashes[f] not in self.index}.items())
+        print(f"🗂️ 이미지 캐시 ({self.cache_dir}): {len(im_files)}장 중 {len(im_files) - len(missing)}장 캐시됨, "
+              f"{len(missing)}장 추가 예정")
+        if not missing:
+            return 0
+
+        try:
+            lock_fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            print(f"⚠️ 다른 실행이 캐시를 만드는 중입니다 ({self.lock_path}). 없는 이미지는 매번 디코딩합니다.")
+            return 0
+
+        added = 0
+        try:
+            # 다른 실행이 그 사이 추가했을 수 있으므로 잠금 후 인덱스를 다시 읽습니다.
+            self.index = _read_json(self.index_path)
+            missing = [(h, f) for h, f in missing if h not in self.index]
+            start = time.perf_counter()
+            with open(self.data_path, 'ab') as data_file, \
+                    ThreadPoolExecutor(max_workers=num_threads or os.cpu_count() or 1) as pool:
+                offset = data_file.tell()
+                for (image_hash, _), (im, h0, w0, decode_ms) in zip(missing, pool.map(self._decode, [f for _, f in missing])):
+                    data_file.write(im.tobytes())
+                    h, w, c = im.shape
+                    self.index[image_hash] = [offset, h, w, c, h0, w0, round(decode_ms, 2)]
+                    offset += im.nbytes
+                    added += 1
+            # 데이터를 모두 쓴 뒤 인덱스를 교체하므로 중단되어도 인덱스가 없는 바이트만 남습니다.
+            _write_json(self.index_path, self.index)
+            print(f"✅ 이미지 캐시 {added}장 추가 ({time.perf_counter() - start:.1f}s, "
+                  f"{os.path.getsize(self.data_path) / (1 << 30):.2f}GB)")
+        finally:
+            os.close(lock_fd)
+            os.remove(self.lock_path)
+        self._data = None
+        return added
+
+    # -----------------------------
+    # 조회
+    # -----------------------------
+    def get(self, f):
+        """(이미지, (h0, w0), (h, w)). 캐시에 없으면 None (miss 기록은 호출한 쪽에서 record_miss로)"""
+        entry = self.index.get(self.path_hashes.get(f))
+        if entry is None:
+            return None
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode='r')
+        offset, h, w, c, h0, w0, decode_ms = entry
+        im = np.array(self._data[offset:offset + h * w * c]).reshape(h, w, c)
+        with self.stats.get_lock():
+            self.stats[_HITS] += 1
+            self.stats[_SAVED_S] += decode_ms / 1000
+        return im, (h0, w0), (h, w)
+
+    def record_miss(self, seconds):
+        with self.stats.get_lock():
+            self.stats[_MISSES] += 1
+            self.stats[_MISS_S] += seconds
+
+    def summary(self):
+        hits, misses, saved_s, miss_s = self.stats[:]
+        total = hits + misses
+        return {
+            'hits': int(hits),
+            'misses': int(misses),
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'decode_saved_s': round(saved_s, 1),
+            'miss_decode_s': round(miss_s, 1),
+        }
+
+    def report(self, prefix=''):
+        s = self.summary()
+        print(f"📊 {prefix}이미지 캐시: hit {s['hits']} / miss {s['misses']} (hit rate {s['hit_rate']:.1%}), "
+              f"절약한 디코딩 시간 {s['decode_saved_s']}s")
+        return s
+
+
+class CachedYOLODataset(YOLODataset):
+    """load_image()가 먼저 ResizedImageCache를 조회하는 YOLODataset (detection/segmentation 공용)"""
+
+    image_cache = None
+
+    def load_image(self, i, rect_mode=True):
+        if self.ims[i] is not None or not rect_mode or self.image_cache is None:
+            return super().load_image(i, rect_mode=rect_mode)
+        cached = self.image_cache.get(self.im_files[i])
+        if cached is None:
+            start = time.perf_counter()
+            result = super().load_image(i, rect_mode=rect_mode)
+            self.image_cache.record_miss(time.perf_counter() - start)
+            return result
+
+        im, hw0, hw = cached
+        # mosaic 등이 사용하는 버퍼는 기존 load_image와 같게 유지합니다.
+        if self.augment and self.cache != 'ram':
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, hw0, hw
+
+
+def attach_image_cache(dataset, cache_root=IMAGE_CACHE_DIR):
+    """
+    build_yolo_dataset()가 만든 YOLODataset에 이미지 캐시를 연결합니다. (캐시를 채운 뒤 클래스를 교체)
+    YOLODataset이 아닌 데이터셋(grounding, semantic 등)은 그대로 반환합니다.
+    """
+    if type(dataset) is not YOLODataset:
+        return dataset
+    cache = ResizedImageCache(cache_root, dataset.imgsz, dataset.channels)
+    cache.build(dataset.im_files)
+    dataset.__class__ = CachedYOLODataset
+    dataset.image_cache = cache
+    return dataset
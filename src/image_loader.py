@@ -0,0 +1,95 @@
+# src/image_loader.py
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ultralytics.utils.patches import imread
+
+from inference_profiler import NULL_PROFILER
+
+# =================================================================
+# 백그라운드 이미지 로더
+#  : 현재 배치가 추론되는 동안 다음 배치들의 PNG 디코딩을 미리 수행합니다.
+# =================================================================
+
+_END = object()  # 생산자 스레드 종료 신호
+
+
+def load_image(image_path):
+    """
+    ultralytics가 파일 경로를 입력받았을 때와 동일한 함수(imread, BGR)로 이미지를 디코딩합니다.
+    같은 디코더를 사용해야 경로 입력과 배열 입력의 추론 결과가 동일하게 유지됩니다.
+    """
+    image = imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"이미지 로드 실패: {image_path}")
+    return image
+
+
+def iter_image_batches(image_paths, batch_size, prefetch=2, num_workers=2, profiler=NULL_PROFILER):
+    """
+    이미지 경로 목록을 순서대로 디코딩하여 (경로 리스트, 이미지 리스트) 배치를 생성합니다.
+
+    - 디코딩은 백그라운드 스레드 풀에서 수행되며, 최대 prefetch개의 배치를 미리 준비합니다.
+    - ultralytics는 배치 안의 이미지 크기가 모두 같을 때만 이미지 1장 추론과 동일한
+      letterbox(최소 패딩)를 적용하므로, 크기가 다른 이미지가 나오면 배치를 먼저 끊습니다.
+    - profiler가 켜져 있으면 이미지별 디코딩('decode')과 소비자가 배치를 기다린 시간('loader_wait')을 기록합니다.
+    """
+    batch_queue = queue.Queue(maxsize=max(1, prefetch))
+    stop_event = threading.Event()
+
+    def put(item):
+        # 소비자가 중간에 종료한 경우 블로킹되지 않도록 주기적으로 확인합니다.
+        while not stop_event.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode(path):
+        with profiler.stage('decode'):
+            return load_image(path)
+
+    def producer():
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+                batch_paths, batch_images = [], []
+                for start in range(0, len(image_paths), batch_size):
+                    chunk = image_paths[start:start + batch_size]
+                    for path, image in zip(chunk, pool.map(decode, chunk)):
+                        if batch_images and image.shape != batch_images[0].shape:
+                            if not put((batch_paths, batch_images)):
+                                return
+                            batch_paths, batch_images = [], []
+                        batch_paths.append(path)
+                        batch_images.append(image)
+                        if len(batch_images) == batch_size:
+                            if not put((batch_paths, batch_images)):
+                                return
+                            batch_paths, batch_images = [], []
+                if batch_images and not put((batch_paths, batch_images)):
+                    return
+        except Exception as e:
+            # 예외는 소비자 쪽에서 다시 발생시킵니다.
+            put(e)
+            return
+        put(_END)
+
+    thread = threading.Thread(target=producer, name='image-prefetch', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            with profiler.stage('loader_wait'):
+                item = batch_queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop_event.set()
+        thread.join()
@@ -0,0 +1,192 @@
+# src/inference_backend.py
+
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from ultralytics import YOLO
+
+# =================================================================
+# 1. 설정 변수 (패리티 체크 단독 실행용)
+# =================================================================
+
+RUN_DIR = 'runs/yolo11n_exp_251027_1014'
+
+# 학습된 YOLO 모델 가중치 파일 경로
+MODEL_WEIGHTS_PATH = os.path.join(RUN_DIR, 'weights/best.pt')
+
+# 비교할 추론 백엔드 ('onnx' 또는 'openvino')
+BACKEND = 'onnx'
+
+IMG_SIZE = 1280
+
+# 패리티 체크에 사용할 검증 이미지 목록과 샘플 수
+VAL_LIST_PATH = 'data/yolo/val.txt'
+PARITY_SAMPLES = 20
+
+# =================================================================
+# 2. 백엔드 선택 / 내보내기 캐시
+#  : 'torch'는 .pt 가중치를 그대로 사용하고, 'onnx'/'openvino'는 한 번만 내보낸 뒤
+#    가중치 옆에 '<stem>_<가중치 해시>_<imgsz>' 이름으로 캐시해 재사용합니다.
+# =================================================================
+
+SUPPORTED_BACKENDS = ('torch', 'onnx', 'openvino')
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """파일 내용의 SHA-256 해시"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def exported_model_path(weights_path, backend, imgsz):
+    """가중치 해시와 imgsz로 결정되는 내보내기 결과물 경로"""
+    weights_path = Path(weights_path)
+    key = f"{weights_path.stem}_{file_sha256(weights_path)[:12]}_{imgsz}"
+    if backend == 'onnx':
+        return weights_path.with_name(f"{key}.onnx")
+    if backend == 'openvino':
+        # ultralytics는 '_openvino_model'로 끝나는 폴더를 OpenVINO 모델로 인식합니다.
+        return weights_path.with_name(f"{key}_openvino_model")
+    raise ValueError(f"지원하지 않는 백엔드: {backend} (지원: {SUPPORTED_BACKENDS})")
+
+
+def resolve_model_path(weights_path, backend='torch', imgsz=1280):
+    """
+    백엔드에 맞는 모델 경로를 반환합니다. 내보낸 모델이 캐시에 없으면 한 번 내보냅니다.
+    멀티 프로세스 실행 시에는 메인 프로세스에서 먼저 호출해 캐시를 만들어 두어야 합니다.
+    """
+    if backend == 'torch':
+        return str(weights_path)
+
+    target = exported_model_path(weights_path, backend, imgsz)
+    if target.exists():
+        return str(target)
+
+    print(f"{backend} 모델을 내보냅니다: {weights_path} (imgsz={imgsz})")
+    # dynamic=True: 배치 크기와 입력 크기를 고정하지 않아 배치 추론과 rect letterbox를 그대로 사용합니다.
+    exported = Path(YOLO(weights_path).export(format=backend, imgsz=imgsz, dynamic=True))
+    if target.is_dir():
+        shutil.rmtree(target)
+    os.replace(exported, target)
+    print(f"✅ 내보내기 완료: {target}")
+    return str(target)
+
+
+def load_model(weights_path, backend='torch', imgsz=1280):
+    """선택한 백엔드로 실행되는 YOLO 모델을 로드합니다."""
+    return YOLO(resolve_model_path(weights_path, backend, imgsz))
+
+
+# =================================================================
+# 3. 패리티 / 지연 시간 비교
+# =================================================================
+
+def read_image_list(list_path, limit=None):
+    """YOLO 분할 목록 파일(train.txt, val.txt)의 이미지 경로를 목록 파일 기준 절대 경로로 읽습니다."""
+    base_dir = os.path.dirname(list_path)
+    with open(list_path, 'r', encoding='utf-8') as f:
+        paths = [os.path.normpath(os.path.join(base_dir, line.strip())) for line in f if line.strip()]
+    return paths[:limit] if limit else paths
+
+
+def box_iou(boxes_a, boxes_b):
+    """xyxy 박스 두 묶음의 IoU 행렬 (len(a), len(b))"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    lt = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    rb = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_detections(ref, other, iou_threshold=0.5):
+    """
+    기준 검출(ref)의 각 박스를 score 순서대로 같은 클래스의 가장 IoU가 높은 박스와 1:1 매칭합니다.
+    ref/other는 (xyxy, score, cls) 튜플입니다. 반환값은 (ref 인덱스, other 인덱스, IoU) 목록입니다.
+    """
+    ref_boxes, _, ref_cls = ref
+    other_boxes, _, other_cls = other
+    iou = box_iou(ref_boxes, other_boxes)
+    iou[ref_cls[:, None] != other_cls[None, :]] = 0
+    matches, used = [], np.zeros(len(other_boxes), dtype=bool)
+    for i in range(len(ref_boxes)):
+        candidates = np.where(used, 0, iou[i])
+        if len(candidates) == 0:
+            break
+        j = int(candidates.argmax())
+        if candidates[j] >= iou_threshold:
+            used[j] = True
+            matches.append((i, j, float(candidates[j])))
+    return matches
+
+
+def _predict_arrays(model, image_path, imgsz, conf):
+    start = time.perf_counter()
+    result = model(image_path, imgsz=imgsz, conf=conf, verbose=False)[0]
+    elapsed = time.perf_counter() - start
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int)), elapsed
+
+
+def check_parity(weights_path, backend, image_paths, imgsz=1280, conf=0.001, warmup=2):
+    """
+    PyTorch(.pt) 경로와 선택한 백엔드의 결과(박스/score)와 이미지당 지연 시간을 비교합니다.
+    비교 결과 요약 dict를 반환합니다.
+    """
+    torch_model = load_model(weights_path, 'torch', imgsz)
+    backend_model = load_model(weights_path, backend, imgsz)
+
+    # 워밍업 (첫 호출의 그래프 초기화 시간 제외)
+    for model in (torch_model, backend_model):
+        for image_path in image_paths[:warmup]:
+            _predict_arrays(model, image_path, imgsz, conf)
+
+    torch_times, backend_times = [], []
+    ref_count = other_count = 0
+    matched_ious, score_diffs = [], []
+    for image_path in image_paths:
+        ref, t_ref = _predict_arrays(torch_model, image_path, imgsz, conf)
+        other, t_other = _predict_arrays(backend_model, image_path, imgsz, conf)
+        torch_times.append(t_ref)
+        backend_times.append(t_other)
+        ref_count += len(ref[1])
+        other_count += len(other[1])
+        for i, j, iou in match_detections(ref, other):
+            matched_ious.append(iou)
+            score_diffs.append(abs(float(ref[1][i]) - float(other[1][j])))
+
+    summary = {
+        'backend': backend,
+        'images': len(image_paths),
+        'torch_boxes': ref_count,
+        'backend_boxes': other_count,
+        'matched_ratio': len(matched_ious) / max(ref_count, 1),
+        'mean_matched_iou': float(np.mean(matched_ious)) if matched_ious else 0.0,
+        'max_score_diff': float(np.max(score_diffs)) if score_diffs else 0.0,
+        'mean_score_diff': float(np.mean(score_diffs)) if score_diffs else 0.0,
+        'torch_ms_per_image': 1000 * float(np.mean(torch_times)),
+        'backend_ms_per_image': 1000 * float(np.mean(backend_times)),
+    }
+    summary['speedup'] = summary['torch_ms_per_image'] / max(summary['backend_ms_per_image'], 1e-9)
+
+    print(f"\n--- 패리티 체크: torch vs {backend} ({len(image_paths)}장, imgsz={imgsz}, conf={conf}) ---")
+    print(f"박스 수: torch {ref_count} / {backend} {other_count}, 매칭 비율 {summary['matched_ratio']:.2%}")
+    print(f"매칭 박스 평균 IoU: {summary['mean_matched_iou']:.4f}")
+    print(f"score 차이: 평균 {summary['mean_score_diff']:.5f}, 최대 {summary['max_score_diff']:.5f}")
+    print(f"지연 시간: torch {summary['torch_ms_per_image']:.1f}ms, {backend} {summary['backend_ms_per_image']:.1f}ms "
+          f"(x{summary['speedup']:.2f})")
+    return summary
+
+
+if __name__ == '__main__':
+    sample_paths = read_image_list(VAL_LIST_PATH, limit=PARITY_SAMPLES)
+    check_parity(MODEL_WEIGHTS_PATH, BACKEND, sample_paths, imgsz=IMG_SIZE)
@@ -0,0 +1,172 @@
+# src/inference_profiler.py
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import numpy as np
+
+# =================================================================
+# 추론 단계별 프로파일러
+#  : 단계(decode, letterbox, forward, nms, postprocess, write 등)별 이미지당 소요 시간과
+#    메모리 최고점(RSS)을 기록해 요약 표, JSON, Chrome trace(chrome://tracing, Perfetto)로 저장합니다.
+#    꺼져 있을 때는 NULL_PROFILER가 아무 일도 하지 않는 컨텍스트만 반환하므로 부담이 거의 없습니다.
+# =================================================================
+
+_NULL_CONTEXT = nullcontext()
+
+
+def peak_rss_mb():
+    """현재 프로세스의 최대 RSS(MB). 측정할 수 없는 환경이면 None."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: resource 모듈이 없으므로 psutil의 peak working set을 사용합니다.
+        import psutil
+        peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+        return round(peak / 2**20, 1) if peak else None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, Linux는 KB 단위입니다.
+    return round(usage / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def current_rss_mb():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return round(psutil.Process().memory_info().rss / 2**20, 1)
+
+
+class InferenceProfiler:
+    """
+    단계별 구간을 (이름, 시작 시각, 소요 시간, pid, 스레드) 레코드로 모읍니다.
+
+    - stage(name): with 블록의 소요 시간을 기록합니다. (여러 스레드에서 동시에 사용 가능)
+    - add(name, duration_ms): ultralytics result.speed처럼 외부에서 측정된 시간을 기록합니다.
+    - sample_memory(): 현재 RSS를 기록해 메모리 최고점을 추적합니다.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self.memory_samples = []
+        # 프로세스 간 레코드를 합칠 수 있도록 벽시계 기준(초)으로 저장합니다.
+        self._wall_origin = time.time() - time.perf_counter()
+
+    def _now(self):
+        return self._wall_origin + time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        start = self._now()
+        try:
+            yield
+        finally:
+            self.records.append((name, start, self._now() - start, os.getpid(), threading.get_ident()))
+
+    def add(self, name, duration_ms, end=None):
+        """외부에서 측정한 구간을 추가합니다. end가 없으면 지금 끝난 것으로 기록합니다."""
+        if not self.enabled:
+            return
+        duration = duration_ms / 1000
+        end = self._now() if end is None else end
+        self.records.append((name, end - duration, duration, os.getpid(), threading.get_ident()))
+
+    def sample_memory(self):
+        if not self.enabled:
+            return
+        rss = current_rss_mb()
+        if rss is not None:
+            self.memory_samples.append((self._now(), rss, os.getpid()))
+
+    def merge(self, records, memory_samples=()):
+        """다른 프로세스(샤딩 워커)의 레코드를 합칩니다."""
+        if not self.enabled:
+            return
+        self.records.extend(tuple(r) for r in records)
+        self.memory_samples.extend(tuple(s) for s in memory_samples)
+
+    def export(self):
+        """프로세스 간 전달용 (records, memory_samples)"""
+        return self.records, self.memory_samples
+
+    # -----------------------------
+    # 요약 / 저장
+    # -----------------------------
+    def summary(self):
+        """단계별 {count, total_s, mean_ms, p50_ms, p95_ms, max_ms} (처음 기록된 순서)"""
+        durations = {}
+        for name, _, duration, _, _ in self.records:
+            durations.setdefault(name, []).append(duration * 1000)
+        stages = {}
+        for name, values in durations.items():
+            values = np.asarray(values)
+            stages[name] = {
+                'count': int(len(values)),
+                'total_s': round(float(values.sum()) / 1000, 3),
+                'mean_ms': round(float(values.mean()), 3),
+                'p50_ms': round(float(np.percentile(values, 50)), 3),
+                'p95_ms': round(float(np.percentile(values, 95)), 3),
+                'max_ms': round(float(values.max()), 3),
+            }
+        rss_values = [rss for _, rss, _ in self.memory_samples]
+        return {
+            'stages': stages,
+            'max_sampled_rss_mb': max(rss_values) if rss_values else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def print_summary(self, summary=None):
+        summary = summary or self.summary()
+        print("\n--- 단계별 프로파일 ---")
+        print(f"{'stage':<14} {'count':>7} {'total(s)':>9} {'mean(ms)':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'max(ms)':>9}")
+        for name, s in summary['stages'].items():
+            print(f"{name:<14} {s['count']:>7} {s['total_s']:>9.2f} {s['mean_ms']:>9.2f} "
+                  f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}")
+        print(f"메모리 최고점: 샘플 RSS {summary['max_sampled_rss_mb']} MB, "
+              f"프로세스 peak RSS {summary['peak_rss_mb']} MB")
+
+    def chrome_trace(self):
+        """chrome://tracing / Perfetto에서 열 수 있는 trace 이벤트 목록"""
+        events = [
+            {'name': name, 'ph': 'X', 'ts': round(start * 1e6), 'dur': round(duration * 1e6),
+             'pid': pid, 'tid': tid}
+            for name, start, duration, pid, tid in self.records
+        ]
+        events.extend(
+            {'name': 'rss_mb', 'ph': 'C', 'ts': round(ts * 1e6), 'pid': pid, 'args': {'rss_mb': rss}}
+            for ts, rss, pid in self.memory_samples
+        )
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, output_dir, prefix='profile', metadata=None):
+        """요약 표를 출력하고 <prefix>_<시각>.json(요약)과 <prefix>_<시각>.trace.json을 저장합니다."""
+        if not self.enabled:
+            return None
+        summary = self.summary()
+        self.print_summary(summary)
+
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        summary_path = os.path.join(output_dir, f"{prefix}_{stamp}.json")
+        trace_path = os.path.join(output_dir, f"{prefix}_{stamp}.trace.json")
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(summary, metadata=metadata or {}), f, ensure_ascii=False, indent=2)
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        print(f"📊 프로파일 저장: {summary_path} (trace: {trace_path})")
+        return summary_path
+
+
+# 프로파일링을 끈 경우 사용하는 공용 인스턴스
+NULL_PROFILER = InferenceProfiler(enabled=False)
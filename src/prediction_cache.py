@@ -0,0 +1,190 @@
+# src/prediction_cache.py
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from inference_backend import file_sha256
+
+# =================================================================
+# 추론 결과 캐시
+#  : 낮은 임계값(conf=0.001)과 넉넉한 max_det로 추론한 NMS 결과를 이미지별 .npz(컬럼 배열)로 저장합니다.
+#    캐시 키 = 가중치 해시 + imgsz + augment + 백엔드 + NMS iou, 파일 키 = 이미지 내용 해시.
+#    가중치나 이미지가 바뀌면 키가 달라지므로 이전 결과는 자동으로 사용되지 않습니다.
+#    이후 CONF/max_det 변경은 캐시된 박스에 다시 적용만 하면 되므로 재추론이 필요 없습니다.
+#    (NMS는 letterbox 좌표에서 수행되고 저장된 박스는 원본 크기로 잘려 있으므로,
+#     IOU를 바꾸면 캐시 박스로는 같은 결과를 재현할 수 없어 새 캐시 디렉토리에 다시 추론합니다.)
+# =================================================================
+
+
+def image_content_hash(image_path, chunk_size=1 << 20):
+    """이미지 파일 내용의 SHA-1 해시"""
+    digest = hashlib.sha1()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def empty_predictions():
+    return (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64))
+
+
+class PredictionCache:
+    """
+    가중치/추론 설정별 디렉토리에 이미지별 검출 결과 (xyxy, score, class)를 저장하는 캐시입니다.
+
+    conf/max_det는 캐시에 저장할 때 사용한 (가장 느슨한) 값이며, apply_thresholds에서는
+    이보다 엄격한 값(conf 이상, max_det 이하)만 적용할 수 있습니다. iou는 캐시 키의 일부입니다.
+    """
+
+    def __init__(self, cache_root, weights_path, imgsz, augment=False, backend='torch',
+                 conf=0.001, iou=0.7, max_det=1000, names=None):
+        self.imgsz = imgsz
+        self.augment = augment
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.weights_hash = file_sha256(weights_path)[:16]
+
+        key = f"{self.weights_hash}_{imgsz}_{'aug' if augment else 'noaug'}_{backend}_c{conf}_i{iou}_m{max_det}"
+        self.cache_dir = Path(cache_root) / key
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        meta_path = self.cache_dir / 'meta.json'
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {
+                'weights': os.path.abspath(weights_path),
+                'weights_sha256_16': self.weights_hash,
+                'imgsz': imgsz,
+                'augment': augment,
+                'backend': backend,
+                'conf': conf,
+                'iou': iou,
+                'max_det': max_det,
+            }
+        self.meta_path = meta_path
+        if names is not None:
+            self.save_names(names)
+
+        self._hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def save_names(self, names):
+        """모델 없이 시각화할 수 있도록 클래스 이름을 meta.json에 함께 저장합니다."""
+        if 'names' in self.meta:
+            return
+        self.meta['names'] = {int(k): v for k, v in dict(names).items()}
+        # 샤딩 워커들이 동시에 저장할 수 있으므로 임시 파일 이름은 프로세스마다 다르게 합니다.
+        tmp_path = self.meta_path.with_name(f"meta.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+    @property
+    def names(self):
+        names = self.meta.get('names')
+        return {int(k): v for k, v in names.items()} if names else None
+
+    def predict_kwargs(self):
+        """캐시를 채울 때 model()에 넘길 추론 인자"""
+        return dict(imgsz=self.imgsz, conf=self.conf, iou=self.iou, max_det=self.max_det, augment=self.augment)
+
+    # -----------------------------
+    # 조회 / 저장
+    # -----------------------------
+    def _entry_path(self, image_path):
+        image_hash = self._hashes.get(image_path)
+        if image_hash is None:
+            image_hash = image_content_hash(image_path)
+            self._hashes[image_path] = image_hash
+        return self.cache_dir / image_hash[:2] / f"{image_hash}.npz"
+
+    def contains(self, image_path):
+        return self._entry_path(image_path).exists()
+
+    def get(self, image_path):
+        """캐시된 (xyxy, score, class) 배열. 없으면 None."""
+        entry_path = self._entry_path(image_path)
+        if not entry_path.exists():
+            self.misses += 1
+            return None
+        try:
+            with np.load(entry_path) as data:
+                arrays = (data['boxes'], data['scores'], data['classes'].astype(np.int64))
+        except (OSError, ValueError, KeyError):
+            # 손상된 항목은 miss로 처리합니다.
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def put(self, image_path, arrays):
+        boxes, scores, classes = arrays
+        entry_path = self._entry_path(image_path)
+        entry_path.parent.mkdir(exist_ok=True)
+        tmp_path = entry_path.with_name(f"{entry_path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                boxes=np.asarray(boxes, dtype=np.float32),
+                scores=np.asarray(scores, dtype=np.float32),
+                classes=np.asarray(classes, dtype=np.int16),
+            )
+        os.replace(tmp_path, entry_path)
+
+    # -----------------------------
+    # 임계값 재적용
+    # -----------------------------
+    def apply_thresholds(self, arrays, conf=None, max_det=None):
+        """
+        캐시된 검출 결과(score 내림차순)에 더 엄격한 conf / max_det를 적용합니다.
+
+        NMS는 score가 높은 박스부터 진행되므로 낮은 score 박스를 나중에 제거해도
+        남은 박스의 결과는 같고, 상위 max_det개 선택도 정렬된 결과의 앞부분과 같습니다.
+        따라서 결과는 같은 conf / max_det로 직접 추론한 것과 동일합니다.
+        """
+        conf = self.conf if conf is None else conf
+        max_det = self.max_det if max_det is None else max_det
+        if conf < self.conf or max_det > self.max_det:
+            raise ValueError(
+                f"캐시 임계값(conf>={self.conf}, max_det<={self.max_det})보다 "
+                f"느슨한 값은 적용할 수 없습니다: conf={conf}, max_det={max_det}"
+            )
+
+        boxes, scores, classes = arrays
+        keep = scores > conf
+        return boxes[keep][:max_det], scores[keep][:max_det], classes[keep][:max_det]
+
+
+def iter_cached_predictions(cache, image_paths, predict_fn, conf=None, max_det=None):
+    """
+    이미지별 (image_path, (xyxy, score, class))를 입력 순서대로 반환합니다.
+
+    캐시에 없는 이미지만 predict_fn(miss_paths, predict_kwargs)로 한 번에 추론해 저장하며,
+    predict_fn은 (image_path, arrays)를 입력 순서대로 반환하는 이터레이터여야 합니다.
+    모든 결과에는 현재 conf / max_det가 다시 적용됩니다.
+    """
+    miss_paths = [p for p in image_paths if not cache.contains(p)]
+    miss_set = set(miss_paths)
+    cache.misses += len(miss_paths)
+    model_predictions = predict_fn(miss_paths, cache.predict_kwargs())
+
+    for image_path in image_paths:
+        if image_path in miss_set:
+            _, arrays = next(model_predictions)
+            cache.put(image_path, arrays)
+        else:
+            arrays = cache.get(image_path)
+            if arrays is None:
+                # 조회 도중 손상된 캐시 항목은 다시 추론합니다.
+                _, arrays = next(predict_fn([image_path], cache.predict_kwargs()))
+                cache.put(image_path, arrays)
+        yield image_path, cache.apply_thresholds(arrays, conf, max_det)
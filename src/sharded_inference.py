@@ -0,0 +1,144 @@
+# src/sharded_inference.py
+
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from submission_postprocess import SUBMISSION_COLUMNS, score_sort_key
+
+# =================================================================
+# 멀티 프로세스 샤딩 추론
+#  : 정렬된 이미지 목록을 연속 구간(shard)으로 나누어 워커 프로세스에 배분합니다.
+#    각 워커는 가중치를 한 번만 로드하고 intra-op 스레드 수를 제한해 추론합니다.
+# =================================================================
+
+
+def split_into_shards(items, num_shards):
+    """목록을 순서를 유지한 채 num_shards개의 연속 구간으로 나눕니다. (빈 구간 제외)"""
+    num_shards = max(1, min(num_shards, len(items)))
+    base, extra = divmod(len(items), num_shards)
+    shards, start = [], 0
+    for i in range(num_shards):
+        end = start + base + (1 if i < extra else 0)
+        if end > start:
+            shards.append(items[start:end])
+        start = end
+    return shards
+
+
+def default_threads_per_worker(num_workers):
+    """CPU 코어를 워커 수로 나눈 intra-op 스레드 수 (최소 1)"""
+    return max(1, (os.cpu_count() or 1) // max(1, num_workers))
+
+
+def _init_worker(num_threads, initializer, initargs):
+    import torch
+
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 이미 병렬 작업이 시작된 경우 inter-op 스레드 수는 변경할 수 없습니다.
+        pass
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def run_sharded(task_fn, shard_args, num_workers, threads_per_worker=None, initializer=None, initargs=()):
+    """
+    shard_args의 각 인자 튜플로 task_fn을 워커 프로세스에서 실행하고, 결과를 shard 순서대로 반환합니다.
+
+    initializer(*initargs)는 워커마다 한 번 실행됩니다. (예: 모델 로드)
+    """
+    threads_per_worker = threads_per_worker or default_threads_per_worker(num_workers)
+    context = mp.get_context('spawn')
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(threads_per_worker, initializer, initargs),
+    ) as executor:
+        futures = [executor.submit(task_fn, *args) for args in shard_args]
+        return [future.result() for future in futures]
+
+
+def merge_submission_shards(shard_paths, output_path):
+    """
+    shard별 제출 CSV를 shard 순서대로 이어 붙여 하나의 제출 파일로 만듭니다.
+
+    각 shard의 annotation_id는 1부터 시작하므로, 앞선 shard들의 행 수만큼 더해
+    단일 프로세스로 실행했을 때와 같은 연속 번호가 되도록 합니다.
+    반환값은 전체 행 수입니다.
+    """
+    tmp_path = f"{output_path}.tmp"
+    offset = 0
+    last_image_id = None
+    needs_sort = False
+
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        pd.DataFrame(columns=SUBMISSION_COLUMNS).to_csv(f, index=False)
+        for shard_path in shard_paths:
+            if not os.path.exists(shard_path):
+                # 검출이 하나도 없는 shard는 파일이 생성되지 않습니다.
+                continue
+            df = pd.read_csv(shard_path, dtype={'score': str})
+            if df.empty:
+                continue
+            df['annotation_id'] += offset
+            if last_image_id is not None and df['image_id'].iloc[0] <= last_image_id:
+                needs_sort = True
+            last_image_id = df['image_id'].iloc[-1]
+            df.to_csv(f, index=False, header=False)
+            offset += len(df)
+
+    if offset == 0:
+        os.remove(tmp_path)
+        return 0
+
+    if needs_sort:
+        # shard 간 image_id가 겹치거나 역전된 경우에만 전체를 다시 정렬합니다.
+        df = pd.read_csv(tmp_path, dtype={'score': str})
+        order = np.lexsort((-score_sort_key(df['score'].to_numpy(dtype=str)), df['image_id'].to_numpy()))
+        df.iloc[order].to_csv(tmp_path, index=False)
+
+    os.replace(tmp_path, output_path)
+    return offset
+
+
+def measure_scaling(run_fn, num_images, max_workers, report_path=None):
+    """
+    run_fn(num_workers)를 워커 1..max_workers개로 실행하며 처리량(images/sec)을 측정합니다.
+    결과 표를 출력하고 report_path가 있으면 JSON으로 저장합니다.
+    """
+    rows = []
+    for num_workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        run_fn(num_workers)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            'workers': num_workers,
+            'threads_per_worker': default_threads_per_worker(num_workers),
+            'images': num_images,
+            'seconds': round(elapsed, 3),
+            'images_per_sec': round(num_images / elapsed, 3),
+        })
+
+    base = rows[0]['images_per_sec']
+    print("\n--- 워커 수별 처리량 ---")
+    print(f"{'workers':>7} {'threads':>7} {'sec':>9} {'img/s':>9} {'speedup':>8} {'eff':>6}")
+    for row in rows:
+        row['speedup'] = round(row['images_per_sec'] / base, 3)
+        row['efficiency'] = round(row['speedup'] / row['workers'], 3)
+        print(f"{row['workers']:>7} {row['threads_per_worker']:>7} {row['seconds']:>9.2f} "
+              f"{row['images_per_sec']:>9.2f} {row['speedup']:>8.2f} {row['efficiency']:>6.2f}")
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'results': rows}, f, indent=2)
+        print(f"📊 스케일링 리포트 저장: {report_path}")
+    return rows
@@ -0,0 +1,134 @@
+# src/submission_postprocess.py
+
+import numpy as np
+import pandas as pd
+
+# =================================================================
+# 제출 CSV 후처리 (배열 단위)
+#  : 박스를 하나씩 순회하지 않고 이미지 단위 배열 연산으로 제출 행을 만듭니다.
+# =================================================================
+
+SUBMISSION_COLUMNS = [
+    'annotation_id', 'image_id', 'category_id',
+    'bbox_x', 'bbox_y', 'bbox_w', 'bbox_h', 'score'
+]
+
+# 정수 컬럼 (score는 '0.1234' 형태의 문자열로 저장)
+INT_COLUMNS = SUBMISSION_COLUMNS[:-1]
+
+# score 문자열의 최대 길이 ('1.0000')
+SCORE_DTYPE = '<U6'
+
+
+def build_category_lookup(original_category_ids):
+    """YOLO ID(인덱스) -> 원본 Category ID 변환용 lookup 배열을 만듭니다."""
+    return np.asarray(original_category_ids, dtype=np.int64)
+
+
+def result_to_arrays(result):
+    """ultralytics Results에서 (xyxy, score, yolo_id) 배열을 꺼냅니다. 박스가 없으면 None."""
+    if result.boxes is None:
+        return None
+    boxes = result.boxes.xyxy.cpu().numpy()
+    scores = result.boxes.conf.cpu().numpy()
+    yolo_ids = result.boxes.cls.cpu().numpy().astype(int)
+    return boxes, scores, yolo_ids
+
+
+def score_sort_key(score_strings):
+    """'0.1234' 형태의 score 문자열을 같은 순서를 갖는 정수(1234)로 변환합니다."""
+    if len(score_strings) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.char.replace(score_strings, '.', '').astype(np.int64)
+
+
+def postprocess_detections(boxes, scores, yolo_ids, image_id, category_lookup, first_annotation_id):
+    """
+    이미지 1장의 검출 결과를 제출 컬럼 배열(dict)로 변환합니다.
+
+    - annotation_id는 검출 순서대로 first_annotation_id부터 부여합니다. (기존과 동일)
+    - 행은 score(소수점 4자리 문자열 기준) 내림차순으로 정렬되며, 동점은 검출 순서를 유지합니다.
+
+    Returns:
+        (columns, unknown_ids): 컬럼별 배열 dict와 lookup 범위를 벗어난 YOLO ID 배열
+    """
+    # YOLO ID (0~72)를 원본 Category ID로 변환 (범위 밖 ID는 제외)
+    valid = yolo_ids < len(category_lookup)
+    unknown_ids = yolo_ids[~valid]
+    boxes, scores, yolo_ids = boxes[valid], scores[valid], yolo_ids[valid]
+    n = len(yolo_ids)
+
+    # BBox 좌표 변환 (xyxy -> COCO [x, y, w, h]), round()와 같은 half-to-even 반올림
+    bbox_x = np.rint(boxes[:, 0]).astype(np.int64)
+    bbox_y = np.rint(boxes[:, 1]).astype(np.int64)
+    bbox_w = np.rint(boxes[:, 2] - boxes[:, 0]).astype(np.int64)
+    bbox_h = np.rint(boxes[:, 3] - boxes[:, 1]).astype(np.int64)
+
+    # 스코어는 소수점 4자리까지 표시 (f"{score:.4f}"와 동일한 결과)
+    score_strings = np.char.mod('%.4f', scores.astype(np.float64)).astype(SCORE_DTYPE)
+
+    columns = {
+        'annotation_id': np.arange(first_annotation_id, first_annotation_id + n, dtype=np.int64),
+        'image_id': np.full(n, image_id, dtype=np.int64),
+        'category_id': category_lookup[yolo_ids],
+        'bbox_x': bbox_x,
+        'bbox_y': bbox_y,
+        'bbox_w': bbox_w,
+        'bbox_h': bbox_h,
+        'score': score_strings,
+    }
+
+    # 이미지 내 score 내림차순 정렬 (stable)
+    order = np.argsort(-score_sort_key(score_strings), kind='stable')
+    columns = {name: values[order] for name, values in columns.items()}
+    return columns, unknown_ids
+
+
+class SubmissionBuffer:
+    """
+    제출 행을 컬럼별로 미리 할당된 numpy 배열에 모아두는 버퍼입니다.
+    용량이 부족하면 2배로 늘립니다.
+    """
+
+    def __init__(self, capacity=1024):
+        capacity = max(1, capacity)
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=np.int64) for name in INT_COLUMNS}
+        self.columns['score'] = np.empty(capacity, dtype=SCORE_DTYPE)
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, capacity):
+        current = len(self.columns['score'])
+        if capacity <= current:
+            return
+        new_capacity = max(capacity, current * 2)
+        for name, values in self.columns.items():
+            grown = np.empty(new_capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.columns[name] = grown
+
+    def append(self, columns):
+        """postprocess_detections가 반환한 컬럼 dict를 뒤에 추가합니다."""
+        n = len(columns['score'])
+        if n == 0:
+            return
+        self._reserve(self.size + n)
+        for name, values in self.columns.items():
+            values[self.size:self.size + n] = columns[name]
+        self.size += n
+
+    def clear(self):
+        self.size = 0
+
+    def to_frame(self, sort=True):
+        """
+        버퍼 내용을 DataFrame으로 변환합니다.
+        sort=True이면 (image_id 오름차순, score 내림차순)으로 stable 정렬합니다.
+        """
+        columns = {name: values[:self.size] for name, values in self.columns.items()}
+        if sort:
+            order = np.lexsort((-score_sort_key(columns['score']), columns['image_id']))
+            columns = {name: values[order] for name, values in columns.items()}
+        return pd.DataFrame(columns, columns=SUBMISSION_COLUMNS)
@@ -0,0 +1,166 @@
+# src/submission_writer.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from submission_postprocess import SUBMISSION_COLUMNS, score_sort_key
+
+# =================================================================
+# 스트리밍 / 재개 가능한 제출 파일 작성기
+#  : 추론이 끝난 이미지의 행을 즉시 '<출력>.partial'에 이어 쓰고,
+#    완료된 image_id와 annotation_id_counter를 '<출력>.ckpt.json'에 기록합니다.
+#    중단 후 재실행하면 체크포인트 이후부터 이어서 추론하며,
+#    모든 이미지가 끝나면 최종 파일을 원자적으로(os.replace) 생성합니다.
+# =================================================================
+
+
+def _atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StreamingSubmissionWriter:
+    """
+    제출 행을 이미지(또는 배치) 단위로 스트리밍 저장하는 작성기입니다.
+
+    signature에는 결과에 영향을 주는 설정(가중치, imgsz 등)을 넣습니다.
+    체크포인트의 signature가 현재 설정과 다르면 이어쓰지 않고 처음부터 다시 작성합니다.
+    """
+
+    def __init__(self, output_path, signature=None):
+        self.output_path = output_path
+        self.partial_path = f"{output_path}.partial"
+        self.checkpoint_path = f"{output_path}.ckpt.json"
+        self.signature = signature or {}
+
+        self.completed_image_ids = set()
+        self.annotation_id_counter = 1
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.last_image_id = None
+        # image_id 순서가 역전된 경우에만 마무리 단계에서 전체 정렬이 필요합니다.
+        self.needs_sort = False
+
+    # -----------------------------
+    # 시작 / 재개
+    # -----------------------------
+    def open(self, resume=True):
+        """작성을 시작합니다. 재개에 성공하면 True를 반환합니다."""
+        if resume and self._load_checkpoint():
+            # 체크포인트 이후에 일부만 기록된 행은 잘라냅니다.
+            with open(self.partial_path, 'r+b') as f:
+                f.truncate(self.bytes_written)
+            return True
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        with open(self.partial_path, 'w', encoding='utf-8', newline='') as f:
+            pd.DataFrame(columns=SUBMISSION_COLUMNS).to_csv(f, index=False)
+        self.bytes_written = os.path.getsize(self.partial_path)
+        self._save_checkpoint()
+        return False
+
+    def _load_checkpoint(self):
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.partial_path)):
+            return False
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+
+        if checkpoint.get('signature') != self.signature:
+            print("체크포인트 설정이 현재 설정과 달라 처음부터 다시 작성합니다.")
+            return False
+        if os.path.getsize(self.partial_path) < checkpoint['bytes_written']:
+            print("체크포인트보다 partial 파일이 짧아 처음부터 다시 작성합니다.")
+            return False
+
+        self.completed_image_ids = set(checkpoint['completed_image_ids'])
+        self.annotation_id_counter = checkpoint['annotation_id_counter']
+        self.rows_written = checkpoint['rows_written']
+        self.bytes_written = checkpoint['bytes_written']
+        self.last_image_id = checkpoint['last_image_id']
+        self.needs_sort = checkpoint['needs_sort']
+        return True
+
+    def _save_checkpoint(self):
+        _atomic_write_json(self.checkpoint_path, {
+            'signature': self.signature,
+            'completed_image_ids': sorted(self.completed_image_ids),
+            'annotation_id_counter': self.annotation_id_counter,
+            'rows_written': self.rows_written,
+            'bytes_written': self.bytes_written,
+            'last_image_id': self.last_image_id,
+            'needs_sort': self.needs_sort,
+        })
+
+    # -----------------------------
+    # 이어쓰기
+    # -----------------------------
+    def is_completed(self, image_id):
+        return image_id in self.completed_image_ids
+
+    def write(self, buffer, image_ids, annotation_id_counter):
+        """
+        버퍼(SubmissionBuffer)의 행을 partial 파일에 추가하고 체크포인트를 갱신합니다.
+
+        image_ids는 이 버퍼에 포함된(검출이 없던 이미지 포함) 완료 image_id 목록이며,
+        처리 순서대로 전달되어야 합니다.
+        """
+        for image_id in image_ids:
+            if self.last_image_id is not None and image_id <= self.last_image_id:
+                self.needs_sort = True
+            self.last_image_id = image_id
+
+        if len(buffer):
+            # 이미지 내부는 이미 score 내림차순이므로 처리 순서 그대로 기록합니다.
+            df = buffer.to_frame(sort=False)
+            with open(self.partial_path, 'a', encoding='utf-8', newline='') as f:
+                df.to_csv(f, index=False, header=False)
+                f.flush()
+                os.fsync(f.fileno())
+            self.rows_written += len(buffer)
+            self.bytes_written = os.path.getsize(self.partial_path)
+
+        self.completed_image_ids.update(image_ids)
+        self.annotation_id_counter = annotation_id_counter
+        self._save_checkpoint()
+
+    # -----------------------------
+    # 마무리
+    # -----------------------------
+    def finalize(self):
+        """
+        partial 파일을 최종 제출 파일로 원자적으로 교체합니다.
+        저장된 행이 없으면 파일을 만들지 않고 False를 반환합니다.
+        """
+        if self.rows_written == 0:
+            self.discard()
+            return False
+
+        if self.needs_sort:
+            # (image_id 오름차순, score 내림차순) stable 정렬 후 교체
+            df = pd.read_csv(self.partial_path, dtype={'score': str})
+            order = np.lexsort((-score_sort_key(df['score'].to_numpy(dtype=str)), df['image_id'].to_numpy()))
+            tmp_path = f"{self.output_path}.tmp"
+            df.iloc[order].to_csv(tmp_path, index=False)
+            os.replace(tmp_path, self.output_path)
+            os.remove(self.partial_path)
+        else:
+            os.replace(self.partial_path, self.output_path)
+
+        os.remove(self.checkpoint_path)
+        return True
+
+    def discard(self):
+        """partial 파일과 체크포인트를 삭제합니다."""
+        for path in (self.partial_path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
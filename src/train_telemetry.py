@@ -0,0 +1,211 @@
+# src/train_telemetry.py
+
+import csv
+import json
+import os
+import time
+
+import psutil
+from ultralytics.utils import RANK
+
+# =================================================================
+# 학습 텔레메트리 콜백
+#  : epoch마다 처리량(images/sec), dataloader 대기 vs 연산 시간, 검증 시간,
+#    CPU 사용률, 최대 RSS(메인 + dataloader 워커 합)를 기록합니다.
+#    run 디렉토리의 telemetry.csv(epoch마다 한 줄 추가)와 telemetry.json에 바로 저장하고,
+#    학습이 끝나면 telemetry.png로 그립니다.
+#
+#  - 대기 시간: 이전 배치가 끝난 뒤 다음 배치를 받을 때까지 (on_train_batch_end -> on_train_batch_start)
+#  - 연산 시간: 배치를 받은 뒤 학습 스텝이 끝날 때까지 (on_train_batch_start -> on_train_batch_end)
+#    (CUDA는 비동기라 진행률 표시에서 loss를 읽을 때 동기화된 시간이 연산 시간에 포함됩니다.)
+# =================================================================
+
+RSS_SAMPLE_EVERY = 10  # 몇 배치마다 RSS를 측정할지 (자식 프로세스 조회 비용 때문)
+
+FIELDS = [
+    'epoch', 'images', 'train_s', 'images_per_s', 'loader_wait_s', 'compute_s', 'loader_wait_ratio',
+    'val_s', 'cpu_percent', 'process_cpu_percent', 'peak_rss_gb',
+]
+
+
+class TrainTelemetry:
+    """trainer에 register()로 콜백을 등록합니다. rank 0(또는 단일 프로세스)에서만 기록합니다."""
+
+    def __init__(self):
+        self.rows = []
+        self._process = psutil.Process()
+        self._cpu_times = {}  # pid -> 마지막으로 본 (user + system) CPU 시간
+        self._in_epoch = False
+
+    def register(self, trainer):
+        trainer.add_callback('on_train_epoch_start', self.on_train_epoch_start)
+        trainer.add_callback('on_train_batch_start', self.on_train_batch_start)
+        trainer.add_callback('on_train_batch_end', self.on_train_batch_end)
+        trainer.add_callback('on_train_epoch_end', self.on_train_epoch_end)
+        trainer.add_callback('on_fit_epoch_end', self.on_fit_epoch_end)
+        trainer.add_callback('on_train_end', self.on_train_end)
+        # validator는 trainer의 콜백을 복사해 만들어지므로 여기서 등록하면 검증 시간도 잴 수 있습니다.
+        trainer.add_callback('on_val_start', self.on_val_start)
+        trainer.add_callback('on_val_end', self.on_val_end)
+        return self
+
+    # -----------------------------
+    # 측정
+    # -----------------------------
+    def _processes(self):
+        try:
+            return [self._process] + self._process.children(recursive=True)
+        except psutil.Error:
+            return [self._process]
+
+    def _sample_rss(self):
+        rss = 0
+        for proc in self._processes():
+            try:
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        self._peak_rss = max(self._peak_rss, rss)
+
+    def _cpu_seconds_since_last(self):
+        """메인 + 자식 프로세스가 마지막 호출 이후 사용한 CPU 시간(초)"""
+        total = 0.0
+        for proc in self._processes():
+            try:
+                times = proc.cpu_times()
+            except psutil.Error:
+                continue
+            used = times.user + times.system
+            total += used - self._cpu_times.get(proc.pid, 0.0)
+            self._cpu_times[proc.pid] = used
+        return total
+
+    # -----------------------------
+    # 콜백
+    # -----------------------------
+    def on_train_epoch_start(self, trainer):
+        if RANK not in {-1, 0}:
+            return
+        self._in_epoch = True
+        self._batches = 0
+        self._wait_s = 0.0
+        self._compute_s = 0.0
+        self._val_s = 0.0
+        self._peak_rss = 0
+        self._cpu_seconds_since_last()
+        psutil.cpu_percent(interval=None)  # 다음 호출까지의 시스템 CPU 사용률 측정 시작
+        self._epoch_start = self._last_batch_end = time.perf_counter()
+
+    def on_train_batch_start(self, trainer):
+        if not self._in_epoch:
+            return
+        self._batch_start = time.perf_counter()
+        self._wait_s += self._batch_start - self._last_batch_end
+
+    def on_train_batch_end(self, trainer):
+        if not self._in_epoch:
+            return
+        self._last_batch_end = time.perf_counter()
+        self._compute_s += self._last_batch_end - self._batch_start
+        if self._batches % RSS_SAMPLE_EVERY == 0:
+            self._sample_rss()
+        self._batches += 1
+
+    def on_train_epoch_end(self, trainer):
+        if not self._in_epoch:
+            return
+        self._train_s = time.perf_counter() - self._epoch_start
+        self._cpu_percent = psutil.cpu_percent(interval=None)
+        self._process_cpu_percent = 100 * self._cpu_seconds_since_last() / self._train_s if self._train_s else 0.0
+        self._sample_rss()
+
+    def on_val_start(self, validator):
+        self._val_start = time.perf_counter()
+
+    def on_val_end(self, validator):
+        # 학습이 끝난 뒤 best.pt 최종 검증은 epoch 기록에 넣지 않습니다.
+        if self._in_epoch:
+            self._val_s += time.perf_counter() - self._val_start
+
+    def on_fit_epoch_end(self, trainer):
+        if not self._in_epoch:
+            return
+        self._in_epoch = False
+        images = min(self._batches * trainer.batch_size, len(trainer.train_loader.dataset)) * max(trainer.world_size, 1)
+        busy_s = self._wait_s + self._compute_s
+        row = {
+            'epoch': trainer.epoch + 1,
+            'images': images,
+            'train_s': round(self._train_s, 3),
+            'images_per_s': round(images / self._train_s, 2) if self._train_s else 0.0,
+            'loader_wait_s': round(self._wait_s, 3),
+            'compute_s': round(self._compute_s, 3),
+            'loader_wait_ratio': round(self._wait_s / busy_s, 4) if busy_s else 0.0,
+            'val_s': round(self._val_s, 3),
+            'cpu_percent': self._cpu_percent,
+            'process_cpu_percent': round(self._process_cpu_percent, 1),
+            'peak_rss_gb': round(self._peak_rss / (1 << 30), 3),
+        }
+        self.rows.append(row)
+        self._save(trainer.save_dir, row)
+        print(f"⏱️ [epoch {row['epoch']}] {row['images_per_s']} img/s, 대기 {row['loader_wait_s']}s / "
+              f"연산 {row['compute_s']}s, 검증 {row['val_s']}s, CPU {row['cpu_percent']}%, RSS {row['peak_rss_gb']}GB")
+
+    def on_train_end(self, trainer):
+        if RANK not in {-1, 0} or not self.rows:
+            return
+        out_path = plot_telemetry(self.rows, os.path.join(trainer.save_dir, 'telemetry.png'))
+        print(f"📊 텔레메트리 플롯 저장 완료: {out_path}")
+
+    # -----------------------------
+    # 저장
+    # -----------------------------
+    def _save(self, save_dir, row):
+        csv_path = os.path.join(save_dir, 'telemetry.csv')
+        new_file = not os.path.exists(csv_path)
+        with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+        json_path = os.path.join(save_dir, 'telemetry.json')
+        tmp_path = f"{json_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.rows, f, indent=2)
+        os.replace(tmp_path, json_path)
+
+
+def plot_telemetry(rows, out_path):
+    """epoch별 처리량, 대기/연산/검증 시간, CPU 사용률, 최대 RSS를 한 장에 그립니다."""
+    import matplotlib.pyplot as plt
+
+    epochs = [row['epoch'] for row in rows]
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
+
+    axes[0, 0].plot(epochs, [row['images_per_s'] for row in rows], marker='o')
+    axes[0, 0].set_title('Throughput (images/sec)')
+
+    wait = [row['loader_wait_s'] for row in rows]
+    compute = [row['compute_s'] for row in rows]
+    axes[0, 1].bar(epochs, compute, label='compute')
+    axes[0, 1].bar(epochs, wait, bottom=compute, label='dataloader wait')
+    axes[0, 1].bar(epochs, [row['val_s'] for row in rows], bottom=[c + w for c, w in zip(compute, wait)],
+                   label='validation')
+    axes[0, 1].set_title('Epoch time breakdown (s)')
+    axes[0, 1].legend()
+
+    axes[1, 0].plot(epochs, [row['cpu_percent'] for row in rows], marker='o', label='system')
+    axes[1, 0].plot(epochs, [row['process_cpu_percent'] for row in rows], marker='o', label='trainer + workers (1 core = 100)')
+    axes[1, 0].set_title('CPU utilization (%)')
+    axes[1, 0].legend()
+
+    axes[1, 1].plot(epochs, [row['peak_rss_gb'] for row in rows], marker='o')
+    axes[1, 1].set_title('Peak RSS, trainer + workers (GB)')
+
+    for ax in axes.flat:
+        ax.set_xlabel('Epoch')
+    fig.tight_layout()
+    fig.savefig(out_path)
+    plt.close(fig)
+    return out_path
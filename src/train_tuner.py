@@ -0,0 +1,309 @@
+# src/train_tuner.py
+
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+import yaml
+
+# =================================================================
+# 학습 설정 자동 튜너 (batch / workers / cache / imgsz)
+#  : 후보 조합마다 별도 프로세스에서 짧은 학습 스텝(WARMUP_STEPS + PROFILE_STEPS)을 실행해
+#    스텝 시간, 처리량(images/sec), 최대 RSS(학습 프로세스 + dataloader 워커)를 측정합니다.
+#    RAM_LIMIT_GB를 넘으면 즉시 중단하고, 스텝 시간이 TARGET_STEP_S를 넘는 조합도 제외한 뒤
+#    가장 큰 imgsz에서 처리량이 가장 높은 조합을 고릅니다. (작은 imgsz는 정확도를 바꾸므로 우선하지 않음)
+#    결과는 각 학습 스크립트가 자동으로 읽는 오버레이 YAML로 저장합니다.
+#      - detect : yolo_train_config.tuned.yaml  (batch, workers, cache, imgsz)   -> src/yolo_train.py
+#      - segment: src/yolo_config.tuned.yaml    (batch_size, workers, cache, input_size) -> src/yolo_train_seg.py
+#    오버레이를 지우면 원래 설정으로 돌아갑니다.
+# =================================================================
+
+TRAINER = 'detect'  # 'detect' (yolo_train.py) 또는 'segment' (yolo_train_seg.py)
+
+RAM_LIMIT_GB = 24.0
+TARGET_STEP_S = 5.0  # 허용할 최대 평균 스텝 시간 (dataloader 대기 포함)
+
+BATCH_SIZES = [2, 4, 8, 16, 32]
+WORKER_COUNTS = [0, 2, 4, 8]
+CACHE_MODES = ['memmap', 'ram', False]
+IMG_SIZES = None  # None이면 설정 파일의 imgsz만 사용
+
+WARMUP_STEPS = 3
+PROFILE_STEPS = 10
+CANDIDATE_TIMEOUT_S = 900
+POLL_INTERVAL_S = 0.5
+
+ROOT = Path(__file__).resolve().parent.parent
+DETECT_CONFIG = ROOT / 'yolo_train_config.yaml'
+SEGMENT_CONFIG = ROOT / 'src' / 'yolo_config.yaml'
+
+
+def overlay_path_for(config_path):
+    """<설정 파일>.tuned.yaml"""
+    config_path = Path(config_path)
+    return config_path.with_name(f"{config_path.stem}.tuned.yaml")
+
+
+def load_overlay(config_path):
+    """튜너가 저장한 오버레이 설정 (없으면 빈 dict)"""
+    overlay_path = overlay_path_for(config_path)
+    if not overlay_path.exists():
+        return {}
+    with open(overlay_path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def base_train_args(trainer_name):
+    """설정 파일에서 튜닝에 필요한 ultralytics 학습 인자만 읽습니다. (오버레이는 적용하지 않음)"""
+    if trainer_name == 'detect':
+        with open(DETECT_CONFIG, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        return {
+            'model': config.get('model', 'yolo11n.pt'),
+            'data': config['data'],
+            'imgsz': config.get('imgsz', 640),
+            'device': config.get('device'),
+        }
+    with open(SEGMENT_CONFIG, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    return {
+        'model': f"{config.get('architecture', 'yolo11n')}-seg.pt",
+        'data': config['data_yaml_path'],
+        'imgsz': config['input_size'],
+        'device': config.get('device'),
+        # yolo_train_seg.py와 같은 CBAM 설정 (실제로 학습할 네트워크로 측정)
+        'cbam_layer': config.get('cbam_layer', 6),
+        'cbam_ratio': config.get('cbam_ratio', 16),
+    }
+
+
+def to_overlay(trainer_name, candidate):
+    """후보 조합 -> 학습 스크립트별 설정 키"""
+    if trainer_name == 'detect':
+        return {'batch': candidate['batch'], 'workers': candidate['workers'],
+                'cache': candidate['cache'], 'imgsz': candidate['imgsz']}
+    return {'batch_size': candidate['batch'], 'workers': candidate['workers'],
+            'cache': candidate['cache'], 'input_size': candidate['imgsz']}
+
+
+# =================================================================
+# 후보 1개 측정 (자식 프로세스)
+# =================================================================
+class _StopProfiling(Exception):
+    pass
+
+
+class StepProfiler:
+    """WARMUP_STEPS 이후 PROFILE_STEPS개 스텝의 시간(이전 스텝 종료 -> 이번 스텝 종료)을 잰 뒤 학습을 멈춥니다."""
+
+    def __init__(self, warmup_steps, profile_steps):
+        self.warmup_steps = warmup_steps
+        self.profile_steps = profile_steps
+        self.step = 0
+        self.batch_size = None  # 데이터셋이 batch보다 작으면 dataloader가 줄인 실제 batch
+        self.step_times = []
+        self.wait_times = []
+        self._last_end = None
+
+    def on_train_batch_start(self, trainer):
+        self._batch_start = time.perf_counter()
+
+    def on_train_batch_end(self, trainer):
+        now = time.perf_counter()
+        self.batch_size = trainer.train_loader.batch_size
+        if self._last_end is not None and self.step >= self.warmup_steps:
+            self.step_times.append(now - self._last_end)
+            self.wait_times.append(self._batch_start - self._last_end)
+        self._last_end = now
+        self.step += 1
+        if len(self.step_times) >= self.profile_steps:
+            raise _StopProfiling
+
+
+def _profile_candidate(trainer_name, base_args, candidate, warmup_steps, profile_steps, result_queue):
+    # 자식 프로세스에서 실행됩니다. (import 비용과 메모리를 후보마다 분리)
+    from ultralytics import YOLO
+
+    from cbam_surgery import request_cbam
+    from trainers import CachedDetectionTrainer, CachedSegmentationTrainer
+
+    profiler = StepProfiler(warmup_steps, profile_steps)
+    try:
+        model = YOLO(base_args['model'])
+        if 'cbam_layer' in base_args:
+            request_cbam(model, base_args['cbam_layer'], ratio=base_args['cbam_ratio'])
+        model.add_callback('on_train_batch_start', profiler.on_train_batch_start)
+        model.add_callback('on_train_batch_end', profiler.on_train_batch_end)
+        model.train(
+            data=base_args['data'],
+            imgsz=candidate['imgsz'],
+            batch=candidate['batch'],
+            workers=candidate['workers'],
+            cache=candidate['cache'],
+            device=base_args['device'],
+            epochs=1000,  # 데이터가 작아도 스텝 수를 채울 때까지 (측정 후 중단)
+            val=False,
+            plots=False,
+            save=False,
+            project=tempfile.gettempdir(),
+            name='train_tuner',
+            exist_ok=True,
+            verbose=False,
+            trainer=CachedDetectionTrainer if trainer_name == 'detect' else CachedSegmentationTrainer,
+        )
+    except _StopProfiling:
+        pass
+    except Exception as e:
+        status = 'oom' if 'out of memory' in str(e).lower() else 'error'
+        result_queue.put({'status': status, 'error': f"{type(e).__name__}: {e}"})
+        return
+
+    if len(profiler.step_times) < profile_steps:
+        result_queue.put({'status': 'error', 'error': f"스텝 {len(profiler.step_times)}개만 측정됨"})
+        return
+    step_s = sum(profiler.step_times) / len(profiler.step_times)
+    result_queue.put({
+        'status': 'ok',
+        'step_s': round(step_s, 4),
+        'loader_wait_s': round(sum(profiler.wait_times) / len(profiler.wait_times), 4),
+        'effective_batch': profiler.batch_size,
+        'images_per_s': round(profiler.batch_size / step_s, 2),
+    })
+
+
+def _tree_rss(pid):
+    try:
+        proc = psutil.Process(pid)
+        procs = [proc] + proc.children(recursive=True)
+    except psutil.Error:
+        return 0
+    rss = 0
+    for p in procs:
+        try:
+            rss += p.memory_info().rss
+        except psutil.Error:
+            continue
+    return rss
+
+
+def _kill_tree(pid):
+    try:
+        proc = psutil.Process(pid)
+        procs = proc.children(recursive=True) + [proc]
+    except psutil.Error:
+        return
+    for p in procs:
+        try:
+            p.kill()
+        except psutil.Error:
+            continue
+
+
+def profile_candidate(trainer_name, base_args, candidate, ram_limit_gb=RAM_LIMIT_GB,
+                      warmup_steps=WARMUP_STEPS, profile_steps=PROFILE_STEPS, timeout_s=CANDIDATE_TIMEOUT_S):
+    """
+    후보 1개를 spawn 프로세스에서 측정합니다. 부모가 프로세스 트리 RSS를 주기적으로 확인해
+    ram_limit_gb를 넘으면 종료하므로 실제 OOM 전에 멈춥니다.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    proc = ctx.Process(
+        target=_profile_candidate,
+        args=(trainer_name, base_args, candidate, warmup_steps, profile_steps, result_queue),
+    )
+    start = time.perf_counter()
+    proc.start()
+
+    limit = ram_limit_gb * (1 << 30)
+    peak_rss = 0
+    result = None
+    while result is None:
+        try:
+            result = result_queue.get(timeout=POLL_INTERVAL_S)
+            break
+        except queue.Empty:
+            pass
+        peak_rss = max(peak_rss, _tree_rss(proc.pid))
+        if peak_rss > limit:
+            result = {'status': 'over_ram'}
+        elif time.perf_counter() - start > timeout_s:
+            result = {'status': 'timeout'}
+        elif not proc.is_alive():
+            result = {'status': 'killed', 'error': f"exit code {proc.exitcode}"}
+    _kill_tree(proc.pid)
+    proc.join()
+
+    result.update(candidate)
+    result['peak_rss_gb'] = round(peak_rss / (1 << 30), 3)
+    result['elapsed_s'] = round(time.perf_counter() - start, 1)
+    return result
+
+
+# =================================================================
+# 탐색
+# =================================================================
+def tune(trainer_name=TRAINER, ram_limit_gb=RAM_LIMIT_GB, target_step_s=TARGET_STEP_S,
+         batch_sizes=BATCH_SIZES, worker_counts=WORKER_COUNTS, cache_modes=CACHE_MODES, img_sizes=IMG_SIZES):
+    """
+    (imgsz, cache, workers)마다 batch를 작은 것부터 늘려 가며 측정합니다.
+    RAM 한도/스텝 시간 목표를 넘거나 실패하면 그보다 큰 batch는 건너뜁니다.
+    선택된 조합을 오버레이로 저장하고 (선택 결과, 전체 측정 결과)를 반환합니다.
+    """
+    if trainer_name not in ('detect', 'segment'):
+        raise ValueError(f"지원하지 않는 trainer: {trainer_name} (지원: 'detect', 'segment')")
+    base_args = base_train_args(trainer_name)
+    img_sizes = img_sizes or [base_args['imgsz']]
+    max_workers = os.cpu_count() or 1
+    worker_counts = [w for w in worker_counts if w <= max_workers]
+
+    results = []
+    for imgsz, cache, workers in itertools.product(img_sizes, cache_modes, worker_counts):
+        for batch in sorted(batch_sizes):
+            candidate = {'imgsz': imgsz, 'cache': cache, 'workers': workers, 'batch': batch}
+            result = profile_candidate(trainer_name, base_args, candidate, ram_limit_gb)
+            result['feasible'] = result['status'] == 'ok' and result['peak_rss_gb'] <= ram_limit_gb \
+                and result['step_s'] <= target_step_s
+            results.append(result)
+            print(f"  imgsz={imgsz} cache={cache} workers={workers} batch={batch}: {result['status']}"
+                  + (f", {result['images_per_s']} img/s, step {result['step_s']}s" if result['status'] == 'ok' else '')
+                  + f", RSS {result['peak_rss_gb']}GB" + ('' if result['feasible'] else ' ❌'))
+            if not result['feasible']:
+                break  # 더 큰 batch는 메모리/스텝 시간이 더 크므로 건너뜁니다.
+            if result['effective_batch'] < batch:
+                break  # 데이터셋보다 큰 batch는 모두 같은 batch로 줄어듭니다.
+
+    feasible = [r for r in results if r['feasible']]
+    best = None
+    if feasible:
+        top_imgsz = max(r['imgsz'] for r in feasible)
+        best = max((r for r in feasible if r['imgsz'] == top_imgsz), key=lambda r: r['images_per_s'])
+
+    config_path = DETECT_CONFIG if trainer_name == 'detect' else SEGMENT_CONFIG
+    report_path = config_path.with_name(f"{config_path.stem}.tune_report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({'trainer': trainer_name, 'ram_limit_gb': ram_limit_gb, 'target_step_s': target_step_s,
+                   'best': best, 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"📊 튜닝 결과 저장: {report_path}")
+
+    if best is None:
+        print(f"🚨 RAM {ram_limit_gb}GB / 스텝 {target_step_s}s 조건을 만족하는 조합이 없습니다. 오버레이를 저장하지 않습니다.")
+        return None, results
+
+    overlay = to_overlay(trainer_name, best)
+    overlay_path = overlay_path_for(config_path)
+    with open(overlay_path, 'w', encoding='utf-8') as f:
+        f.write(f"# train_tuner.py 자동 생성 ({best['images_per_s']} img/s, step {best['step_s']}s, "
+                f"RSS {best['peak_rss_gb']}GB). 지우면 {config_path.name} 설정을 그대로 사용합니다.\n")
+        yaml.safe_dump(overlay, f, sort_keys=False)
+    print(f"✅ 선택: {overlay} -> {overlay_path}")
+    return best, results
+
+
+if __name__ == '__main__':
+    tune()
@@ -0,0 +1,76 @@
+# src/trainers.py
+
+import copy
+
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.models.yolo.segment import SegmentationTrainer
+from ultralytics.utils import RANK
+
+from cbam_surgery import CBAM_LAYERS_KEY, CBAM_RATIO_KEY, cbam_cost_report, insert_cbam
+from image_cache import IMAGE_CACHE_DIR, IMAGE_CACHE_MODE, attach_image_cache
+from train_telemetry import TrainTelemetry
+
+# =================================================================
+# 학습용 Trainer
+#  : model.train(trainer=...)로 넘겨 사용합니다.
+#    데이터셋을 만들 때 이미지 캐시(image_cache.py)를 연결하고, epoch마다 캐시 hit rate를 출력합니다.
+#    학습 텔레메트리(train_telemetry.py)도 등록해 run 디렉토리에 telemetry.csv/json/png를 남깁니다.
+#    model.yaml['cbam_layers']가 있으면 모델을 만들 때 해당 layer 출력에 CBAM을 넣습니다. (cbam_surgery.py)
+# =================================================================
+
+
+class CachedTrainerMixin:
+    """
+    cache='memmap'이면 build_dataset() 결과에 ResizedImageCache를 연결하고, TrainTelemetry를 등록합니다.
+    (ultralytics는 'ram'/'disk' 외의 cache 값을 무시하므로 'memmap'을 그대로 넘겨도 됩니다.)
+    get_model()은 cfg의 cbam_layers 위치에 CBAM을 넣은 뒤 가중치를 로드합니다.
+    """
+
+    image_cache_dir = IMAGE_CACHE_DIR
+    cbam_report_repeats = 5  # CBAM 비용 리포트의 forward 반복 횟수 (0이면 리포트 생략)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_caches = {}  # mode -> ResizedImageCache
+        self.add_callback('on_train_epoch_end', _report_image_cache)
+        self.add_callback('on_train_end', _report_image_cache)
+        self.telemetry = TrainTelemetry().register(self)
+
+    def get_model(self, cfg=None, weights=None, verbose=True):
+        cbam_layers = cfg.get(CBAM_LAYERS_KEY) if isinstance(cfg, dict) else None
+        if not cbam_layers:
+            return super().get_model(cfg=cfg, weights=weights, verbose=verbose)
+
+        # CBAM 키(model.<i>.cbam.*)가 있어야 CBAM이 들어간 가중치(best.pt, resume)도 로드되므로 삽입 후 로드합니다.
+        model = super().get_model(cfg=cfg, weights=None, verbose=verbose)
+        base_model = copy.deepcopy(model) if self.cbam_report_repeats and RANK in {-1, 0} else None
+        inserted = insert_cbam(model, cbam_layers, ratio=cfg.get(CBAM_RATIO_KEY, 16))
+        if RANK in {-1, 0}:
+            print(f"✅ CBAM 삽입 완료: layer {inserted}")
+            if base_model is not None and inserted:
+                cbam_cost_report(base_model, model, imgsz=self.args.imgsz, repeats=self.cbam_report_repeats)
+        if weights:
+            model.load(weights)
+        return model
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        dataset = super().build_dataset(img_path, mode=mode, batch=batch)
+        if self.image_cache_dir is not None and str(self.args.cache).lower() == IMAGE_CACHE_MODE:
+            dataset = attach_image_cache(dataset, self.image_cache_dir)
+            if getattr(dataset, 'image_cache', None) is not None:
+                self.image_caches[mode] = dataset.image_cache
+        return dataset
+
+
+def _report_image_cache(trainer):
+    cache = trainer.image_caches.get('train')
+    if cache is not None:
+        cache.report(prefix=f"[epoch {trainer.epoch + 1}] ")
+
+
+class CachedDetectionTrainer(CachedTrainerMixin, DetectionTrainer):
+    pass
+
+
+class CachedSegmentationTrainer(CachedTrainerMixin, SegmentationTrainer):
+    pass
@@ -0,0 +1,130 @@
+# src/visualization.py
+
+import math
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+from tqdm import tqdm
+from ultralytics.engine.results import Results
+
+from image_loader import load_image
+
+# =================================================================
+# 예측 결과 시각화 (추론과 분리된 렌더링 단계)
+#  : 저장된 (xyxy, score, class) 배열을 원본 이미지에 그려 스레드/프로세스 풀에서 병렬로 저장합니다.
+#    - 'full'          : 원본 크기 이미지 (원본과 같은 파일명)
+#    - 'preview'       : 긴 변을 max_size로 줄인 JPEG 미리보기 (<stem>.jpg)
+#    - 'contact_sheet' : 미리보기를 격자로 모은 모자이크 JPEG (contact_sheet_000.jpg, ...)
+# =================================================================
+
+RENDER_MODES = ('full', 'preview', 'contact_sheet')
+
+
+def render_prediction(image_path, arrays, names, max_size=None):
+    """
+    이미지에 박스/라벨을 그린 BGR 배열을 반환합니다.
+    max_size가 있으면 이미지를 먼저 줄이고 박스 좌표도 같은 비율로 줄여서 그립니다.
+    """
+    boxes, scores, classes = arrays
+    image = load_image(image_path)
+    if max_size:
+        scale = max_size / max(image.shape[:2])
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            boxes = boxes * scale
+    data = np.concatenate(
+        [boxes, scores[:, None], classes[:, None]], axis=1
+    ).astype(np.float32)
+    result = Results(image, path=str(image_path), names=names, boxes=torch.from_numpy(data))
+    return result.plot()
+
+
+def _jpeg_params(quality):
+    return [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+
+
+def _render_file(image_path, arrays, names, save_path, max_size, jpeg_quality):
+    image = render_prediction(image_path, arrays, names, max_size)
+    params = _jpeg_params(jpeg_quality) if save_path.lower().endswith('.jpg') else []
+    # cv2.imwrite는 한글 경로를 지원하지 않으므로 인코딩 후 직접 씁니다.
+    ok, encoded = cv2.imencode(os.path.splitext(save_path)[1], image, params)
+    if not ok:
+        raise RuntimeError(f"이미지 인코딩 실패: {save_path}")
+    encoded.tofile(save_path)
+    return save_path
+
+
+def _render_tile(image_path, arrays, names, tile_size):
+    """contact sheet용 타일: tile_size x tile_size 안에 비율을 유지해 배치하고 파일명을 적습니다."""
+    image = render_prediction(image_path, arrays, names, max_size=tile_size)
+    tile = np.full((tile_size, tile_size, 3), 255, dtype=np.uint8)
+    h, w = image.shape[:2]
+    top, left = (tile_size - h) // 2, (tile_size - w) // 2
+    tile[top:top + h, left:left + w] = image
+    cv2.putText(tile, Path(image_path).name, (4, tile_size - 6), cv2.FONT_HERSHEY_SIMPLEX,
+                0.4, (0, 0, 0), 1, cv2.LINE_AA)
+    return tile
+
+
+def _make_executor(workers, use_processes):
+    if use_processes:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'))
+    # 디코딩/리사이즈/인코딩은 OpenCV에서 GIL을 풀기 때문에 스레드로도 병렬 효과가 있습니다.
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def render_predictions(predictions, names, save_dir, mode='full', max_size=640, jpeg_quality=85,
+                       sheet_cols=6, sheet_rows=4, workers=4, use_processes=False):
+    """
+    predictions의 (image_path, (xyxy, score, class))를 mode에 맞게 렌더링해 save_dir에 저장합니다.
+    max_size는 'preview'의 긴 변 길이이자 'contact_sheet'의 타일 크기입니다.
+    저장한 파일 경로 목록을 반환합니다.
+    """
+    if mode not in RENDER_MODES:
+        raise ValueError(f"지원하지 않는 시각화 모드: {mode} (지원: {RENDER_MODES})")
+    save_dir = Path(save_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+    predictions = list(predictions)
+    names = dict(names)
+
+    with _make_executor(max(1, workers), use_processes) as executor:
+        if mode != 'contact_sheet':
+            futures = []
+            for image_path, arrays in predictions:
+                if mode == 'full':
+                    save_path, size = save_dir / Path(image_path).name, None
+                else:
+                    save_path, size = save_dir / f"{Path(image_path).stem}.jpg", max_size
+                futures.append(executor.submit(
+                    _render_file, image_path, arrays, names, str(save_path), size, jpeg_quality
+                ))
+            return [f.result() for f in tqdm(futures, desc="시각화 저장 중")]
+
+        # contact sheet: 타일은 병렬로 만들고, 시트 조립/저장은 순서대로 수행합니다.
+        tiles = iter(executor.map(
+            _render_tile, [p for p, _ in predictions], [a for _, a in predictions],
+            repeat(names), repeat(max_size),
+        ))
+        per_sheet = sheet_cols * sheet_rows
+        num_sheets = math.ceil(len(predictions) / per_sheet)
+        saved = []
+        for sheet_index in tqdm(range(num_sheets), desc="contact sheet 저장 중"):
+            count = min(per_sheet, len(predictions) - sheet_index * per_sheet)
+            rows = math.ceil(count / sheet_cols)
+            sheet = np.full((rows * max_size, sheet_cols * max_size, 3), 255, dtype=np.uint8)
+            for i in range(count):
+                r, c = divmod(i, sheet_cols)
+                sheet[r * max_size:(r + 1) * max_size, c * max_size:(c + 1) * max_size] = next(tiles)
+            save_path = save_dir / f"contact_sheet_{sheet_index:03d}.jpg"
+            ok, encoded = cv2.imencode('.jpg', sheet, _jpeg_params(jpeg_quality))
+            if not ok:
+                raise RuntimeError(f"이미지 인코딩 실패: {save_path}")
+            encoded.tofile(str(save_path))
+            saved.append(str(save_path))
+        return saved
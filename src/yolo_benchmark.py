@@ -0,0 +1,202 @@
+# src/yolo_benchmark.py
+
+import csv
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from inference_backend import file_sha256, read_image_list, resolve_model_path
+from inference_profiler import peak_rss_mb
+
+# =================================================================
+# 1. 설정 변수
+# =================================================================
+
+RUN_DIR = 'runs/yolo11n_exp_251027_1014'
+
+# 학습된 YOLO 모델 가중치 파일 경로
+MODEL_WEIGHTS_PATH = os.path.join(RUN_DIR, 'weights/best.pt')
+
+# 추론 백엔드: 'torch', 'onnx', 'openvino' (src/inference_backend.py 참고)
+BACKEND = 'torch'
+
+# 벤치마크에 사용할 고정 이미지 목록 (앞에서부터 NUM_IMAGES장)
+VAL_LIST_PATH = 'data/yolo/val.txt'
+NUM_IMAGES = 50
+
+# 측정 전 워밍업 배치 수 (첫 호출의 초기화 시간 제외)
+WARMUP_BATCHES = 2
+
+# 제출 파일과 같은 추론 임계값
+CONF_THRESHOLD = 0.001
+
+# =================================================================
+# 2. 스윕 설정
+#  : 아래 값들의 모든 조합을 각각 별도의 프로세스에서 CPU로 측정합니다.
+#    (프로세스를 분리해야 조합별 최대 메모리(peak RSS)가 서로 섞이지 않습니다.)
+# =================================================================
+
+IMG_SIZES = [640, 960, 1280]
+BATCH_SIZES = [1, 4, 8]
+THREAD_COUNTS = sorted({1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1})
+AUGMENT_OPTIONS = [False, True]
+
+# 결과 저장 폴더: 실행마다 benchmark_<시각>.json을 만들고 history.csv에 한 줄씩 누적합니다.
+OUTPUT_DIR = 'runs/benchmarks'
+
+RESULT_FIELDS = [
+    'timestamp', 'backend', 'weights_sha256_16', 'imgsz', 'batch', 'threads', 'augment', 'images',
+    'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'images_per_sec',
+    'preprocess_ms', 'inference_ms', 'postprocess_ms', 'peak_rss_mb',
+]
+
+# =================================================================
+# 3. 측정 함수
+# =================================================================
+
+def _benchmark_config(model_path, image_paths, imgsz, batch, threads, augment):
+    """
+    한 조합을 측정합니다. (스윕마다 새 프로세스에서 실행)
+    배치 추론 시간은 배치 내 이미지 수로 나누어 이미지당 지연 시간으로 기록합니다.
+    이미지는 미리 디코딩해 두므로 측정값에는 전처리(letterbox)/추론/NMS만 포함됩니다.
+    """
+    import torch
+    from ultralytics import YOLO
+    from image_loader import load_image
+
+    torch.set_num_threads(threads)
+    model = YOLO(model_path)
+    images = [load_image(p) for p in image_paths]
+    batches = [images[i:i + batch] for i in range(0, len(images), batch)]
+    predict_kwargs = dict(imgsz=imgsz, conf=CONF_THRESHOLD, augment=augment, device='cpu', verbose=False)
+
+    for warmup_batch in (batches * WARMUP_BATCHES)[:WARMUP_BATCHES]:
+        model(warmup_batch, **predict_kwargs)
+
+    latencies, speeds = [], []
+    start = time.perf_counter()
+    for images_in_batch in batches:
+        t0 = time.perf_counter()
+        results = model(images_in_batch, **predict_kwargs)
+        elapsed = time.perf_counter() - t0
+        latencies.extend([1000 * elapsed / len(images_in_batch)] * len(images_in_batch))
+        speeds.extend(result.speed for result in results)
+    total = time.perf_counter() - start
+
+    latencies = np.asarray(latencies)
+    return {
+        'imgsz': imgsz,
+        'batch': batch,
+        'threads': threads,
+        'augment': augment,
+        'images': len(images),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'images_per_sec': round(len(images) / total, 3),
+        'preprocess_ms': round(float(np.mean([s['preprocess'] for s in speeds])), 2),
+        'inference_ms': round(float(np.mean([s['inference'] for s in speeds])), 2),
+        'postprocess_ms': round(float(np.mean([s['postprocess'] for s in speeds])), 2),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_benchmark(model_path, image_paths, sweep):
+    """sweep의 (imgsz, batch, threads, augment) 조합마다 새 프로세스에서 측정한 결과 목록을 반환합니다."""
+    context = mp.get_context('spawn')
+    rows = []
+    for imgsz, batch, threads, augment in sweep:
+        print(f"측정 중: imgsz={imgsz}, batch={batch}, threads={threads}, augment={augment}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                row = executor.submit(
+                    _benchmark_config, model_path, image_paths, imgsz, batch, threads, augment
+                ).result()
+            except Exception as e:
+                # 일부 백엔드는 TTA(augment)를 지원하지 않으므로 실패한 조합은 건너뜁니다.
+                print(f"  ⚠️ 측정 실패: {e}")
+                continue
+        rows.append(row)
+    return rows
+
+
+def print_results(rows):
+    print("\n--- 추론 벤치마크 (CPU, 이미지당 지연 시간) ---")
+    print(f"{'imgsz':>6} {'batch':>5} {'thr':>4} {'aug':>5} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'img/s':>7} {'RSS(MB)':>8}")
+    for row in rows:
+        print(f"{row['imgsz']:>6} {row['batch']:>5} {row['threads']:>4} {str(row['augment']):>5} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+              f"{row['images_per_sec']:>7.2f} {row['peak_rss_mb'] or 0:>8.1f}")
+
+
+def save_results(rows, metadata, output_dir):
+    """실행별 JSON을 저장하고, 실행 간 비교를 위해 history.csv에 결과 행을 추가합니다."""
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, f"benchmark_{metadata['timestamp']}.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': metadata, 'results': rows}, f, indent=2)
+
+    history_path = os.path.join(output_dir, 'history.csv')
+    write_header = not os.path.exists(history_path)
+    with open(history_path, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, timestamp=metadata['timestamp'], backend=metadata['backend'],
+                                 weights_sha256_16=metadata['weights_sha256_16']))
+    return json_path, history_path
+
+
+def main():
+    if not os.path.exists(MODEL_WEIGHTS_PATH):
+        print(f"🚨 모델 가중치를 찾을 수 없습니다: {MODEL_WEIGHTS_PATH}")
+        return
+    image_paths = read_image_list(VAL_LIST_PATH, limit=NUM_IMAGES)
+    if not image_paths:
+        print(f"🚨 오류: 이미지 목록({VAL_LIST_PATH})이 비어 있습니다.")
+        return
+
+    import torch
+    import ultralytics
+
+    # onnx/openvino 모델은 워커에서 내보내지 않도록 메인 프로세스에서 먼저 준비합니다.
+    model_paths = {imgsz: resolve_model_path(MODEL_WEIGHTS_PATH, BACKEND, imgsz) for imgsz in IMG_SIZES}
+    metadata = {
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'backend': BACKEND,
+        'weights': os.path.abspath(MODEL_WEIGHTS_PATH),
+        'weights_sha256_16': file_sha256(MODEL_WEIGHTS_PATH)[:16],
+        'image_list': os.path.abspath(VAL_LIST_PATH),
+        'images': len(image_paths),
+        'warmup_batches': WARMUP_BATCHES,
+        'conf': CONF_THRESHOLD,
+        'cpu_count': os.cpu_count(),
+        'processor': platform.processor() or platform.machine(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'ultralytics': ultralytics.__version__,
+    }
+
+    rows = []
+    for imgsz in IMG_SIZES:
+        sweep = itertools.product([imgsz], BATCH_SIZES, THREAD_COUNTS, AUGMENT_OPTIONS)
+        rows.extend(run_benchmark(model_paths[imgsz], image_paths, sweep))
+
+    print_results(rows)
+    json_path, history_path = save_results(rows, metadata, OUTPUT_DIR)
+    print(f"\n📊 결과 저장: {json_path} (누적: {history_path})")
+
+
+if __name__ == '__main__':
+    main()
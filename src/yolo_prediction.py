@@ -4,6 +4,13 @@ import glob
 from tqdm import tqdm
 import shutil
 import os.path
+from pathlib import Path
+from ultralytics.utils.files import increment_path
+from inference_backend import load_model, resolve_model_path
+from sharded_inference import split_into_shards, run_sharded
+from prediction_cache import PredictionCache, empty_predictions
+from submission_postprocess import result_to_arrays
+from visualization import render_predictions
 
 # =================================================================
 # 1. 설정 변수
@@ -34,31 +41,137 @@ CONF_THRESHOLD = 0.25
 # NMS IoU 임계값
 IOU_THRESHOLD = 0.7 
 
+# 이미지당 최대 박스 수 (ultralytics 기본값과 같은 300, 캐시 사용 여부와 관계없이 동일하게 적용)
+MAX_DET = 300
+
 # TTA 적용 여부: 시각화의 명확성을 위해 TTA는 끄는 것이 좋습니다.
 AUGMENT = False
 
+# 추론 백엔드: 'torch'(.pt 그대로), 'onnx', 'openvino' (onnx/openvino는 TTA 미지원)
+BACKEND = 'torch'
+
+# 추론 결과 캐시: yolo_submission.py와 같은 가중치/imgsz/iou로 이미 추론한 이미지는
+# 재추론 없이 캐시된 박스에 CONF_THRESHOLD/MAX_DET만 다시 적용해 그립니다.
+# (모든 이미지가 캐시에 있으면 모델도 로드하지 않으므로 conf를 바꿔 다시 그리는 데 몇 초면 됩니다.)
+USE_PREDICTION_CACHE = True
+PREDICTION_CACHE_DIR = os.path.join(RUN_DIR, 'prediction_cache')
+
+# 추론 워커 프로세스 수 (1이면 단일 프로세스) 및 워커당 intra-op 스레드 수 (None이면 자동)
+NUM_WORKERS = 1
+THREADS_PER_WORKER = None
+
 # =================================================================
-# 3. 시각화 실행 함수
+# 3. 렌더링 설정 (추론이 끝난 뒤 별도 단계로 병렬 저장)
 # =================================================================
 
-def visualize_predictions():
+# 'full': 원본 크기 PNG, 'preview': 긴 변 PREVIEW_MAX_SIZE의 JPEG,
+# 'contact_sheet': 미리보기를 CONTACT_SHEET_COLS x CONTACT_SHEET_ROWS 격자로 모은 JPEG
+RENDER_MODE = 'full'
+PREVIEW_MAX_SIZE = 640
+JPEG_QUALITY = 85
+CONTACT_SHEET_COLS = 6
+CONTACT_SHEET_ROWS = 4
+
+# 렌더링 워커 수와 방식 (False: 스레드 풀, True: 프로세스 풀)
+RENDER_WORKERS = 4
+RENDER_WITH_PROCESSES = False
+
+
+# =================================================================
+# 4. 시각화 실행 함수
+# =================================================================
+
+# -----------------------------
+# 추론 (단일 프로세스 / 샤딩 워커)
+# -----------------------------
+_WORKER_MODEL = None
+
+def _load_worker_model(model_path):
+    global _WORKER_MODEL
+    _WORKER_MODEL = YOLO(model_path)
+
+def _iter_model_predictions(model, image_paths, predict_kwargs):
+    for image_path in image_paths:
+        for result in model(image_path, verbose=False, **predict_kwargs):
+            yield image_path, result_to_arrays(result) or empty_predictions()
+
+def _predict_shard_task(image_paths, predict_kwargs):
+    return list(_iter_model_predictions(_WORKER_MODEL, image_paths, predict_kwargs))
+
+def predict_arrays(image_paths, predict_kwargs):
     """
-    학습된 YOLO 모델을 사용하여 테스트 이미지 디렉토리에 추론을 수행하고
-    결과 이미지를 하나의 폴더에 저장합니다.
+    image_paths를 추론해 ({image_path: (xyxy, score, class)}, names)를 반환합니다.
+    NUM_WORKERS > 1이면 정렬된 목록을 shard로 나누어 워커 프로세스에서 추론합니다.
     """
-    
-    # 1. 모델 로드
-    try:
-        model = YOLO(MODEL_WEIGHTS_PATH)
+    if not image_paths:
+        # 추론할 이미지가 없으면(모두 캐시됨 등) 클래스 이름만 읽습니다.
+        return {}, YOLO(resolve_model_path(MODEL_WEIGHTS_PATH, BACKEND, IMG_SIZE)).names
+
+    if NUM_WORKERS <= 1:
+        model = load_model(MODEL_WEIGHTS_PATH, BACKEND, IMG_SIZE)
         print(f"✅ 모델 로드 성공: {MODEL_WEIGHTS_PATH}")
-    except Exception as e:
+        predictions = dict(tqdm(
+            _iter_model_predictions(model, image_paths, predict_kwargs), total=len(image_paths), desc="추론 중"
+        ))
+        return predictions, model.names
+
+    print(f"{NUM_WORKERS}개 워커 프로세스로 샤딩 추론을 수행합니다.")
+    model_path = resolve_model_path(MODEL_WEIGHTS_PATH, BACKEND, IMG_SIZE)
+    shards = split_into_shards(sorted(image_paths), NUM_WORKERS)
+    outputs = run_sharded(
+        _predict_shard_task, [(shard, predict_kwargs) for shard in shards],
+        num_workers=len(shards), threads_per_worker=THREADS_PER_WORKER,
+        initializer=_load_worker_model, initargs=(model_path,),
+    )
+    predictions = {path: arrays for output in outputs for path, arrays in output}
+    return predictions, YOLO(model_path).names
+
+def collect_predictions(image_paths):
+    """
+    모든 이미지의 (image_path, (xyxy, score, class)) 목록과 클래스 이름을 반환합니다.
+    캐시를 사용하면 캐시에 없는 이미지만 추론해 저장하고, 캐시된 결과에 CONF_THRESHOLD/MAX_DET를 다시 적용합니다.
+    """
+    if not USE_PREDICTION_CACHE:
+        fresh, names = predict_arrays(image_paths, dict(
+            imgsz=IMG_SIZE, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, max_det=MAX_DET, augment=AUGMENT
+        ))
+        return [(p, fresh[p]) for p in image_paths], names
+
+    cache = PredictionCache(
+        PREDICTION_CACHE_DIR, MODEL_WEIGHTS_PATH, IMG_SIZE, augment=AUGMENT, backend=BACKEND, iou=IOU_THRESHOLD,
+    )
+    fresh, names = {}, cache.names
+    miss_paths = [p for p in image_paths if not cache.contains(p)]
+    if miss_paths or names is None:
+        fresh, names = predict_arrays(miss_paths, cache.predict_kwargs())
+        cache.save_names(names)
+
+    stored = {p: cache.get(p) for p in image_paths if p not in fresh}
+    corrupted = [p for p, arrays in stored.items() if arrays is None]
+    if corrupted:
+        # 조회 도중 손상된 캐시 항목은 다시 추론합니다.
+        recomputed, names = predict_arrays(corrupted, cache.predict_kwargs())
+        fresh.update(recomputed)
+    for image_path, arrays in fresh.items():
+        cache.put(image_path, arrays)
+    stored.update(fresh)
+
+    print(f"캐시 사용: {len(image_paths) - len(fresh)}개 재사용, {len(fresh)}개 새로 추론 ({cache.cache_dir})")
+    predictions = [(p, cache.apply_thresholds(stored[p], conf=CONF_THRESHOLD, max_det=MAX_DET)) for p in image_paths]
+    return predictions, names
+
+def visualize_predictions():
+    """
+    테스트 이미지의 예측 결과(새로 추론하거나 캐시된 결과)를 모은 뒤,
+    별도의 렌더링 단계에서 병렬로 그려 하나의 폴더에 저장합니다.
+    """
+    if not os.path.exists(MODEL_WEIGHTS_PATH):
         print(f"🚨 모델 로드 실패. 경로를 확인하십시오: {MODEL_WEIGHTS_PATH}")
-        print(f"오류 내용: {e}")
         return
-    
-    # 3. 테스트 이미지 목록 확인
-    image_paths = glob.glob(os.path.join(TEST_IMAGES_DIR, '*.png'))
-    
+
+    # 1. 테스트 이미지 목록 확인
+    image_paths = sorted(glob.glob(os.path.join(TEST_IMAGES_DIR, '*.png')))
+
     if not image_paths:
         print(f"🚨 오류: 테스트 이미지 폴더({TEST_IMAGES_DIR})에서 이미지를 찾을 수 없습니다.")
         return
@@ -66,20 +179,23 @@ def visualize_predictions():
     print(f"총 {len(image_paths)}개의 테스트 이미지에 대해 시각화를 시작합니다.")
     print(f"시각화 설정: imgsz={IMG_SIZE}, conf={CONF_THRESHOLD}, iou={IOU_THRESHOLD}, augment={AUGMENT}")
 
-    # 4. 추론 및 시각화 저장 (디렉토리 전체를 source로 전달)
-    # project와 name 설정을 사용하여 최종 저장 경로를 runs/yolov8_exp_251023_0925/test_visualizations/predict로 고정합니다.
-    model.predict(
-        source=TEST_IMAGES_DIR, # 디렉토리 전체를 소스로 지정
-        imgsz=IMG_SIZE, 
-        conf=CONF_THRESHOLD,      
-        iou=IOU_THRESHOLD,        
-        augment=AUGMENT,  
-        save=True,      # 시각화된 이미지 저장 활성화
-        project=os.path.dirname(OUTPUT_VISUALS_DIR), # 'runs/yolov8_exp_251023_0925'
-        name=os.path.basename(OUTPUT_VISUALS_DIR),   # 'test_visualizations'
-        verbose=True # 추론 진행 상황을 자세히 표시
+    # 2. 예측 결과 수집 (추론 또는 캐시)
+    try:
+        predictions, names = collect_predictions(image_paths)
+    except Exception as e:
+        print(f"🚨 모델 로드 실패. 경로를 확인하십시오: {MODEL_WEIGHTS_PATH}")
+        print(f"오류 내용: {e}")
+        return
+
+    # 3. 렌더링 및 저장 (기존 폴더가 있으면 test_visualizations2, 3 ... 으로 증가)
+    save_dir = increment_path(Path(OUTPUT_VISUALS_DIR))
+    saved = render_predictions(
+        predictions, names, save_dir, mode=RENDER_MODE, max_size=PREVIEW_MAX_SIZE, jpeg_quality=JPEG_QUALITY,
+        sheet_cols=CONTACT_SHEET_COLS, sheet_rows=CONTACT_SHEET_ROWS,
+        workers=RENDER_WORKERS, use_processes=RENDER_WITH_PROCESSES,
     )
 
+    print(f"결과 저장 위치: {save_dir} ({len(saved)}개 파일)")
     print(f"\n시각화 완료")
 
 
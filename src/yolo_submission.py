@@ -1,9 +1,17 @@
 import os
-import pandas as pd
 from ultralytics import YOLO
 import glob
 from tqdm import tqdm
 import re
+from collections import Counter
+from image_loader import iter_image_batches
+from inference_profiler import InferenceProfiler, NULL_PROFILER
+from prediction_cache import PredictionCache, empty_predictions, iter_cached_predictions
+from submission_postprocess import build_category_lookup, postprocess_detections, result_to_arrays, SubmissionBuffer
+from submission_writer import StreamingSubmissionWriter
+from inference_backend import load_model, resolve_model_path
+from sharded_inference import split_into_shards, run_sharded, merge_submission_shards, measure_scaling
+import shutil
 
 # =================================================================
 # 1. 설정 변수
@@ -36,8 +44,75 @@ ORIGINAL_CATEGORY_IDS = [
     32309, 33008, 33207, 33877, 33879, 34596, 35205, 36636, 38161, 41767, 44198
 ]
 
+# YOLO ID -> 원본 Category ID lookup 배열
+CATEGORY_LOOKUP = build_category_lookup(ORIGINAL_CATEGORY_IDS)
+
 IMG_SIZE = 1280
 
+# 추론 백엔드: 'torch'(.pt 그대로), 'onnx', 'openvino'
+# onnx/openvino는 처음 실행 시 가중치 옆에 내보낸 모델을 캐시합니다. (패리티 체크: src/inference_backend.py)
+BACKEND = 'torch'
+
+# 추론 임계값
+# imgsz는 학습 시 사용한 크기와 동일하게 지정하는 것이 좋습니다.
+# iou=0.8 또는 0.9와 같이 높게 설정하여 겹치는 박스를 더 많이 유지하도록 시도 가능
+CONF_THRESHOLD = 0.001
+IOU_THRESHOLD = 0.7
+MAX_DET = 300
+AUGMENT = False # TTA
+
+# 추론 결과 캐시: 가중치/이미지가 같으면 재추론 없이 캐시된 박스에 CONF_THRESHOLD/MAX_DET만 다시 적용합니다.
+# 캐시는 conf=0.001, max_det=1000으로 저장하므로 CONF_THRESHOLD는 0.001 이상, MAX_DET는 1000 이하여야 합니다.
+# IOU_THRESHOLD나 AUGMENT를 바꾸면 별도의 캐시 디렉토리에 새로 추론합니다.
+USE_PREDICTION_CACHE = True
+PREDICTION_CACHE_DIR = os.path.join(RUN_DIR, 'prediction_cache')
+
+# =================================================================
+# 3. 이미지 로더 설정 (디코딩 미리 수행)
+# =================================================================
+
+# 백그라운드 로더가 현재 이미지를 추론하는 동안 다음 이미지들의 PNG 디코딩을 미리 수행합니다.
+# 모델에는 디코딩된 이미지를 항상 1장씩 넘기므로(경로 입력과 같은 imread 사용) 결과 CSV는 기존과 동일합니다.
+#  - LOADER_BATCH_SIZE: 한 번에 병렬로 디코딩할 이미지 수
+#  - PREFETCH_BATCHES : 미리 준비해 둘 묶음 수
+#  - LOADER_WORKERS   : 디코딩 스레드 수
+LOADER_BATCH_SIZE = 4
+PREFETCH_BATCHES = 2
+LOADER_WORKERS = 2
+
+# =================================================================
+# 4. 스트리밍 저장 / 재개 설정
+# =================================================================
+
+# 몇 장의 이미지마다 결과를 partial 파일에 기록하고 체크포인트를 갱신할지
+FLUSH_EVERY = 32
+
+# 중단된 실행의 체크포인트(<OUTPUT_CSV_PATH>.ckpt.json)가 있으면 이어서 진행
+RESUME = True
+
+# =================================================================
+# 5. 멀티 프로세스 샤딩 설정 (CPU 추론 노드용)
+# =================================================================
+
+# 워커 프로세스 수 (1이면 단일 프로세스)
+NUM_WORKERS = 1
+
+# 워커당 intra-op 스레드 수 (None이면 CPU 코어 수 / NUM_WORKERS)
+THREADS_PER_WORKER = None
+
+# 1..N 워커 처리량 측정 (0이면 측정하지 않음). 앞쪽 SCALING_REPORT_IMAGES장만 사용합니다.
+SCALING_REPORT_MAX_WORKERS = 0
+SCALING_REPORT_IMAGES = 64
+
+# =================================================================
+# 6. 단계별 프로파일링 설정
+# =================================================================
+
+# True이면 이미지별 단계 시간(decode, letterbox, forward, nms, postprocess, write 등)과
+# 메모리 최고점을 기록해 PROFILE_DIR에 요약 JSON과 Chrome trace(.trace.json)를 저장합니다.
+PROFILE = False
+PROFILE_DIR = os.path.join(RUN_DIR, 'profile')
+
 def get_image_id(filename):
     """
     이미지 파일 이름에서 숫자 부분(image_id)을 추출합니다.
@@ -60,16 +135,217 @@ def get_image_id(filename):
         else:
             return -1 # 유효하지 않은 ID 반환
 
+def _record_speed(profiler, results):
+    """ultralytics가 측정한 이미지별 전처리(letterbox)/추론(forward)/후처리(NMS) 시간을 기록합니다."""
+    if not profiler.enabled:
+        return
+    for result in results:
+        profiler.add('letterbox', result.speed['preprocess'])
+        profiler.add('forward', result.speed['inference'])
+        profiler.add('nms', result.speed['postprocess'])
+
+def _iter_model_predictions(model, image_paths, predict_kwargs, profiler=NULL_PROFILER):
+    """
+    이미지별 (image_path, (xyxy, score, yolo_id))를 입력 순서대로 반환합니다.
+    백그라운드 로더가 다음 이미지들을 디코딩하는 동안 현재 이미지를 추론합니다.
+    (여러 장을 한 번에 추론하면 score가 미세하게 달라질 수 있어 모델 호출은 1장씩 합니다.)
+    """
+    for batch_paths, batch_images in iter_image_batches(
+        image_paths, LOADER_BATCH_SIZE, prefetch=PREFETCH_BATCHES, num_workers=LOADER_WORKERS, profiler=profiler
+    ):
+        for image_path, image in zip(batch_paths, batch_images):
+            with profiler.stage('predict_call'):
+                results = model(image, **predict_kwargs)
+            _record_speed(profiler, results)
+            for result in results:
+                yield image_path, result_to_arrays(result) or empty_predictions()
+
+def iter_predictions(model, image_paths, cache=None, profiler=NULL_PROFILER):
+    """
+    이미지별 (image_path, (xyxy, score, yolo_id))를 입력 순서대로 반환합니다.
+    cache가 있으면 캐시에 없는 이미지만 추론해 저장하고, 모든 결과에 현재 임계값을 적용합니다.
+    """
+    if cache is None:
+        yield from _iter_model_predictions(model, image_paths, dict(
+            imgsz=IMG_SIZE, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, max_det=MAX_DET, augment=AUGMENT
+        ), profiler)
+        return
+
+    yield from iter_cached_predictions(
+        cache, image_paths, lambda paths, kwargs: _iter_model_predictions(model, paths, kwargs, profiler),
+        conf=CONF_THRESHOLD, max_det=MAX_DET,
+    )
+
+def open_prediction_cache(model, use_cache=True):
+    """USE_PREDICTION_CACHE가 켜져 있으면 현재 가중치/설정에 해당하는 캐시를 엽니다."""
+    if not (USE_PREDICTION_CACHE and use_cache):
+        return None
+    return PredictionCache(
+        PREDICTION_CACHE_DIR, MODEL_WEIGHTS_PATH, IMG_SIZE, augment=AUGMENT, backend=BACKEND,
+        iou=IOU_THRESHOLD, names=model.names,
+    )
+
+def get_run_signature():
+    """추론 결과에 영향을 주는 설정 값. 체크포인트 재개 가능 여부 판단에 사용합니다."""
+    weights_stat = os.stat(MODEL_WEIGHTS_PATH)
+    return {
+        'weights': os.path.abspath(MODEL_WEIGHTS_PATH),
+        'weights_size': weights_stat.st_size,
+        'weights_mtime': weights_stat.st_mtime,
+        'test_images_dir': os.path.abspath(TEST_IMAGES_DIR),
+        'imgsz': IMG_SIZE,
+        'conf': CONF_THRESHOLD,
+        'iou': IOU_THRESHOLD,
+        'max_det': MAX_DET,
+        'augment': AUGMENT,
+        'backend': BACKEND,
+    }
+
+def write_submission(model, cache, image_paths, image_ids, output_path, signature, desc="추론 및 CSV 변환 중",
+                     profiler=NULL_PROFILER):
+    """
+    image_paths를 추론하여 output_path에 제출 파일을 스트리밍 저장합니다.
+    annotation_id는 1부터 시작합니다.
+
+    Returns:
+        (rows_written, unknown_id_counts)
+    """
+    # 결과는 FLUSH_EVERY장마다 partial 파일에 이어 쓰고 체크포인트를 남깁니다.
+    writer = StreamingSubmissionWriter(output_path, signature=signature)
+    resumed = writer.open(resume=RESUME)
+    annotation_id_counter = writer.annotation_id_counter # 제출 파일의 고유한 annotation_id
+    # 검출 결과는 컬럼별로 미리 할당된 버퍼에 모읍니다. (이미지당 최대 300개 검출 기준)
+    submission_data = SubmissionBuffer(capacity=FLUSH_EVERY * 300)
+    pending_image_ids = []
+    unknown_id_counts = Counter()
+
+    # 체크포인트에 완료로 기록된 이미지는 건너뜁니다.
+    pending_paths = [p for p in image_paths if not writer.is_completed(image_ids[p])]
+    if resumed:
+        print(f"체크포인트에서 재개합니다: {len(image_paths) - len(pending_paths)}개 이미지 완료, "
+              f"annotation_id {annotation_id_counter}부터 이어서 진행")
+
+    predictions = iter_predictions(model, pending_paths, cache, profiler)
+    for image_path, arrays in tqdm(predictions, total=len(pending_paths), desc=desc):
+        image_id = image_ids[image_path]
+
+        # 결과를 submission_data에 추가 (이미지 단위 배열 연산)
+        with profiler.stage('postprocess'):
+            columns, unknown_ids = postprocess_detections(
+                *arrays, image_id, CATEGORY_LOOKUP, annotation_id_counter
+            )
+            unknown_id_counts.update(unknown_ids.tolist())
+            submission_data.append(columns)
+        annotation_id_counter += len(columns['score'])
+
+        pending_image_ids.append(image_id)
+        if len(pending_image_ids) >= FLUSH_EVERY:
+            with profiler.stage('write'):
+                writer.write(submission_data, pending_image_ids, annotation_id_counter)
+            profiler.sample_memory()
+            submission_data.clear()
+            pending_image_ids = []
+
+    with profiler.stage('write'):
+        writer.write(submission_data, pending_image_ids, annotation_id_counter)
+
+    # CSV 파일 마무리 (image_id 오름차순, 이미지 내 score 내림차순)
+    rows_written = writer.rows_written
+    with profiler.stage('finalize'):
+        finalized = writer.finalize()
+    profiler.sample_memory()
+    if not finalized:
+        rows_written = 0
+    return rows_written, unknown_id_counts
+
+# -----------------------------
+# 샤딩 워커 (워커 프로세스마다 모델 1회 로드)
+# -----------------------------
+_WORKER_MODEL = None
+_WORKER_CACHE = None
+
+def _load_worker_model(model_path, use_cache):
+    global _WORKER_MODEL, _WORKER_CACHE
+    _WORKER_MODEL = YOLO(model_path)
+    _WORKER_CACHE = open_prediction_cache(_WORKER_MODEL, use_cache)
+
+def _submission_shard_task(shard_index, num_shards, image_paths, image_ids, shard_path, signature, profile):
+    signature = dict(signature, shard=[shard_index, num_shards], first_image=image_paths[0])
+    profiler = InferenceProfiler(enabled=profile)
+    rows_written, unknown_id_counts = write_submission(
+        _WORKER_MODEL, _WORKER_CACHE, image_paths, image_ids, shard_path, signature,
+        desc=f"shard {shard_index + 1}/{num_shards}", profiler=profiler,
+    )
+    return rows_written, unknown_id_counts, profiler.export()
+
+def write_submission_sharded(image_paths, image_ids, output_path, signature, num_workers, use_cache=True,
+                             profiler=NULL_PROFILER):
+    """
+    정렬된 이미지 목록을 num_workers개의 연속 shard로 나누어 병렬 추론한 뒤 하나의 제출 파일로 병합합니다.
+    shard는 정렬 순서를 유지하므로 annotation_id는 워커 수와 관계없이 단일 프로세스 실행과 같습니다.
+    """
+    shard_dir = f"{output_path}.shards"
+    os.makedirs(shard_dir, exist_ok=True)
+    shards = split_into_shards(image_paths, num_workers)
+    shard_paths = [os.path.join(shard_dir, f"shard_{i:03d}.csv") for i in range(len(shards))]
+    shard_args = [
+        (i, len(shards), shard, {p: image_ids[p] for p in shard}, shard_paths[i], signature, profiler.enabled)
+        for i, shard in enumerate(shards)
+    ]
+
+    model_path = resolve_model_path(MODEL_WEIGHTS_PATH, BACKEND, IMG_SIZE)
+    if USE_PREDICTION_CACHE and use_cache:
+        # 워커들이 같은 캐시 폴더를 동시에 초기화하지 않도록 부모 프로세스에서 먼저 열어 meta.json을 만듭니다.
+        open_prediction_cache(YOLO(model_path), use_cache)
+
+    outputs = run_sharded(
+        _submission_shard_task, shard_args, num_workers=len(shards),
+        threads_per_worker=THREADS_PER_WORKER,
+        initializer=_load_worker_model,
+        initargs=(model_path, use_cache),
+    )
+    unknown_id_counts = Counter()
+    for _, shard_unknown, (records, memory_samples) in outputs:
+        unknown_id_counts.update(shard_unknown)
+        profiler.merge(records, memory_samples)
+
+    with profiler.stage('merge'):
+        rows_written = merge_submission_shards(shard_paths, output_path)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    return rows_written, unknown_id_counts
+
+def run_scaling_report(image_paths, image_ids):
+    """앞쪽 SCALING_REPORT_IMAGES장으로 워커 1..N개의 처리량을 측정해 RUN_DIR에 저장합니다."""
+    sample_paths = image_paths[:SCALING_REPORT_IMAGES]
+    scratch_dir = os.path.join(RUN_DIR, 'scaling_report_tmp')
+    os.makedirs(scratch_dir, exist_ok=True)
+
+    def run(num_workers):
+        output_path = os.path.join(scratch_dir, f"submission_w{num_workers}.csv")
+        signature = dict(get_run_signature(), scaling_workers=num_workers)
+        # 캐시를 사용하면 두 번째 측정부터 추론이 생략되므로 측정 중에는 끕니다.
+        write_submission_sharded(sample_paths, image_ids, output_path, signature, num_workers, use_cache=False)
+
+    try:
+        measure_scaling(run, len(sample_paths), SCALING_REPORT_MAX_WORKERS,
+                        report_path=os.path.join(RUN_DIR, 'scaling_report.json'))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
 def generate_submission_csv():
     """학습된 YOLO 모델을 사용하여 테스트 이미지에 추론을 수행하고 제출 파일을 생성합니다."""
     
-    # 1. 모델 로드
-    try:
-        model = YOLO(MODEL_WEIGHTS_PATH)
-        print(f"모델 로드 성공: {MODEL_WEIGHTS_PATH}")
-    except Exception as e:
+    # 1. 모델 로드 (샤딩 모드에서는 워커 프로세스가 각자 로드)
+    if NUM_WORKERS <= 1:
+        try:
+            model = load_model(MODEL_WEIGHTS_PATH, BACKEND, IMG_SIZE)
+            print(f"모델 로드 성공: {MODEL_WEIGHTS_PATH}")
+        except Exception as e:
+            print(f"모델 로드 실패. 경로를 확인하십시오: {MODEL_WEIGHTS_PATH}")
+            print(f"오류 내용: {e}")
+            return
+    elif not os.path.exists(MODEL_WEIGHTS_PATH):
         print(f"모델 로드 실패. 경로를 확인하십시오: {MODEL_WEIGHTS_PATH}")
-        print(f"오류 내용: {e}")
         return
 
     # 2. 테스트 이미지 목록 가져오기
@@ -85,87 +361,50 @@ def generate_submission_csv():
 
     print(f"총 {len(image_paths)}개의 테스트 이미지에 대해 추론을 시작합니다.")
 
-    submission_data = []
-    annotation_id_counter = 1 # 제출 파일의 고유한 annotation_id
-
     # 3. 추론 및 결과 변환
-    for image_path in tqdm(image_paths, desc="추론 및 CSV 변환 중"):
+    # image_id를 추출할 수 없는 이미지는 추론 전에 제외합니다.
+    image_ids = {}
+    for image_path in image_paths:
         file_name = os.path.basename(image_path)
-        
+
         # Image ID 추출 (파일명의 숫자를 그대로 사용)
         image_id = get_image_id(file_name)
-        
+
         if image_id == -1:
              print(f"파일 '{file_name}'의 image_id를 추출할 수 없어 건너뜁니다.")
              continue
-        
-        # YOLO 추론 실행
-        # imgsz는 학습 시 사용한 크기(예: 640)와 동일하게 지정하는 것이 좋습니다.
-        # conf(confidence threshold)는 필요에 따라 조정 가능합니다.
-        # iou=0.8 또는 0.9와 같이 높게 설정하여 겹치는 박스를 더 많이 유지하도록 시도 가능
-
-        results = model(image_path, imgsz=IMG_SIZE, conf=0.001)
-        #results = model(image_path, imgsz=IMG_SIZE, conf=0.001, augment=True, iou=0.8)
-        #results = model(image_path, imgsz=IMG_SIZE, conf=0.001, augment=True)
-        
-        
-        
-        # 결과를 순회하며 submission_data에 추가
-        for result in results:
-            if result.boxes is None:
-                continue
-
-            # YOLOv8의 boxes 객체에서 바운딩 박스, 신뢰도, 클래스 ID 추출
-            # xyxy: [x_min, y_min, x_max, y_max] (픽셀 좌표)
-            boxes = result.boxes.xyxy.cpu().numpy() 
-            scores = result.boxes.conf.cpu().numpy()
-            yolo_ids = result.boxes.cls.cpu().numpy().astype(int)
-            
-            for box, score, yolo_id in zip(boxes, scores, yolo_ids):
-                # YOLO ID (0~72)를 원본 Category ID로 변환
-                if yolo_id >= len(ORIGINAL_CATEGORY_IDS):
-                    print(f"경고: 알 수 없는 YOLO ID {yolo_id}가 감지되었습니다. 건너뜁니다.")
-                    continue
-                
-                original_cat_id = ORIGINAL_CATEGORY_IDS[yolo_id]
-                
-                # BBox 좌표 변환 (xyxy -> COCO [x, y, w, h])
-                x_min, y_min, x_max, y_max = box
-                
-                # 대회 요구 포맷: bbox_x, bbox_y, bbox_w, bbox_h (픽셀)
-                bbox_x = round(x_min)
-                bbox_y = round(y_min)
-                bbox_w = round(x_max - x_min)
-                bbox_h = round(y_max - y_min)
-                
-                # 스코어는 소수점 4자리까지 표시
-                score_formatted = f"{score:.4f}"
-                
-                submission_data.append([
-                    annotation_id_counter,
-                    image_id,
-                    original_cat_id,
-                    bbox_x,
-                    bbox_y,
-                    bbox_w,
-                    bbox_h,
-                    score_formatted
-                ])
-                
-                annotation_id_counter += 1
-
-    # 4. CSV 파일로 저장
-    if submission_data:
-        df = pd.DataFrame(submission_data, columns=[
-            'annotation_id', 'image_id', 'category_id', 
-            'bbox_x', 'bbox_y', 'bbox_w', 'bbox_h', 'score'
-        ])
-        
-        # image_id 기준으로 정렬 (제출 편의를 위해)
-        df = df.sort_values(by=['image_id', 'score'], ascending=[True, False])
-
-        df.to_csv(OUTPUT_CSV_PATH, index=False)
-        print(f"\n제출 파일 생성 완료: {OUTPUT_CSV_PATH}에 총 {len(submission_data)}개의 객체 저장.")
+        image_ids[image_path] = image_id
+    valid_paths = list(image_ids)
+
+    if SCALING_REPORT_MAX_WORKERS > 0:
+        run_scaling_report(valid_paths, image_ids)
+
+    profiler = InferenceProfiler(enabled=PROFILE)
+    if NUM_WORKERS <= 1:
+        cache = open_prediction_cache(model)
+        rows_written, unknown_id_counts = write_submission(
+            model, cache, valid_paths, image_ids, OUTPUT_CSV_PATH, get_run_signature(), profiler=profiler
+        )
+        if cache is not None:
+            print(f"추론 캐시: {cache.hits}개 재사용, {cache.misses}개 새로 추론 ({cache.cache_dir})")
+    else:
+        print(f"{NUM_WORKERS}개 워커 프로세스로 샤딩 추론을 수행합니다.")
+        rows_written, unknown_id_counts = write_submission_sharded(
+            valid_paths, image_ids, OUTPUT_CSV_PATH, get_run_signature(), NUM_WORKERS, profiler=profiler
+        )
+
+    if unknown_id_counts:
+        summary = ', '.join(f"{yolo_id}({count}개)" for yolo_id, count in sorted(unknown_id_counts.items()))
+        print(f"경고: 알 수 없는 YOLO ID가 감지되어 건너뛰었습니다: {summary}")
+
+    profiler.save(PROFILE_DIR, prefix='submission', metadata=dict(
+        get_run_signature(), images=len(valid_paths), loader_batch_size=LOADER_BATCH_SIZE, num_workers=NUM_WORKERS,
+        use_prediction_cache=USE_PREDICTION_CACHE,
+    ))
+
+    # 4. 결과 출력
+    if rows_written:
+        print(f"\n제출 파일 생성 완료: {OUTPUT_CSV_PATH}에 총 {rows_written}개의 객체 저장.")
     else:
         print("\n경고: 감지된 객체가 없어 제출 파일이 생성되지 않았습니다.")
 
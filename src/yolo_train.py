@@ -3,6 +3,9 @@
 from ultralytics import YOLO
 from datetime import datetime
 
+from trainers import CachedDetectionTrainer
+from train_tuner import load_overlay
+
 MODEL_NAME = 'yolo11n'
 
 
@@ -12,8 +15,17 @@ def train_model():
     timestamp = datetime.now().strftime("%y%m%d_%H%M")
     experiment_name = f"{MODEL_NAME}_exp_{timestamp}"
 
+    # train_tuner.py가 만든 yolo_train_config.tuned.yaml(batch/workers/cache/imgsz)이 있으면 덮어씁니다.
+    overlay = load_overlay('yolo_train_config.yaml')
+    if overlay:
+        print(f"✅ 튜닝 오버레이 적용: {overlay}")
+
+    # 설정(또는 오버레이)의 cache가 memmap이면 리사이즈된 이미지를 캐시(data/cache/images)에서 읽어
+    # 매 epoch PNG 디코딩을 생략합니다. (기본값은 캐시 없음)
     results = model.train(cfg = 'yolo_train_config.yaml',
-        name= experiment_name
+        name= experiment_name,
+        trainer=CachedDetectionTrainer,
+        **overlay
     )
     
     print("Training finished. Results saved.")
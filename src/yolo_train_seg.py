@@ -1,11 +1,14 @@
 # src/yolo_train.py
 
+import csv
 import torch
 from ultralytics import YOLO
 import yaml
 import os
 from datetime import datetime
-from cbam import CBAM
+from cbam_surgery import request_cbam
+from trainers import CachedSegmentationTrainer
+from train_tuner import load_overlay
 from pathlib import Path
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
@@ -30,6 +33,11 @@ def load_config(config_path='yolo_config.yaml'):
         raise FileNotFoundError(f"config 파일 없음: {config_path}")
     with open(config_path, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
+    # train_tuner.py가 만든 <config>.tuned.yaml(batch_size/workers/cache/input_size)이 있으면 덮어씁니다.
+    overlay = load_overlay(config_path)
+    if overlay:
+        print(f"✅ 튜닝 오버레이 적용: {overlay}")
+        config.update(overlay)
     return config
 
 
@@ -45,18 +53,13 @@ def train_model(config):
     model = YOLO(f'{arch}-seg.pt')
     print(f"✅ 모델 로드 완료: {arch}-seg.pt")
 
-    # 2. CBAM 추가 (YOLOv11n backbone 확인 후 삽입)
-    try:
-        layer_index = config.get('cbam_layer', 6)
-        target_layer = model.model.model[layer_index]
-        if hasattr(target_layer, 'add_module'):
-            cbam_layer = CBAM(planes=128, ratio=16)
-            target_layer.add_module('cbam', cbam_layer)
-            print(f"✅ CBAM 모듈 layer {layer_index}에 추가 완료.")
-        else:
-            print(f"⚠️ layer {layer_index}에 CBAM 추가 불가 (구조 확인 필요).")
-    except Exception as e:
-        print(f"⚠️ CBAM 추가 중 오류: {e}")
+    # 2. CBAM 추가
+    #    model.train()은 model.yaml로 모델을 새로 만든 뒤 가중치만 옮기므로, 여기서 모듈을 직접 붙이면 학습에 반영되지 않습니다.
+    #    삽입할 layer를 model.yaml에 기록하면 Trainer(trainers.py)가 모델을 만들 때 해당 layer 출력에 CBAM을 넣고
+    #    채널 수는 layer 출력에서 자동으로 정하며, 추가 파라미터/GFLOPs/CPU 지연 시간 리포트를 출력합니다.
+    cbam_layers = request_cbam(model, config.get('cbam_layer', 6), ratio=config.get('cbam_ratio', 16))
+    if cbam_layers is not None:
+        print(f"✅ CBAM 삽입 예정: layer {cbam_layers}")
 
     # 3. 실험 이름 및 로그 디렉토리
     exp_name = f"{arch}_{datetime.now().strftime('%Y%m%d_%H%M')}"
@@ -75,30 +78,39 @@ def train_model(config):
         name=exp_name,
         pretrained=True,
         patience=config.get('patience', 50),
+        workers=config.get('workers', 8),
+        cache=config.get('cache', False),  # 'memmap'이면 data/cache/images 이미지 캐시 사용 (src/image_cache.py)
         save_period=10,  # 10 epoch마다 가중치 저장
-        verbose=True
+        verbose=True,
+        trainer=CachedSegmentationTrainer  # detection 학습과 같은 이미지 캐시 공유
     )
 
-    # 5. mAP 플롯 저장
-    if hasattr(results, 'metrics'):
-        metrics = results.metrics
-        if 'mAP50' in metrics and 'mAP50-95' in metrics:
+    # 5. mAP 플롯 저장 (ultralytics가 epoch마다 기록하는 results.csv 사용)
+    save_dir = Path(model.trainer.save_dir)
+    results_csv = save_dir / 'results.csv'
+    if results_csv.exists():
+        with open(results_csv, 'r', encoding='utf-8') as f:
+            rows = [{k.strip(): v for k, v in row.items()} for row in csv.DictReader(f)]
+        suffix = '(M)' if rows and 'metrics/mAP50(M)' in rows[0] else '(B)'  # 마스크 mAP 우선
+        if rows and f'metrics/mAP50{suffix}' in rows[0]:
+            epochs = [int(float(row['epoch'])) for row in rows]
             plt.figure(figsize=(8, 5))
-            plt.plot(metrics['mAP50'], label='mAP@0.5')
-            plt.plot(metrics['mAP50-95'], label='mAP@0.5:0.95')
+            plt.plot(epochs, [float(row[f'metrics/mAP50{suffix}']) for row in rows], label='mAP@0.5')
+            plt.plot(epochs, [float(row[f'metrics/mAP50-95{suffix}']) for row in rows], label='mAP@0.5:0.95')
             plt.xlabel('Epoch')
             plt.ylabel('mAP')
             plt.title('YOLOv11 Pill Segmentation Training Performance')
             plt.legend()
-            out_path = f"runs/{exp_name}/mAP_plot.png"
+            out_path = save_dir / 'mAP_plot.png'
             plt.savefig(out_path)
             print(f"📊 mAP 플롯 저장 완료: {out_path}")
         else:
-            print("⚠️ metrics에서 mAP 키를 찾을 수 없습니다.")
+            print("⚠️ results.csv에서 mAP 컬럼을 찾을 수 없습니다.")
     else:
-        print("⚠️ results.metrics 속성이 없습니다. (ultralytics 버전 확인 필요)")
+        print(f"⚠️ {results_csv} 없음. mAP 플롯을 건너뜁니다.")
+    print(f"⏱️ 학습 처리량/자원 사용 기록: {save_dir / 'telemetry.csv'}, {save_dir / 'telemetry.png'}")
 
-    print("✅ 훈련 완료. 결과는 runs/ 디렉토리에 저장됨.")
+    print(f"✅ 훈련 완료. 결과는 {save_dir}에 저장됨.")
 
 
 # -----------------------------